@@ -0,0 +1,448 @@
+"""
+Rate-limit-aware outbound dispatch shared by the Slack, GitHub and Stripe clients.
+
+Every upstream request goes through send() / asend(), which:
+
+- waits for a token from the upstream's token bucket
+  (<UPSTREAM>_RATE_LIMIT_PER_SECOND / <UPSTREAM>_RATE_LIMIT_BURST), so a burst
+  of calls is smoothed to the upstream's published limit instead of tripping it.
+  Slack limits each Web API method by tier, so Slack calls take tokens from
+  the bucket of their method's tier (SLACK_<TIER>_RATE_LIMIT_PER_SECOND / _BURST)
+  and a backlog of chat.postMessage calls never delays a search;
+- retries rate-limited responses (429, GitHub 403 rate-limit responses) after
+  Retry-After / X-RateLimit-Reset, or exponential backoff with full jitter when
+  the upstream gives no hint. 5xx responses and transport errors are retried only
+  for idempotent methods (or when the connection never opened), so a POST is
+  never sent twice;
+- runs a per-upstream circuit breaker: after CIRCUIT_FAILURE_THRESHOLD
+  consecutive failures the upstream is shed for CIRCUIT_RESET_SECONDS, then a
+  single probe decides whether to close it again.
+
+Callers see UpstreamUnavailableError (with retry_after) instead of a raw 429
+when the wait for a token or a Retry-After would exceed
+DISPATCH_MAX_RETRY_WAIT_SECONDS, retries run out or the breaker is open.
+"""
+
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from clients.http_pool import UPSTREAMS
+
+DEFAULT_TIER = "default"
+
+# Defaults follow each upstream's documented limits, keyed by (upstream, tier):
+# Slack chat.postMessage allows ~1 message/second and the other Web API methods
+# 1+/20+/50+/100+ calls/minute by tier, GitHub 5000 requests/hour (~1.4/s) with
+# stricter secondary limits on writes, Stripe 25 requests/second in test mode.
+DEFAULT_RATE_LIMITS = {
+    ("slack", "post_message"): (1.0, 3),
+    ("slack", "tier1"): (1 / 60, 1),
+    ("slack", "tier2"): (20 / 60, 3),
+    ("slack", "tier3"): (50 / 60, 5),
+    ("slack", "tier4"): (100 / 60, 10),
+    ("github", DEFAULT_TIER): (1.0, 10),
+    ("stripe", DEFAULT_TIER): (25.0, 25),
+}
+SLACK_METHOD_TIERS = {
+    "chat.postMessage": "post_message",
+    "conversations.list": "tier2",
+    "search.messages": "tier2",
+}
+# Slack documents most Web API methods as tier 3.
+SLACK_DEFAULT_TIER = "tier3"
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+logger = logging.getLogger("mcp.hub.dispatcher")
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """The upstream is rate limited or shed by its circuit breaker; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def get_rate_limit(upstream: str, tier: str = DEFAULT_TIER) -> tuple[float, int]:
+    default_rate, default_burst = DEFAULT_RATE_LIMITS.get((upstream, tier), (10.0, 10))
+    prefix = upstream.upper() if tier == DEFAULT_TIER else f"{upstream}_{tier}".upper()
+    rate = float(os.getenv(f"{prefix}_RATE_LIMIT_PER_SECOND", str(default_rate)))
+    burst = int(os.getenv(f"{prefix}_RATE_LIMIT_BURST", str(default_burst)))
+    return rate, max(1, burst)
+
+
+def get_retry_settings() -> dict:
+    return {
+        "max_retries": int(os.getenv("DISPATCH_MAX_RETRIES", "3")),
+        "backoff_base": float(os.getenv("DISPATCH_BACKOFF_BASE_SECONDS", "0.5")),
+        "backoff_max": float(os.getenv("DISPATCH_BACKOFF_MAX_SECONDS", "30")),
+        "max_retry_wait": float(os.getenv("DISPATCH_MAX_RETRY_WAIT_SECONDS", "60")),
+    }
+
+
+def get_circuit_settings() -> tuple[int, float]:
+    failure_threshold = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    reset_seconds = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    return failure_threshold, reset_seconds
+
+
+def get_rate_limit_tier(upstream: str, url: str) -> str:
+    """The token bucket a request draws from: its Slack method's tier, else the upstream's only bucket."""
+    if upstream != "slack":
+        return DEFAULT_TIER
+    method_name = httpx.URL(url).path.rsplit("/", 1)[-1]
+    return SLACK_METHOD_TIERS.get(method_name, SLACK_DEFAULT_TIER)
+
+
+class _TokenBucket:
+    def __init__(self, upstream: str, tier: str) -> None:
+        self.rate, self.burst = get_rate_limit(upstream, tier)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token (possibly going negative) and return how long the caller must wait for it."""
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        self.tokens -= 1
+        if self.tokens >= 0 or self.rate <= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def release(self) -> None:
+        """Give back a token taken by reserve() that will not be used."""
+        self.tokens = min(float(self.burst), self.tokens + 1)
+
+
+class _UpstreamState:
+    """Token buckets, circuit breaker and counters for one upstream. Guarded by _LOCK."""
+
+    def __init__(self, upstream: str) -> None:
+        self.upstream = upstream
+        self.buckets = {
+            tier: _TokenBucket(upstream, tier) for known, tier in DEFAULT_RATE_LIMITS if known == upstream
+        }
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "shed": 0,
+            "circuit_opened": 0,
+        }
+
+    def bucket(self, tier: str) -> _TokenBucket:
+        bucket = self.buckets.get(tier)
+        if bucket is None:
+            bucket = self.buckets[tier] = _TokenBucket(self.upstream, tier)
+        return bucket
+
+
+_STATES: dict[str, _UpstreamState] = {}
+_LOCK = threading.Lock()
+
+
+def _state(upstream: str) -> _UpstreamState:
+    state = _STATES.get(upstream)
+    if state is None:
+        state = _STATES.setdefault(upstream, _UpstreamState(upstream))
+    return state
+
+
+def reset_dispatcher() -> None:
+    """Forget every upstream's bucket, breaker and counters (settings are re-read on next use)."""
+    with _LOCK:
+        _STATES.clear()
+
+
+def _admit(upstream: str) -> bool:
+    """Raise when the breaker sheds the call; let exactly one probe through when half-open.
+
+    Returns True when this call is the half-open probe.
+    """
+    _failure_threshold, reset_seconds = get_circuit_settings()
+    with _LOCK:
+        state = _state(upstream)
+        if state.state == OPEN:
+            remaining = state.opened_at + reset_seconds - time.monotonic()
+            if remaining > 0:
+                state.counters["shed"] += 1
+                raise UpstreamUnavailableError(f"{upstream} circuit is open; upstream is failing", remaining)
+            state.state = HALF_OPEN
+            state.probe_in_flight = False
+        if state.state == HALF_OPEN:
+            if state.probe_in_flight:
+                state.counters["shed"] += 1
+                raise UpstreamUnavailableError(f"{upstream} circuit is half-open; probe in progress", reset_seconds)
+            state.probe_in_flight = True
+            return True
+    return False
+
+
+def _abandon(upstream: str, probe: bool) -> None:
+    """An attempt ended without an outcome (cancelled, or an error other than a transport error).
+
+    A probe that never answered has not shown the upstream is healthy, so it
+    counts as a failed probe and re-opens the breaker; otherwise the probe slot
+    would stay taken and every later call would be shed. Cancelling an ordinary
+    call says nothing about the upstream and leaves the breaker alone.
+    """
+    if probe:
+        _record_outcome(upstream, failed=True)
+
+
+def _record_outcome(upstream: str, failed: bool) -> None:
+    failure_threshold, _reset_seconds = get_circuit_settings()
+    with _LOCK:
+        state = _state(upstream)
+        state.probe_in_flight = False
+        if not failed:
+            state.consecutive_failures = 0
+            state.state = CLOSED
+            return
+        state.counters["failures"] += 1
+        state.consecutive_failures += 1
+        if state.state == HALF_OPEN or state.consecutive_failures >= failure_threshold:
+            if state.state != OPEN:
+                state.counters["circuit_opened"] += 1
+                logger.warning(
+                    "dispatcher.circuit_open upstream=%s consecutive_failures=%s",
+                    upstream,
+                    state.consecutive_failures,
+                )
+            state.state = OPEN
+            state.opened_at = time.monotonic()
+
+
+def _reserve(upstream: str, tier: str, max_wait: float, probe: bool) -> float:
+    """Take a token and return the wait for it; raise instead when the wait exceeds max_wait.
+
+    A rejected caller gives its token back, so a burst cannot push the bucket
+    arbitrarily far into debt and queue later callers for minutes. A rejected
+    probe frees the half-open slot without counting as an upstream failure.
+    """
+    with _LOCK:
+        state = _state(upstream)
+        bucket = state.bucket(tier)
+        wait = bucket.reserve()
+        if wait <= max_wait:
+            state.counters["requests"] += 1
+            return wait
+        bucket.release()
+        state.counters["shed"] += 1
+        if probe:
+            state.probe_in_flight = False
+    raise UpstreamUnavailableError(f"{upstream} {tier} rate limit queue is full", wait)
+
+
+def _adjust(upstream: str, key: str, amount: int) -> None:
+    with _LOCK:
+        state = _state(upstream)
+        setattr(state, key, getattr(state, key) + amount)
+
+
+def _count(upstream: str, counter: str) -> None:
+    with _LOCK:
+        _state(upstream).counters[counter] += 1
+
+
+def _parse_retry_after(value: str) -> float | None:
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _rate_limit_wait(response: httpx.Response) -> float | None:
+    """Seconds the upstream asked us to wait, or None when the response is not a rate limit."""
+    headers = response.headers
+    # GitHub signals primary and secondary rate limits with 403 rather than 429.
+    limited = response.status_code == 429 or (
+        response.status_code == 403
+        and (
+            headers.get("x-ratelimit-remaining") == "0"
+            or "retry-after" in headers
+            or b"rate limit" in response.content.lower()
+        )
+    )
+    if not limited:
+        return None
+    if "retry-after" in headers:
+        wait = _parse_retry_after(headers["retry-after"])
+        if wait is not None:
+            return wait
+    if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+        try:
+            return max(0.0, float(headers["x-ratelimit-reset"]) - time.time())
+        except ValueError:
+            pass
+    return 0.0
+
+
+def _backoff(attempt: int, settings: dict) -> float:
+    # Full jitter: spreads out retries from concurrent callers instead of re-synchronising them.
+    return random.uniform(0, min(settings["backoff_max"], settings["backoff_base"] * (2**attempt)))
+
+
+def _plan_retry(
+    upstream: str,
+    method: str,
+    attempt: int,
+    settings: dict,
+    response: httpx.Response | None,
+    error: Exception | None,
+) -> float | None:
+    """Return the delay before the next attempt, or None when the outcome is final.
+
+    Also feeds the circuit breaker. Raises UpstreamUnavailableError when a rate
+    limit cannot be waited out within the retry budget.
+    """
+    if response is not None:
+        wait = _rate_limit_wait(response)
+        if wait is not None:
+            _count(upstream, "rate_limited")
+            _record_outcome(upstream, failed=False)
+            delay = wait or _backoff(attempt, settings)
+            if attempt >= settings["max_retries"] or delay > settings["max_retry_wait"]:
+                raise UpstreamUnavailableError(f"{upstream} rate limit exceeded", delay)
+            return delay
+        failed = response.status_code in RETRYABLE_STATUS_CODES
+        _record_outcome(upstream, failed=failed)
+        retryable = failed and method in IDEMPOTENT_METHODS
+    else:
+        _record_outcome(upstream, failed=True)
+        # A connect error means the request never reached the upstream, so even a POST is safe to resend.
+        retryable = method in IDEMPOTENT_METHODS or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+    if not retryable or attempt >= settings["max_retries"]:
+        return None
+    return _backoff(attempt, settings)
+
+
+def send(client: httpx.Client, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request through the upstream's rate limiter, retry policy and circuit breaker."""
+    settings = get_retry_settings()
+    method = method.upper()
+    tier = get_rate_limit_tier(upstream, url)
+    attempt = 0
+    while True:
+        probe = _admit(upstream)
+        wait = _reserve(upstream, tier, settings["max_retry_wait"], probe)
+        try:
+            if wait > 0:
+                _adjust(upstream, "queue_depth", 1)
+                try:
+                    time.sleep(wait)
+                finally:
+                    _adjust(upstream, "queue_depth", -1)
+            response = error = None
+            _adjust(upstream, "in_flight", 1)
+            try:
+                response = client.request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                error = exc
+            finally:
+                _adjust(upstream, "in_flight", -1)
+        except BaseException:
+            _abandon(upstream, probe)
+            raise
+        delay = _plan_retry(upstream, method, attempt, settings, response, error)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+        attempt += 1
+        _count(upstream, "retries")
+        logger.info("dispatcher.retry upstream=%s attempt=%s delay_s=%.2f", upstream, attempt, delay)
+        time.sleep(delay)
+
+
+async def asend(client: httpx.AsyncClient, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Async counterpart of send(); waits with asyncio.sleep so the event loop keeps running."""
+    settings = get_retry_settings()
+    method = method.upper()
+    tier = get_rate_limit_tier(upstream, url)
+    attempt = 0
+    while True:
+        probe = _admit(upstream)
+        wait = _reserve(upstream, tier, settings["max_retry_wait"], probe)
+        try:
+            if wait > 0:
+                _adjust(upstream, "queue_depth", 1)
+                try:
+                    await asyncio.sleep(wait)
+                finally:
+                    _adjust(upstream, "queue_depth", -1)
+            response = error = None
+            _adjust(upstream, "in_flight", 1)
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                error = exc
+            finally:
+                _adjust(upstream, "in_flight", -1)
+        except BaseException:
+            _abandon(upstream, probe)
+            raise
+        delay = _plan_retry(upstream, method, attempt, settings, response, error)
+        if delay is None:
+            if error is not None:
+                raise error
+            return response
+        attempt += 1
+        _count(upstream, "retries")
+        logger.info("dispatcher.retry upstream=%s attempt=%s delay_s=%.2f", upstream, attempt, delay)
+        await asyncio.sleep(delay)
+
+
+def get_dispatcher_stats() -> list[dict]:
+    failure_threshold, reset_seconds = get_circuit_settings()
+    result = []
+    with _LOCK:
+        for upstream in UPSTREAMS:
+            state = _state(upstream)
+            result.append(
+                {
+                    "upstream": upstream,
+                    "circuit_state": state.state,
+                    "consecutive_failures": state.consecutive_failures,
+                    "failure_threshold": failure_threshold,
+                    "reset_seconds": reset_seconds,
+                    "rate_limits": {
+                        tier: {
+                            "rate_per_second": round(bucket.rate, 4),
+                            "burst": bucket.burst,
+                            "tokens_available": round(max(0.0, bucket.tokens), 2),
+                        }
+                        for tier, bucket in state.buckets.items()
+                    },
+                    "queue_depth": state.queue_depth,
+                    "in_flight": state.in_flight,
+                    **state.counters,
+                }
+            )
+    return result
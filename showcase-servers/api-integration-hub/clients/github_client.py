@@ -1,15 +1,25 @@
 import os
-import httpx
+
+from clients.dispatcher import asend, send
+from clients.http_pool import get_async_http_client, get_http_client
+from clients.response_cache import acached_get, cached_get, get_response_cache
 
 GITHUB_API_URL = "https://api.github.com"
 
+def _repo_scope(owner: str, repo: str) -> str:
+    # Cached reads of a repo are dropped when the hub writes to it (GitHub names are case-insensitive).
+    return f"github:{owner.lower()}/{repo.lower()}"
+
 class GitHubClient:
     def __init__(self) -> None:
         token = os.getenv("GITHUB_TOKEN")
         if not token:
             raise RuntimeError("GITHUB_TOKEN not set")
         self.token = token
-        self.client = httpx.Client(timeout=10.0)
+        self.client = get_http_client("github")
+        self.async_client = get_async_http_client("github")
+        # Cache metadata ({"hit", "revalidated", "age_seconds"}) of the last read, per method.
+        self.cache_info: dict[str, dict] = {}
 
     def _headers(self):
         return {
@@ -18,28 +28,76 @@ class GitHubClient:
         }
 
     def create_issue(self, owner: str, repo: str, title: str, body: str | None = None):
-        resp = self.client.post(
+        resp = send(
+            self.client,
+            "github",
+            "POST",
             f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues",
             headers=self._headers(),
             json={"title": title, "body": body or ""},
         )
         resp.raise_for_status()
+        get_response_cache().invalidate(_repo_scope(owner, repo))
         return resp.json()
 
-    def search_code(self, query: str):
-        resp = self.client.get(
-            f"{GITHUB_API_URL}/search/code",
+    async def acreate_issue(self, owner: str, repo: str, title: str, body: str | None = None):
+        resp = await asend(
+            self.async_client,
+            "github",
+            "POST",
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}/issues",
             headers=self._headers(),
-            params={"q": query},
+            json={"title": title, "body": body or ""},
         )
         resp.raise_for_status()
+        await get_response_cache().ainvalidate(_repo_scope(owner, repo))
         return resp.json()
 
+    def _cached_get(self, name: str, url: str, params: dict, scope: str | None = None):
+        # Stale entries are revalidated with If-None-Match; GitHub does not charge 304s to the rate limit.
+        data, self.cache_info[name] = cached_get(
+            self.client,
+            "github",
+            url,
+            credential=self.token,
+            params=params,
+            conditional=True,
+            scope=scope,
+            headers=self._headers(),
+        )
+        return data
+
+    async def _acached_get(self, name: str, url: str, params: dict, scope: str | None = None):
+        data, self.cache_info[name] = await acached_get(
+            self.async_client,
+            "github",
+            url,
+            credential=self.token,
+            params=params,
+            conditional=True,
+            scope=scope,
+            headers=self._headers(),
+        )
+        return data
+
+    def search_code(self, query: str):
+        return self._cached_get("search_code", f"{GITHUB_API_URL}/search/code", {"q": query})
+
     def list_pull_requests(self, owner: str, repo: str, state: str = "open"):
-        resp = self.client.get(
+        return self._cached_get(
+            "pull_requests",
             f"{GITHUB_API_URL}/repos/{owner}/{repo}/pulls",
-            headers=self._headers(),
-            params={"state": state},
+            {"state": state},
+            scope=_repo_scope(owner, repo),
+        )
+
+    async def asearch_code(self, query: str):
+        return await self._acached_get("search_code", f"{GITHUB_API_URL}/search/code", {"q": query})
+
+    async def alist_pull_requests(self, owner: str, repo: str, state: str = "open"):
+        return await self._acached_get(
+            "pull_requests",
+            f"{GITHUB_API_URL}/repos/{owner}/{repo}/pulls",
+            {"state": state},
+            scope=_repo_scope(owner, repo),
         )
-        resp.raise_for_status()
-        return resp.json()
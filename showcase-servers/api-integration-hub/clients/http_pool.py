@@ -0,0 +1,221 @@
+"""
+Process-wide pooled httpx clients, one per upstream (Slack, GitHub, Stripe).
+
+Sync and async clients are created at app startup (or lazily on first use)
+and closed at shutdown, so every call reuses warm keep-alive connections instead of paying
+a TCP + TLS handshake per request. Limits come from env:
+
+- HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE / HTTP_KEEPALIVE_EXPIRY_SECONDS
+- HTTP_TIMEOUT_SECONDS
+- HTTP2_ENABLED=true negotiates HTTP/2 when the h2 package is installed
+
+Per-upstream stats count requests, errors, latency and how many new
+connections / TLS handshakes were needed, which shows whether reuse works.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+try:
+    import h2  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without h2 installed
+    h2 = None
+
+UPSTREAMS = ("slack", "github", "stripe")
+
+logger = logging.getLogger("mcp.hub.http_pool")
+
+_CLIENTS: dict[str, httpx.Client] = {}
+_ASYNC_CLIENTS: dict[str, httpx.AsyncClient] = {}
+_STATS: dict[str, dict] = {}
+_LOCK = threading.Lock()
+
+
+def get_pool_settings() -> dict:
+    return {
+        "max_connections": int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+        "max_keepalive_connections": int(os.getenv("HTTP_MAX_KEEPALIVE", "10")),
+        "keepalive_expiry": float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30")),
+    }
+
+
+def get_timeout_seconds() -> float:
+    return float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+
+
+def is_http2_enabled() -> bool:
+    if os.getenv("HTTP2_ENABLED", "false").strip().lower() != "true":
+        return False
+    if h2 is None:
+        logger.warning("http_pool.http2_unavailable reason=h2_not_installed fallback=http1.1")
+        return False
+    return True
+
+
+def _new_stats() -> dict:
+    return {
+        "requests": 0,
+        "errors": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+        "connections_opened": 0,
+        "tls_handshakes": 0,
+    }
+
+
+def _record(upstream: str, key: str, amount: float = 1) -> None:
+    with _LOCK:
+        _STATS.setdefault(upstream, _new_stats())[key] += amount
+
+
+def _event_hooks(upstream: str, asynchronous: bool = False) -> dict:
+    def trace(event_name: str, _info: dict) -> None:
+        # httpcore trace events fire only when a connection is actually opened, not on reuse.
+        if event_name == "connection.connect_tcp.complete":
+            _record(upstream, "connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            _record(upstream, "tls_handshakes")
+
+    def on_request(request: httpx.Request) -> None:
+        request.extensions["trace"] = trace
+        request.extensions["pool_start"] = time.perf_counter()
+
+    def on_response(response: httpx.Response) -> None:
+        duration_ms = (time.perf_counter() - response.request.extensions["pool_start"]) * 1000
+        with _LOCK:
+            stats = _STATS.setdefault(upstream, _new_stats())
+            stats["requests"] += 1
+            stats["errors"] += 1 if response.status_code >= 500 else 0
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+    if not asynchronous:
+        return {"request": [on_request], "response": [on_response]}
+
+    # AsyncClient requires coroutine hooks and an async trace callback.
+    async def atrace(event_name: str, info: dict) -> None:
+        trace(event_name, info)
+
+    async def aon_request(request: httpx.Request) -> None:
+        on_request(request)
+        request.extensions["trace"] = atrace
+
+    async def aon_response(response: httpx.Response) -> None:
+        on_response(response)
+
+    return {"request": [aon_request], "response": [aon_response]}
+
+
+def _client_kwargs(upstream: str, asynchronous: bool = False) -> dict:
+    return {
+        "timeout": get_timeout_seconds(),
+        "limits": httpx.Limits(**get_pool_settings()),
+        "http2": is_http2_enabled(),
+        "event_hooks": _event_hooks(upstream, asynchronous),
+    }
+
+
+def get_http_client(upstream: str) -> httpx.Client:
+    """Return the shared client for an upstream, creating it on first use."""
+    client = _CLIENTS.get(upstream)
+    if client is not None and not client.is_closed:
+        return client
+    with _LOCK:
+        client = _CLIENTS.get(upstream)
+        if client is None or client.is_closed:
+            client = _CLIENTS[upstream] = httpx.Client(**_client_kwargs(upstream))
+        return client
+
+
+def get_async_http_client(upstream: str) -> httpx.AsyncClient:
+    """Async counterpart of get_http_client; use from the app's event loop only."""
+    client = _ASYNC_CLIENTS.get(upstream)
+    if client is not None and not client.is_closed:
+        return client
+    with _LOCK:
+        client = _ASYNC_CLIENTS.get(upstream)
+        if client is None or client.is_closed:
+            client = _ASYNC_CLIENTS[upstream] = httpx.AsyncClient(**_client_kwargs(upstream, asynchronous=True))
+        return client
+
+
+def start_http_clients() -> None:
+    for upstream in UPSTREAMS:
+        get_http_client(upstream)
+        get_async_http_client(upstream)
+
+
+def close_http_clients() -> None:
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_http_clients() -> None:
+    close_http_clients()
+    with _LOCK:
+        clients = list(_ASYNC_CLIENTS.values())
+        _ASYNC_CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def _pool_connections(client: httpx.Client | httpx.AsyncClient) -> tuple[int, int, str | None]:
+    """(open, idle, http version of the first connection) read from the httpcore pool."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    version = None
+    for connection in connections:
+        info = connection.info()
+        if "HTTP/2" in info:
+            version = "HTTP/2"
+            break
+        if "HTTP/1.1" in info:
+            version = "HTTP/1.1"
+    return len(connections), idle, version
+
+
+def get_http_pool_stats() -> list[dict]:
+    limits = get_pool_settings()
+    with _LOCK:
+        clients = dict(_CLIENTS)
+        async_clients = dict(_ASYNC_CLIENTS)
+        stats = {upstream: dict(values) for upstream, values in _STATS.items()}
+    result = []
+    for upstream in sorted(set(clients) | set(async_clients) | set(stats)):
+        values = stats.get(upstream, _new_stats())
+        client = clients.get(upstream)
+        async_client = async_clients.get(upstream)
+        open_connections, idle, version = _pool_connections(client) if client is not None else (0, 0, None)
+        async_open, async_idle, async_version = (
+            _pool_connections(async_client) if async_client is not None else (0, 0, None)
+        )
+        requests = values["requests"]
+        result.append(
+            {
+                "upstream": upstream,
+                "open": client is not None and not client.is_closed,
+                "async_open": async_client is not None and not async_client.is_closed,
+                "connections": open_connections,
+                "idle_connections": idle,
+                "async_connections": async_open,
+                "async_idle_connections": async_idle,
+                "http_version": version or async_version,
+                **limits,
+                "requests": requests,
+                "errors": values["errors"],
+                "avg_ms": round(values["total_ms"] / requests, 2) if requests else 0.0,
+                "max_ms": round(values["max_ms"], 2),
+                "connections_opened": values["connections_opened"],
+                "tls_handshakes": values["tls_handshakes"],
+                "reuse_ratio": round(max(0.0, 1 - values["connections_opened"] / requests), 4) if requests else 0.0,
+            }
+        )
+    return result
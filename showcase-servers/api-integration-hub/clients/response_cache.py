@@ -0,0 +1,354 @@
+"""
+Read-through cache for idempotent upstream GETs (Stripe reads, GitHub lists/search).
+
+Entries are keyed on URL + params + a hash of the credential, so tenants never
+share entries. Within the TTL a cached body is returned without a request.
+After it, GitHub entries that carried an ETag are revalidated with
+If-None-Match: a 304 refreshes the entry without downloading the body, and
+GitHub does not count conditional 304s against the rate limit. Entries live
+in an in-memory LRU; HTTP_CACHE_REDIS=true also shares them across workers
+through REDIS_URL (memory is consulted first, Redis errors fall back to memory).
+
+Reads can be tagged with a scope (e.g. "github:owner/repo"); a write through
+the hub to that resource calls invalidate(scope) so the next read is fetched
+fresh instead of serving data the write just made stale.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import httpx
+
+from clients.dispatcher import asend, send
+
+try:
+    import redis  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without redis installed
+    redis = None
+
+REDIS_KEY_PREFIX = "hub_http_cache:"
+REDIS_SCOPE_PREFIX = "hub_http_cache_scope:"
+
+logger = logging.getLogger("mcp.hub.response_cache")
+
+
+def is_enabled() -> bool:
+    return os.getenv("HTTP_CACHE_ENABLED", "true").strip().lower() == "true"
+
+
+def get_ttl_seconds(upstream: str) -> float:
+    return float(os.getenv(f"{upstream.upper()}_CACHE_TTL_SECONDS", "60"))
+
+
+def get_cache_settings() -> tuple[int, float]:
+    max_entries = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "1024"))
+    # How long an expired entry with an ETag is kept around for revalidation.
+    etag_retention_seconds = float(os.getenv("HTTP_CACHE_ETAG_RETENTION_SECONDS", "86400"))
+    return max_entries, etag_retention_seconds
+
+
+def make_cache_key(upstream: str, url: str, params: dict | None, credential: str) -> str:
+    parts = [
+        upstream,
+        url,
+        json.dumps(params or {}, sort_keys=True, default=str),
+        hashlib.sha256(credential.encode("utf-8")).hexdigest(),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self) -> None:
+        self.max_entries, self.etag_retention_seconds = get_cache_settings()
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self.redis_client = _create_redis_client()
+        self.redis_degraded = False
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.redis_hits = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> dict | None:
+        """Return {"value", "etag", "stored_at", "expires_at"} for a retained entry (fresh or stale)."""
+        entry = self._get_memory(key)
+        if entry is None and self.redis_client is not None:
+            entry = self._get_redis(key)
+        return entry
+
+    async def aget(self, key: str) -> dict | None:
+        """get() for the event loop: the Redis round trip runs in a worker thread."""
+        entry = self._get_memory(key)
+        if entry is None and self.redis_client is not None:
+            entry = await asyncio.to_thread(self._get_redis, key)
+        return entry
+
+    def set(self, key: str, value, etag: str | None, ttl_seconds: float, scope: str | None = None) -> dict:
+        entry, retain_seconds = self._new_entry(value, etag, ttl_seconds, scope)
+        self._remember(key, entry)
+        if self.redis_client is not None:
+            self._set_redis(key, entry, retain_seconds)
+        return entry
+
+    async def aset(self, key: str, value, etag: str | None, ttl_seconds: float, scope: str | None = None) -> dict:
+        entry, retain_seconds = self._new_entry(value, etag, ttl_seconds, scope)
+        self._remember(key, entry)
+        if self.redis_client is not None:
+            await asyncio.to_thread(self._set_redis, key, entry, retain_seconds)
+        return entry
+
+    def invalidate(self, scope: str) -> int:
+        """Drop every entry stored under scope; returns how many in-memory entries were removed."""
+        removed = self._invalidate_memory(scope)
+        if self.redis_client is not None:
+            self._invalidate_redis(scope)
+        return removed
+
+    async def ainvalidate(self, scope: str) -> int:
+        removed = self._invalidate_memory(scope)
+        if self.redis_client is not None:
+            await asyncio.to_thread(self._invalidate_redis, scope)
+        return removed
+
+    def _get_memory(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["retain_until"] > now:
+                self._entries.move_to_end(key)
+                return entry
+            self._entries.pop(key, None)
+        return None
+
+    def _get_redis(self, key: str) -> dict | None:
+        try:
+            raw = self.redis_client.get(REDIS_KEY_PREFIX + key)
+            self.redis_degraded = False
+        except Exception:
+            self._mark_redis_degraded("get")
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self.redis_hits += 1
+        self._remember(key, entry)
+        return entry
+
+    def _new_entry(self, value, etag: str | None, ttl_seconds: float, scope: str | None) -> tuple[dict, float]:
+        now = time.time()
+        retain_seconds = max(ttl_seconds, self.etag_retention_seconds) if etag else ttl_seconds
+        entry = {
+            "value": value,
+            "etag": etag,
+            "stored_at": now,
+            "expires_at": now + ttl_seconds,
+            "retain_until": now + retain_seconds,
+            "scope": scope,
+        }
+        return entry, retain_seconds
+
+    def _set_redis(self, key: str, entry: dict, retain_seconds: float) -> None:
+        scope = entry["scope"]
+        try:
+            self.redis_client.set(REDIS_KEY_PREFIX + key, json.dumps(entry), ex=max(1, int(retain_seconds)))
+            if scope:
+                # Index the key under its scope so invalidate() can find it without scanning Redis;
+                # the index outlives any entry it points to.
+                index_seconds = max(retain_seconds, self.etag_retention_seconds)
+                self.redis_client.sadd(REDIS_SCOPE_PREFIX + scope, key)
+                self.redis_client.expire(REDIS_SCOPE_PREFIX + scope, max(1, int(index_seconds)))
+            self.redis_degraded = False
+        except Exception:
+            self._mark_redis_degraded("set")
+
+    def _remember(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _invalidate_memory(self, scope: str) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.get("scope") == scope]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def _invalidate_redis(self, scope: str) -> None:
+        try:
+            redis_keys = self.redis_client.smembers(REDIS_SCOPE_PREFIX + scope)
+            self.redis_client.delete(REDIS_SCOPE_PREFIX + scope, *(REDIS_KEY_PREFIX + key for key in redis_keys))
+            self.redis_degraded = False
+        except Exception:
+            self._mark_redis_degraded("invalidate")
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.revalidated
+            return {
+                "enabled": is_enabled(),
+                "backend": "memory+redis" if self.redis_client is not None else "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.revalidated) / lookups, 4) if lookups else 0.0,
+                "redis_hits": self.redis_hits,
+                "redis_degraded": self.redis_degraded,
+            }
+
+    def _mark_redis_degraded(self, operation: str) -> None:
+        self.redis_degraded = True
+        logger.warning("response_cache.redis_unavailable operation=%s fallback=memory", operation)
+
+
+def _create_redis_client():
+    if os.getenv("HTTP_CACHE_REDIS", "false").strip().lower() != "true":
+        return None
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    if not redis_url or redis is None:
+        return None
+    return redis.from_url(redis_url, decode_responses=True)
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def reset_response_cache() -> None:
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def _cache_info(entry: dict, hit: bool, revalidated: bool = False) -> dict:
+    return {
+        "hit": hit,
+        "revalidated": revalidated,
+        "age_seconds": round(time.time() - entry["stored_at"], 3),
+    }
+
+
+def _plan(entry: dict | None, conditional: bool) -> tuple[bool, dict]:
+    """Return (fresh?, request headers) for a cached entry or None."""
+    fresh = entry is not None and entry["expires_at"] > time.time()
+    headers = {}
+    if entry is not None and not fresh and conditional and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    return fresh, headers
+
+
+def _complete(
+    upstream: str, key: str, entry: dict | None, resp: httpx.Response, scope: str | None
+) -> tuple[object, dict]:
+    cache = get_response_cache()
+    ttl_seconds = get_ttl_seconds(upstream)
+    if resp.status_code == 304 and entry is not None:
+        cache.record("revalidated")
+        entry = cache.set(key, entry["value"], entry.get("etag"), ttl_seconds, scope)
+        return entry["value"], _cache_info(entry, hit=True, revalidated=True)
+    resp.raise_for_status()
+    cache.record("misses")
+    entry = cache.set(key, resp.json(), resp.headers.get("etag"), ttl_seconds, scope)
+    return entry["value"], _cache_info(entry, hit=False)
+
+
+async def _acomplete(
+    upstream: str, key: str, entry: dict | None, resp: httpx.Response, scope: str | None
+) -> tuple[object, dict]:
+    cache = get_response_cache()
+    ttl_seconds = get_ttl_seconds(upstream)
+    if resp.status_code == 304 and entry is not None:
+        cache.record("revalidated")
+        entry = await cache.aset(key, entry["value"], entry.get("etag"), ttl_seconds, scope)
+        return entry["value"], _cache_info(entry, hit=True, revalidated=True)
+    resp.raise_for_status()
+    cache.record("misses")
+    entry = await cache.aset(key, resp.json(), resp.headers.get("etag"), ttl_seconds, scope)
+    return entry["value"], _cache_info(entry, hit=False)
+
+
+def cached_get(
+    client: httpx.Client,
+    upstream: str,
+    url: str,
+    *,
+    credential: str,
+    params: dict | None = None,
+    conditional: bool = False,
+    scope: str | None = None,
+    **request_kwargs,
+) -> tuple[object, dict]:
+    """GET through the cache; returns (JSON body, {"hit", "revalidated", "age_seconds"}).
+
+    scope tags the entry for invalidate(); pass it for reads a hub write can make stale.
+    """
+    if not is_enabled():
+        resp = send(client, upstream, "GET", url, params=params, **request_kwargs)
+        resp.raise_for_status()
+        return resp.json(), {"hit": False, "revalidated": False, "age_seconds": 0.0}
+    key = make_cache_key(upstream, url, params, credential)
+    entry = get_response_cache().get(key)
+    fresh, headers = _plan(entry, conditional)
+    if fresh:
+        get_response_cache().record("hits")
+        return entry["value"], _cache_info(entry, hit=True)
+    headers.update(request_kwargs.pop("headers", None) or {})
+    resp = send(client, upstream, "GET", url, params=params, headers=headers, **request_kwargs)
+    return _complete(upstream, key, entry, resp, scope)
+
+
+async def acached_get(
+    client: httpx.AsyncClient,
+    upstream: str,
+    url: str,
+    *,
+    credential: str,
+    params: dict | None = None,
+    conditional: bool = False,
+    scope: str | None = None,
+    **request_kwargs,
+) -> tuple[object, dict]:
+    if not is_enabled():
+        resp = await asend(client, upstream, "GET", url, params=params, **request_kwargs)
+        resp.raise_for_status()
+        return resp.json(), {"hit": False, "revalidated": False, "age_seconds": 0.0}
+    key = make_cache_key(upstream, url, params, credential)
+    entry = await get_response_cache().aget(key)
+    fresh, headers = _plan(entry, conditional)
+    if fresh:
+        get_response_cache().record("hits")
+        return entry["value"], _cache_info(entry, hit=True)
+    headers.update(request_kwargs.pop("headers", None) or {})
+    resp = await asend(client, upstream, "GET", url, params=params, headers=headers, **request_kwargs)
+    return await _acomplete(upstream, key, entry, resp, scope)
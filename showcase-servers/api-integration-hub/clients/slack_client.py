@@ -1,5 +1,7 @@
 import os
-import httpx
+
+from clients.dispatcher import asend, send
+from clients.http_pool import get_async_http_client, get_http_client
 
 SLACK_BASE_URL = "https://slack.com/api"
 
@@ -9,13 +11,32 @@ class SlackClient:
         if not token:
             raise RuntimeError("SLACK_BOT_TOKEN not set")
         self.token = token
-        self.client = httpx.Client(timeout=10.0)
+        self.client = get_http_client("slack")
+        self.async_client = get_async_http_client("slack")
 
     def _headers(self):
         return {"Authorization": f"Bearer {self.token}"}
 
     def post_message(self, channel: str, text: str):
-        resp = self.client.post(
+        resp = send(
+            self.client,
+            "slack",
+            "POST",
+            f"{SLACK_BASE_URL}/chat.postMessage",
+            headers=self._headers(),
+            json={"channel": channel, "text": text},
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if not data.get("ok"):
+            raise RuntimeError(f"Slack error: {data}")
+        return data
+
+    async def apost_message(self, channel: str, text: str):
+        resp = await asend(
+            self.async_client,
+            "slack",
+            "POST",
             f"{SLACK_BASE_URL}/chat.postMessage",
             headers=self._headers(),
             json={"channel": channel, "text": text},
@@ -27,7 +48,10 @@ class SlackClient:
         return data
 
     def list_channels(self):
-        resp = self.client.get(
+        resp = send(
+            self.client,
+            "slack",
+            "GET",
             f"{SLACK_BASE_URL}/conversations.list",
             headers=self._headers(),
         )
@@ -38,7 +62,10 @@ class SlackClient:
         return data.get("channels", [])
 
     def search_messages(self, query: str):
-        resp = self.client.get(
+        resp = send(
+            self.client,
+            "slack",
+            "GET",
             f"{SLACK_BASE_URL}/search.messages",
             headers=self._headers(),
             params={"query": query},
@@ -1,5 +1,7 @@
 import os
-import httpx
+
+from clients.http_pool import get_async_http_client, get_http_client
+from clients.response_cache import acached_get, cached_get
 
 STRIPE_API_URL = "https://api.stripe.com/v1"
 
@@ -9,25 +11,47 @@ class StripeClient:
         if not key:
             raise RuntimeError("STRIPE_API_KEY not set")
         self.key = key
-        self.client = httpx.Client(timeout=10.0, auth=(self.key, ""))
-
-    def retrieve_customer(self, customer_id: str):
-        resp = self.client.get(f"{STRIPE_API_URL}/customers/{customer_id}")
-        resp.raise_for_status()
-        return resp.json()
+        self.auth = (self.key, "")
+        self.client = get_http_client("stripe")
+        self.async_client = get_async_http_client("stripe")
+        # Cache metadata ({"hit", "revalidated", "age_seconds"}) of the last read, per method.
+        self.cache_info: dict[str, dict] = {}
 
-    def list_charges(self, customer_id: str | None = None, limit: int = 10):
+    @staticmethod
+    def _list_params(customer_id: str | None, limit: int) -> dict:
         params = {"limit": limit}
         if customer_id:
             params["customer"] = customer_id
-        resp = self.client.get(f"{STRIPE_API_URL}/charges", params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return params
+
+    def _get(self, name: str, url: str, params: dict | None = None):
+        data, self.cache_info[name] = cached_get(
+            self.client, "stripe", url, credential=self.key, params=params, auth=self.auth
+        )
+        return data
+
+    async def _aget(self, name: str, url: str, params: dict | None = None):
+        data, self.cache_info[name] = await acached_get(
+            self.async_client, "stripe", url, credential=self.key, params=params, auth=self.auth
+        )
+        return data
+
+    def retrieve_customer(self, customer_id: str):
+        return self._get("customer", f"{STRIPE_API_URL}/customers/{customer_id}")
+
+    def list_charges(self, customer_id: str | None = None, limit: int = 10):
+        return self._get("charges", f"{STRIPE_API_URL}/charges", self._list_params(customer_id, limit))
 
     def list_subscriptions(self, customer_id: str | None = None, limit: int = 10):
-        params = {"limit": limit}
-        if customer_id:
-            params["customer"] = customer_id
-        resp = self.client.get(f"{STRIPE_API_URL}/subscriptions", params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return self._get("subscriptions", f"{STRIPE_API_URL}/subscriptions", self._list_params(customer_id, limit))
+
+    async def aretrieve_customer(self, customer_id: str):
+        return await self._aget("customer", f"{STRIPE_API_URL}/customers/{customer_id}")
+
+    async def alist_charges(self, customer_id: str | None = None, limit: int = 10):
+        return await self._aget("charges", f"{STRIPE_API_URL}/charges", self._list_params(customer_id, limit))
+
+    async def alist_subscriptions(self, customer_id: str | None = None, limit: int = 10):
+        return await self._aget(
+            "subscriptions", f"{STRIPE_API_URL}/subscriptions", self._list_params(customer_id, limit)
+        )
@@ -0,0 +1,97 @@
+import asyncio
+import pathlib
+import sys
+
+import httpx
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from clients import dispatcher, http_pool, response_cache
+
+
+class FakeUpstream:
+    """MockTransport handler shared by every pooled client; records the requests it answers."""
+
+    def __init__(self) -> None:
+        self.requests: list[httpx.Request] = []
+        self.responses: list = []
+
+    def respond(self, *responses) -> None:
+        """Answer the next requests with responses (httpx.Response, exception or callable(request)).
+
+        Replaces anything still queued; the last response repeats.
+        """
+        self.responses = list(responses)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if not self.responses:
+            return httpx.Response(200, json={"ok": True})
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        if callable(response):
+            return response(request)
+        return response
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    upstream = FakeUpstream()
+    client_kwargs = http_pool._client_kwargs
+
+    def mock_client_kwargs(name: str, asynchronous: bool = False) -> dict:
+        return {**client_kwargs(name, asynchronous), "transport": httpx.MockTransport(upstream)}
+
+    monkeypatch.setattr(http_pool, "_client_kwargs", mock_client_kwargs)
+    return upstream
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setenv("API_KEY", "secret")
+    monkeypatch.delenv("API_KEYS", raising=False)
+    monkeypatch.delenv("REVOKED_API_KEYS", raising=False)
+    monkeypatch.setenv("RATE_LIMIT_REQUESTS", "100")
+    monkeypatch.setenv("RATE_LIMIT_WINDOW_SECONDS", "60")
+    main.app.state.rate_limit_store.clear()
+    with TestClient(main.app) as client:
+        client.headers["X-API-Key"] = "secret"
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def reset_clients(monkeypatch):
+    monkeypatch.setenv("SLACK_BOT_TOKEN", "xoxb-test")
+    monkeypatch.setenv("GITHUB_TOKEN", "ghp-test")
+    monkeypatch.setenv("STRIPE_API_KEY", "sk_test")
+    # Cached reads would answer repeat requests without the fake upstream; cache tests opt in.
+    monkeypatch.setenv("HTTP_CACHE_ENABLED", "false")
+    # Retries would otherwise back off for real seconds.
+    monkeypatch.setenv("DISPATCH_BACKOFF_BASE_SECONDS", "0.001")
+    asyncio.run(http_pool.aclose_http_clients())
+    http_pool._STATS.clear()
+    dispatcher.reset_dispatcher()
+    response_cache.reset_response_cache()
+    yield
+    asyncio.run(http_pool.aclose_http_clients())
+    http_pool._STATS.clear()
+    dispatcher.reset_dispatcher()
+    response_cache.reset_response_cache()
+
+
+@pytest.fixture(autouse=True)
+def reset_outbox(tmp_path, monkeypatch):
+    import outbox
+
+    monkeypatch.setenv("OUTBOX_DB_PATH", str(tmp_path / "outbox.sqlite3"))
+    monkeypatch.setattr(outbox, "_pool", outbox.OutboxWorkerPool())
+    outbox.reset_outbox_store()
+    yield
+    outbox.reset_outbox_store()
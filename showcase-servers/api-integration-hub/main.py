@@ -1,19 +1,50 @@
+import math
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Response
+from clients.dispatcher import UpstreamUnavailableError, get_dispatcher_stats
+from clients.http_pool import aclose_http_clients, get_http_pool_stats, start_http_clients
+from clients.response_cache import get_response_cache
+from outbox import get_outbox_pool
 from mcp_tools import (
     SlackMessageRequest,
     GitHubIssueRequest,
+    GitHubPullRequestsRequest,
+    GitHubCodeSearchRequest,
     StripeCustomerLookupRequest,
-    send_slack_message,
-    create_issue_and_optionally_notify,
-    lookup_stripe_customer,
+    asend_slack_message,
+    asubmit_slack_message,
+    acreate_issue_and_optionally_notify,
+    asubmit_issue_and_optionally_notify,
+    aget_job_status,
+    alist_github_pull_requests,
+    asearch_github_code,
+    alookup_stripe_customer,
 )
 
 PORT = int(os.getenv("PORT", "8102"))
 
-app = FastAPI(title="API Integration Hub MCP")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    start_http_clients()
+    get_outbox_pool().start()
+    yield
+    await get_outbox_pool().stop()
+    await aclose_http_clients()
+
+app = FastAPI(title="API Integration Hub MCP", lifespan=lifespan)
+
+def _upstream_http_error(e: Exception) -> HTTPException:
+    # Rate-limited or circuit-open upstreams are retryable: tell the caller when instead of a bare 400.
+    if isinstance(e, UpstreamUnavailableError):
+        return HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    return HTTPException(status_code=400, detail=str(e))
 
 COMMON_PATH = Path(__file__).resolve().parents[1] / "common"
 if str(COMMON_PATH) not in sys.path:
@@ -39,38 +70,114 @@ app.mount("/mcp", mcp.streamable_http_app())
 def health():
     return {"status": "ok", "mcp_endpoint": f"http://localhost:{PORT}/mcp"}
 
+@app.get("/http/pool-stats")
+def http_pool_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {"upstreams": get_http_pool_stats()}
+
+@app.get("/http/dispatcher-stats")
+def http_dispatcher_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {"upstreams": get_dispatcher_stats()}
+
+@app.get("/cache/stats")
+def cache_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return get_response_cache().stats()
+
+@app.post("/cache/clear")
+def cache_clear(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {"cleared": get_response_cache().clear()}
+
+@app.get("/jobs/{job_id}")
+async def job_status(
+    job_id: str,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        return await aget_job_status(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+
+@app.get("/outbox/stats")
+def outbox_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return get_outbox_pool().stats()
+
 @app.post("/slack/send")
-def slack_send(
+async def slack_send(
     req: SlackMessageRequest,
+    response: Response,
     _auth: None = Depends(verify_api_key),
     _rate_limit: None = Depends(enforce_rate_limit),
 ):
     try:
-        return send_slack_message(req)
+        if req.submit_async:
+            response.status_code = 202
+            return await asubmit_slack_message(req)
+        return await asend_slack_message(req)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _upstream_http_error(e)
 
 @app.post("/github/create-issue")
-def github_create_issue(
+async def github_create_issue(
     req: GitHubIssueRequest,
+    response: Response,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        if req.submit_async:
+            response.status_code = 202
+            return await asubmit_issue_and_optionally_notify(req)
+        return await acreate_issue_and_optionally_notify(req)
+    except Exception as e:
+        raise _upstream_http_error(e)
+
+@app.post("/github/pull-requests")
+async def github_pull_requests(
+    req: GitHubPullRequestsRequest,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        return await alist_github_pull_requests(req)
+    except Exception as e:
+        raise _upstream_http_error(e)
+
+@app.post("/github/search-code")
+async def github_search_code(
+    req: GitHubCodeSearchRequest,
     _auth: None = Depends(verify_api_key),
     _rate_limit: None = Depends(enforce_rate_limit),
 ):
     try:
-        return create_issue_and_optionally_notify(req)
+        return await asearch_github_code(req)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _upstream_http_error(e)
 
 @app.post("/stripe/customer")
-def stripe_customer(
+async def stripe_customer(
     req: StripeCustomerLookupRequest,
     _auth: None = Depends(verify_api_key),
     _rate_limit: None = Depends(enforce_rate_limit),
 ):
     try:
-        return lookup_stripe_customer(req)
+        return await alookup_stripe_customer(req)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _upstream_http_error(e)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,12 +1,20 @@
+import asyncio
+import logging
+import time
 from pydantic import BaseModel
 from typing import Optional
 from clients.slack_client import SlackClient
 from clients.github_client import GitHubClient
 from clients.stripe_client import StripeClient
+from outbox import GITHUB_CREATE_ISSUE, SLACK_POST_MESSAGE, asubmit_job, get_outbox_store
+
+logger = logging.getLogger("mcp.hub.tools")
 
 class SlackMessageRequest(BaseModel):
     channel: str
     text: str
+    submit_async: bool = False
+    idempotency_key: Optional[str] = None
 
 class GitHubIssueRequest(BaseModel):
     owner: str
@@ -14,30 +22,134 @@ class GitHubIssueRequest(BaseModel):
     title: str
     body: Optional[str] = None
     notify_slack_channel: Optional[str] = None
+    submit_async: bool = False
+    idempotency_key: Optional[str] = None
+
+class GitHubPullRequestsRequest(BaseModel):
+    owner: str
+    repo: str
+    state: str = "open"
+
+class GitHubCodeSearchRequest(BaseModel):
+    query: str
 
 class StripeCustomerLookupRequest(BaseModel):
     customer_id: str
+    allow_partial: bool = False
 
-def send_slack_message(payload: SlackMessageRequest):
-    client = SlackClient()
-    return client.post_message(payload.channel, payload.text)
+async def asend_slack_message(payload: SlackMessageRequest):
+    return await SlackClient().apost_message(payload.channel, payload.text)
 
-def create_issue_and_optionally_notify(payload: GitHubIssueRequest):
-    gh = GitHubClient()
-    issue = gh.create_issue(payload.owner, payload.repo, payload.title, payload.body)
-    if payload.notify_slack_channel:
-        slack = SlackClient()
-        text = f"New GitHub issue created: {issue.get('html_url')}"
-        slack.post_message(payload.notify_slack_channel, text)
+async def _aqueue_issue_notification(issue: dict, channel: str) -> dict:
+    text = f"New GitHub issue created: {issue.get('html_url')}"
+    job = await asubmit_job(SLACK_POST_MESSAGE, {"channel": channel, "text": text})
+    issue["slack_notification"] = {"channel": channel, "status": job["status"], "job_id": job["job_id"]}
     return issue
 
-def lookup_stripe_customer(payload: StripeCustomerLookupRequest):
+def _job_receipt(job: dict) -> dict:
+    return {**job, "status_url": f"/jobs/{job['job_id']}"}
+
+async def asubmit_slack_message(payload: SlackMessageRequest):
+    """Queue the message in the outbox and return its job; the worker pool sends it."""
+    job = await asubmit_job(
+        SLACK_POST_MESSAGE,
+        {"channel": payload.channel, "text": payload.text},
+        idempotency_key=payload.idempotency_key,
+    )
+    return _job_receipt(job)
+
+async def asubmit_issue_and_optionally_notify(payload: GitHubIssueRequest):
+    """Queue issue creation; its Slack notification is queued as a follow-up job once the issue exists."""
+    job = await asubmit_job(
+        GITHUB_CREATE_ISSUE,
+        payload.model_dump(include={"owner", "repo", "title", "body", "notify_slack_channel"}),
+        idempotency_key=payload.idempotency_key,
+    )
+    return _job_receipt(job)
+
+async def aget_job_status(job_id: str):
+    job = await asyncio.to_thread(get_outbox_store().get, job_id)
+    if job is None:
+        raise KeyError(job_id)
+    return job
+
+async def alist_github_pull_requests(payload: GitHubPullRequestsRequest):
+    gh = GitHubClient()
+    pulls = await gh.alist_pull_requests(payload.owner, payload.repo, payload.state)
+    return {"pull_requests": pulls, "cache": gh.cache_info["pull_requests"]}
+
+async def asearch_github_code(payload: GitHubCodeSearchRequest):
+    gh = GitHubClient()
+    results = await gh.asearch_code(payload.query)
+    return {**results, "cache": gh.cache_info["search_code"]}
+
+
+async def _timed(name: str, coro, timings: dict[str, float]):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+async def alookup_stripe_customer(payload: StripeCustomerLookupRequest):
+    """Fetch customer, charges and subscriptions concurrently.
+
+    By default the first failure cancels the other calls and is raised. With
+    allow_partial the successful parts are returned and failures are listed
+    under "errors". "timings_ms" has each call's latency plus the total, and
+    "cache" whether each part was served from the response cache and its age.
+    """
     stripe = StripeClient()
-    customer = stripe.retrieve_customer(payload.customer_id)
-    charges = stripe.list_charges(customer_id=payload.customer_id)
-    subs = stripe.list_subscriptions(customer_id=payload.customer_id)
-    return {
-        "customer": customer,
-        "charges": charges,
-        "subscriptions": subs,
+    start = time.perf_counter()
+    timings: dict[str, float] = {}
+    calls = {
+        "customer": stripe.aretrieve_customer(payload.customer_id),
+        "charges": stripe.alist_charges(customer_id=payload.customer_id),
+        "subscriptions": stripe.alist_subscriptions(customer_id=payload.customer_id),
     }
+    tasks = {name: asyncio.create_task(_timed(name, call, timings)) for name, call in calls.items()}
+    try:
+        if payload.allow_partial:
+            await asyncio.wait(tasks.values())
+        else:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            failed = next((task for task in done if task.exception() is not None), None)
+            if failed is not None:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                raise failed.exception()
+    except asyncio.CancelledError:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    result = {}
+    errors = {}
+    for name, task in tasks.items():
+        if task.exception() is not None:
+            result[name] = None
+            errors[name] = str(task.exception())
+        else:
+            result[name] = task.result()
+    result["cache"] = {name: stripe.cache_info[name] for name in calls if name in stripe.cache_info}
+    result["timings_ms"] = {name: timings[name] for name in calls if name in timings}
+    result["timings_ms"]["total"] = round((time.perf_counter() - start) * 1000, 2)
+    if payload.allow_partial:
+        result["errors"] = errors
+    return result
+
+
+async def acreate_issue_and_optionally_notify(payload: GitHubIssueRequest):
+    """Create the issue, then queue the Slack notification in the outbox.
+
+    The response returns as soon as GitHub answers; the notification is
+    delivered (and retried) by the outbox workers, so a failure or restart
+    does not lose it.
+    """
+    issue = await GitHubClient().acreate_issue(payload.owner, payload.repo, payload.title, payload.body)
+    if payload.notify_slack_channel:
+        await _aqueue_issue_notification(issue, payload.notify_slack_channel)
+    return issue
+
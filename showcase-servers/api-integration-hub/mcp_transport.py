@@ -9,10 +9,17 @@ from mcp.server.fastmcp import FastMCP
 from mcp_tools import (
     SlackMessageRequest,
     GitHubIssueRequest,
+    GitHubPullRequestsRequest,
+    GitHubCodeSearchRequest,
     StripeCustomerLookupRequest,
-    send_slack_message,
-    create_issue_and_optionally_notify,
-    lookup_stripe_customer,
+    asend_slack_message,
+    asubmit_slack_message,
+    acreate_issue_and_optionally_notify,
+    asubmit_issue_and_optionally_notify,
+    aget_job_status,
+    alist_github_pull_requests,
+    asearch_github_code,
+    alookup_stripe_customer,
 )
 
 mcp = FastMCP("api-integration-hub")
@@ -20,37 +27,103 @@ mcp = FastMCP("api-integration-hub")
 
 @mcp.tool(
     name="slack_send",
-    description="Send a message to a Slack channel.",
+    description=(
+        "Send a message to a Slack channel. With submit_async=true the message is queued and a "
+        "job_id is returned immediately; poll it with job_status. Reusing an idempotency_key "
+        "returns the original job instead of sending twice; without one, every call is a new job."
+    ),
 )
-def slack_send(channel: str, text: str) -> dict:
-    return send_slack_message(SlackMessageRequest(channel=channel, text=text))
+async def slack_send(channel: str, text: str, submit_async: bool = False, idempotency_key: str = "") -> dict:
+    payload = SlackMessageRequest(
+        channel=channel,
+        text=text,
+        submit_async=submit_async,
+        idempotency_key=idempotency_key if idempotency_key else None,
+    )
+    if payload.submit_async:
+        return await asubmit_slack_message(payload)
+    return await asend_slack_message(payload)
 
 
 @mcp.tool(
     name="github_create_issue",
-    description="Create a GitHub issue in any repo. Optionally notify a Slack channel.",
+    description=(
+        "Create a GitHub issue in any repo. Optionally notify a Slack channel; "
+        "the notification is queued and sent in the background after the issue is returned. "
+        "With submit_async=true the issue itself is queued and a job_id is returned immediately; "
+        "poll it with job_status. Reusing an idempotency_key returns the original job; without one, "
+        "every call is a new job."
+    ),
 )
-def github_create_issue(
+async def github_create_issue(
     owner: str,
     repo: str,
     title: str,
     body: str = "",
     notify_slack_channel: str = "",
+    submit_async: bool = False,
+    idempotency_key: str = "",
 ) -> dict:
-    return create_issue_and_optionally_notify(
-        GitHubIssueRequest(
-            owner=owner,
-            repo=repo,
-            title=title,
-            body=body if body else None,
-            notify_slack_channel=notify_slack_channel if notify_slack_channel else None,
-        )
+    payload = GitHubIssueRequest(
+        owner=owner,
+        repo=repo,
+        title=title,
+        body=body if body else None,
+        notify_slack_channel=notify_slack_channel if notify_slack_channel else None,
+        submit_async=submit_async,
+        idempotency_key=idempotency_key if idempotency_key else None,
     )
+    if payload.submit_async:
+        return await asubmit_issue_and_optionally_notify(payload)
+    return await acreate_issue_and_optionally_notify(payload)
+
+
+@mcp.tool(
+    name="job_status",
+    description=(
+        "Get the status of a queued Slack/GitHub job (queued, running, succeeded or failed), "
+        "with its attempts, result and last error."
+    ),
+)
+async def job_status(job_id: str) -> dict:
+    try:
+        return await aget_job_status(job_id)
+    except KeyError:
+        raise ValueError(f"Unknown job '{job_id}'") from None
+
+
+@mcp.tool(
+    name="github_list_pull_requests",
+    description=(
+        "List pull requests in a GitHub repo (state: open, closed or all). "
+        "Served from a short-lived cache; 'cache.age_seconds' shows how old the data is."
+    ),
+)
+async def github_list_pull_requests(owner: str, repo: str, state: str = "open") -> dict:
+    return await alist_github_pull_requests(GitHubPullRequestsRequest(owner=owner, repo=repo, state=state))
+
+
+@mcp.tool(
+    name="github_search_code",
+    description=(
+        "Search code on GitHub using GitHub search syntax (e.g. 'addClass repo:jquery/jquery'). "
+        "Served from a short-lived cache; 'cache.age_seconds' shows how old the data is."
+    ),
+)
+async def github_search_code(query: str) -> dict:
+    return await asearch_github_code(GitHubCodeSearchRequest(query=query))
 
 
 @mcp.tool(
     name="stripe_customer_lookup",
-    description="Look up a Stripe customer — returns profile, charge history, and active subscriptions.",
+    description=(
+        "Look up a Stripe customer — returns profile, charge history, and active subscriptions, "
+        "fetched concurrently with per-call timings. Set allow_partial=true to get whatever "
+        "succeeded (failed parts are null and listed under errors) instead of an error. "
+        "'cache' reports, per part, whether it came from the response cache and its age."
+    ),
 )
-def stripe_customer_lookup(customer_id: str) -> dict:
-    return lookup_stripe_customer(StripeCustomerLookupRequest(customer_id=customer_id))
+async def stripe_customer_lookup(customer_id: str, allow_partial: bool = False) -> dict:
+    return await alookup_stripe_customer(
+        StripeCustomerLookupRequest(customer_id=customer_id, allow_partial=allow_partial)
+    )
@@ -0,0 +1,433 @@
+"""
+Durable outbox for Slack sends and GitHub issue creation.
+
+Submitting a job writes it to a local SQLite file (OUTBOX_DB_PATH) and returns
+its ID immediately; a pool of OUTBOX_WORKERS asyncio workers drains the
+outbox in the background. Because the job is on disk before the request
+returns, a restart loses nothing: a worker claims a job under a lease
+(OUTBOX_LEASE_SECONDS), renews it while the handler runs, and jobs whose lease
+ran out (their worker died) are claimed again.
+
+The store is a blocking SQLite connection, so async callers go through
+asyncio.to_thread (asubmit_job, and the workers' claim/renew/finish calls)
+instead of stalling the event loop on disk I/O.
+
+Bookkeeping is exactly-once:
+
+- an idempotency key is UNIQUE, so resubmitting with the same key returns the
+  existing job instead of queueing a duplicate. Only the caller can say whether
+  two identical messages are a retry or two sends, so dedupe needs a
+  caller-supplied key; a job submitted without one is stored under its own ID
+  and never deduplicated;
+- every claim bumps the job's attempt number, and results are written only by
+  the worker holding the current attempt, so a late worker cannot overwrite
+  a newer outcome.
+
+Failed attempts are retried with jittered exponential backoff (honouring the
+dispatcher's retry_after) up to OUTBOX_MAX_ATTEMPTS. 4xx errors and Slack API
+errors are permanent and fail the job at once.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+
+from clients.dispatcher import UpstreamUnavailableError
+from clients.github_client import GitHubClient
+from clients.slack_client import SlackClient
+
+SLACK_POST_MESSAGE = "slack.post_message"
+GITHUB_CREATE_ISSUE = "github.create_issue"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+logger = logging.getLogger("mcp.hub.outbox")
+
+
+def get_store_path() -> str:
+    return os.getenv("OUTBOX_DB_PATH", "outbox.sqlite3").strip()
+
+
+def get_outbox_settings() -> dict:
+    return {
+        "workers": int(os.getenv("OUTBOX_WORKERS", "2")),
+        "max_attempts": int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+        "lease_seconds": float(os.getenv("OUTBOX_LEASE_SECONDS", "60")),
+        "poll_interval": float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1")),
+        "backoff_base": float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2")),
+        "backoff_max": float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "300")),
+    }
+
+
+def _job_dict(row: sqlite3.Row) -> dict:
+    return {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "idempotency_key": row["idempotency_key"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "next_attempt_at": row["next_attempt_at"] if row["status"] == QUEUED else None,
+    }
+
+
+class OutboxStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox_jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "idempotency_key TEXT NOT NULL UNIQUE, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "next_attempt_at REAL NOT NULL, lease_until REAL, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_jobs_due ON outbox_jobs (status, next_attempt_at)"
+            )
+
+    def submit(self, kind: str, payload: dict, idempotency_key: str | None = None) -> tuple[dict, bool]:
+        """Queue a job; return (job, created). An existing idempotency key returns that job instead.
+
+        Without an idempotency_key the job is keyed on its own ID, so it is always created.
+        """
+        job_id = uuid.uuid4().hex
+        idempotency_key = idempotency_key or job_id
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox_jobs (id, kind, payload, idempotency_key, status, max_attempts, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    kind,
+                    json.dumps(payload),
+                    idempotency_key,
+                    QUEUED,
+                    get_outbox_settings()["max_attempts"],
+                    now,
+                    now,
+                    now,
+                ),
+            )
+            row = self._conn.execute(
+                "SELECT * FROM outbox_jobs WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        job = _job_dict(row)
+        if job["kind"] != kind:
+            raise ValueError(f"Idempotency key already used for a {job['kind']} job")
+        return job, cursor.rowcount == 1
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox_jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def claim(self, lease_seconds: float) -> tuple[str, str, dict, int] | None:
+        """Lease the next due job (or one whose worker's lease expired); return (id, kind, payload, attempt)."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "UPDATE outbox_jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                "WHERE id = (SELECT id FROM outbox_jobs WHERE (status = ? AND next_attempt_at <= ?) "
+                "OR (status = ? AND lease_until < ?) ORDER BY next_attempt_at LIMIT 1) "
+                "RETURNING id, kind, payload, attempts",
+                (RUNNING, now + lease_seconds, now, QUEUED, now, RUNNING, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return row["id"], row["kind"], json.loads(row["payload"]), row["attempts"]
+
+    def renew(self, job_id: str, attempt: int, lease_seconds: float) -> bool:
+        """Extend the lease of a running attempt; False when the attempt is finished or was reclaimed."""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE outbox_jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                (now + lease_seconds, now, job_id, RUNNING, attempt),
+            )
+        return cursor.rowcount == 1
+
+    def checkpoint(self, job_id: str, result: dict) -> None:
+        """Store partial progress of a running job in its result; a retried attempt can read it back."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox_jobs SET result = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (json.dumps(result), time.time(), job_id, RUNNING),
+            )
+
+    def complete(self, job_id: str, attempt: int, result: dict) -> bool:
+        return self._finish(job_id, attempt, SUCCEEDED, json.dumps(result), None, None)
+
+    def fail(self, job_id: str, attempt: int, error: str, retry_at: float | None) -> bool:
+        """Record a failed attempt: requeue for retry_at, or mark the job failed when retry_at is None.
+
+        A checkpointed result is kept for the next attempt.
+        """
+        status = QUEUED if retry_at is not None else FAILED
+        return self._finish(job_id, attempt, status, None, error, retry_at)
+
+    def _finish(
+        self, job_id: str, attempt: int, status: str, result: str | None, error: str | None, retry_at: float | None
+    ) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            # Only the holder of the current attempt may record its outcome.
+            cursor = self._conn.execute(
+                "UPDATE outbox_jobs SET status = ?, result = COALESCE(?, result), error = ?, "
+                "next_attempt_at = COALESCE(?, next_attempt_at), lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND attempts = ?",
+                (status, result, error, retry_at, now, job_id, RUNNING, attempt),
+            )
+        return cursor.rowcount == 1
+
+    def next_due_in(self) -> float | None:
+        """Seconds until the next queued job is due (0 when overdue), or None when nothing is queued."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox_jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox_jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)}
+        counts.update({status: count for status, count in rows})
+        return {"path": self.path, "jobs": counts}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: OutboxStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_outbox_store() -> OutboxStore:
+    """Return the store for OUTBOX_DB_PATH, reopening it when the path changes."""
+    global _store
+    path = get_store_path()
+    if _store is None or _store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                if _store is not None:
+                    _store.close()
+                _store = OutboxStore(path)
+    return _store
+
+
+def reset_outbox_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
+
+
+def submit_job(kind: str, payload: dict, idempotency_key: str | None = None) -> dict:
+    job, created = get_outbox_store().submit(kind, payload, idempotency_key)
+    if created:
+        logger.info("outbox.submitted id=%s kind=%s", job["job_id"], kind)
+        _pool.wake()
+    return job
+
+
+async def asubmit_job(kind: str, payload: dict, idempotency_key: str | None = None) -> dict:
+    return await asyncio.to_thread(submit_job, kind, payload, idempotency_key)
+
+
+async def _run_slack_post_message(_job_id: str, payload: dict) -> dict:
+    return await SlackClient().apost_message(payload["channel"], payload["text"])
+
+
+async def _run_github_create_issue(job_id: str, payload: dict) -> dict:
+    store = get_outbox_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    issue = job["result"] if job is not None else None
+    if issue is None:
+        issue = await GitHubClient().acreate_issue(
+            payload["owner"], payload["repo"], payload["title"], payload.get("body")
+        )
+        # Checkpoint before queueing the notification: if that fails, the retry reuses this issue
+        # instead of opening a second one.
+        await asyncio.to_thread(store.checkpoint, job_id, issue)
+    channel = payload.get("notify_slack_channel")
+    if channel:
+        # Keyed on the parent job, so a re-run of this job never queues a second notification.
+        notify = await asubmit_job(
+            SLACK_POST_MESSAGE,
+            {"channel": channel, "text": f"New GitHub issue created: {issue.get('html_url')}"},
+            idempotency_key=f"{job_id}:slack_notification",
+        )
+        issue["slack_notification"] = {"channel": channel, "status": notify["status"], "job_id": notify["job_id"]}
+    return issue
+
+
+JOB_HANDLERS = {
+    SLACK_POST_MESSAGE: _run_slack_post_message,
+    GITHUB_CREATE_ISSUE: _run_github_create_issue,
+}
+
+
+def _retry_at(error: Exception, attempt: int, settings: dict) -> float | None:
+    """When to retry after error, or None when the failure is permanent or attempts are used up."""
+    if attempt >= settings["max_attempts"]:
+        return None
+    if isinstance(error, UpstreamUnavailableError):
+        return time.time() + error.retry_after
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500:
+        return None
+    if isinstance(error, (RuntimeError, KeyError, ValueError)):
+        # Slack API errors (channel_not_found, ...), missing tokens and bad payloads will not fix themselves.
+        return None
+    delay = min(settings["backoff_max"], settings["backoff_base"] * (2 ** (attempt - 1)))
+    return time.time() + random.uniform(delay / 2, delay)
+
+
+class OutboxWorkerPool:
+    def __init__(self) -> None:
+        self._tasks: list[asyncio.Task] = []
+        self._wake: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._stopping = False
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        workers = get_outbox_settings()["workers"]
+        self._tasks = [self._loop.create_task(self._worker(index)) for index in range(workers)]
+        logger.info("outbox.started workers=%s path=%s", workers, get_store_path())
+
+    async def stop(self, timeout_seconds: float = 10.0) -> None:
+        """Let in-flight jobs finish, then cancel; unfinished jobs are reclaimed after their lease."""
+        tasks, self._tasks = self._tasks, []
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+        if tasks:
+            _done, pending = await asyncio.wait(tasks, timeout=timeout_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def wake(self) -> None:
+        """Nudge idle workers after a submit; safe to call from any thread."""
+        if self._loop is None or self._wake is None or self._loop.is_closed():
+            return
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                self._wake.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _worker(self, index: int) -> None:
+        while not self._stopping:
+            try:
+                ran = await self.run_once()
+            except Exception:
+                logger.exception("outbox.worker_error worker=%s", index)
+                ran = False
+            if not ran:
+                await self._idle()
+
+    async def _idle(self) -> None:
+        poll_interval = get_outbox_settings()["poll_interval"]
+        due_in = await asyncio.to_thread(get_outbox_store().next_due_in)
+        timeout = poll_interval if due_in is None else min(poll_interval, due_in)
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run_once(self) -> bool:
+        """Claim and run one due job; return False when the outbox had nothing due."""
+        settings = get_outbox_settings()
+        store = get_outbox_store()
+        claimed = await asyncio.to_thread(store.claim, settings["lease_seconds"])
+        if claimed is None:
+            return False
+        job_id, kind, payload, attempt = claimed
+        handler = JOB_HANDLERS.get(kind)
+        renewer = asyncio.create_task(self._keep_lease(store, job_id, attempt, settings["lease_seconds"]))
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind '{kind}'")
+            result = await handler(job_id, payload)
+        except Exception as exc:
+            retry_at = _retry_at(exc, attempt, settings)
+            await asyncio.to_thread(store.fail, job_id, attempt, str(exc), retry_at)
+            if retry_at is None:
+                self.failed += 1
+                logger.warning("outbox.job_failed id=%s kind=%s attempt=%s error=%s", job_id, kind, attempt, exc)
+            else:
+                self.retried += 1
+                logger.info(
+                    "outbox.job_retry id=%s kind=%s attempt=%s delay_s=%.2f",
+                    job_id,
+                    kind,
+                    attempt,
+                    retry_at - time.time(),
+                )
+            return True
+        finally:
+            renewer.cancel()
+        if not await asyncio.to_thread(store.complete, job_id, attempt, result):
+            logger.warning("outbox.stale_completion id=%s attempt=%s", job_id, attempt)
+        self.processed += 1
+        return True
+
+    async def _keep_lease(self, store: OutboxStore, job_id: str, attempt: int, lease_seconds: float) -> None:
+        """Renew the lease while the handler runs, so a slow upstream call is not claimed and run again."""
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not await asyncio.to_thread(store.renew, job_id, attempt, lease_seconds):
+                logger.warning("outbox.lease_lost id=%s attempt=%s", job_id, attempt)
+                return
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            **get_outbox_store().stats(),
+        }
+
+
+_pool = OutboxWorkerPool()
+
+
+def get_outbox_pool() -> OutboxWorkerPool:
+    return _pool
@@ -0,0 +1,229 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from clients import dispatcher
+from clients.http_pool import get_async_http_client, get_http_client
+
+STRIPE_URL = "https://api.stripe.com/v1/customers"
+SLACK_URL = "https://slack.com/api"
+
+
+def _stats(upstream: str) -> dict:
+    return next(entry for entry in dispatcher.get_dispatcher_stats() if entry["upstream"] == upstream)
+
+
+def _circuit_state(upstream: str) -> str:
+    return _stats(upstream)["circuit_state"]
+
+
+def test_cancelled_probe_reopens_the_breaker_instead_of_wedging_it(fake_upstream, monkeypatch):
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "1")
+    monkeypatch.setenv("CIRCUIT_RESET_SECONDS", "0.05")
+
+    async def slow(_request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        client = get_async_http_client("stripe")
+        fake_upstream.respond(httpx.Response(503))
+        await dispatcher.asend(client, "stripe", "POST", STRIPE_URL)
+        assert _circuit_state("stripe") == dispatcher.OPEN
+
+        await asyncio.sleep(0.06)
+        fake_upstream.respond(slow)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(dispatcher.asend(client, "stripe", "GET", STRIPE_URL), timeout=0.05)
+        assert _circuit_state("stripe") == dispatcher.OPEN
+
+        await asyncio.sleep(0.06)
+        fake_upstream.respond(httpx.Response(200, json={}))
+        response = await dispatcher.asend(client, "stripe", "GET", STRIPE_URL)
+        assert response.status_code == 200
+        assert _circuit_state("stripe") == dispatcher.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_slack_methods_take_tokens_from_their_tiers_bucket(fake_upstream, monkeypatch):
+    monkeypatch.setenv("SLACK_POST_MESSAGE_RATE_LIMIT_PER_SECOND", "0.01")
+    monkeypatch.setenv("SLACK_POST_MESSAGE_RATE_LIMIT_BURST", "1")
+    client = get_http_client("slack")
+    dispatcher.send(client, "slack", "POST", f"{SLACK_URL}/chat.postMessage")
+
+    start = time.monotonic()
+    dispatcher.send(client, "slack", "GET", f"{SLACK_URL}/search.messages")
+    dispatcher.send(client, "slack", "GET", f"{SLACK_URL}/conversations.list")
+    assert time.monotonic() - start < 0.5
+
+    rate_limits = _stats("slack")["rate_limits"]
+    assert rate_limits["post_message"]["tokens_available"] == 0
+    assert rate_limits["tier2"]["burst"] == 3
+    assert rate_limits["tier2"]["tokens_available"] == pytest.approx(1, abs=0.01)
+    assert dispatcher.get_rate_limit_tier("slack", f"{SLACK_URL}/users.info") == dispatcher.SLACK_DEFAULT_TIER
+    assert dispatcher.get_rate_limit_tier("github", "https://api.github.com/search/code") == dispatcher.DEFAULT_TIER
+
+
+def test_token_bucket_spaces_calls_beyond_the_burst_and_refills(fake_upstream, monkeypatch):
+    monkeypatch.setenv("STRIPE_RATE_LIMIT_PER_SECOND", "20")
+    monkeypatch.setenv("STRIPE_RATE_LIMIT_BURST", "2")
+    client = get_http_client("stripe")
+
+    start = time.monotonic()
+    for _ in range(4):
+        dispatcher.send(client, "stripe", "GET", STRIPE_URL)
+    # Two calls ride the burst; the next two wait 1/20s each for a token.
+    assert time.monotonic() - start >= 0.09
+    assert _stats("stripe")["rate_limits"]["default"]["tokens_available"] == 0
+
+    time.sleep(0.1)
+    dispatcher.send(client, "stripe", "GET", STRIPE_URL)
+    assert _stats("stripe")["rate_limits"]["default"]["tokens_available"] == pytest.approx(1, abs=0.2)
+
+
+def test_rate_limited_responses_are_retried_after_retry_after(fake_upstream):
+    fake_upstream.respond(
+        httpx.Response(429, headers={"Retry-After": "0.1"}),
+        httpx.Response(200, json={"id": "cus_1"}),
+    )
+
+    start = time.monotonic()
+    response = dispatcher.send(get_http_client("stripe"), "stripe", "POST", STRIPE_URL)
+
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 0.1
+    stats = _stats("stripe")
+    assert (stats["rate_limited"], stats["retries"], stats["failures"]) == (1, 1, 0)
+
+
+def test_github_rate_limit_403_waits_for_the_reset(fake_upstream, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(dispatcher.time, "sleep", sleeps.append)
+    reset_at = time.time() + 5
+    fake_upstream.respond(
+        httpx.Response(403, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset_at)}),
+        httpx.Response(200, json=[]),
+    )
+
+    response = dispatcher.send(get_http_client("github"), "github", "GET", "https://api.github.com/search/code")
+
+    assert response.status_code == 200
+    assert sleeps[-1] == pytest.approx(5, abs=0.5)
+
+
+def test_waits_beyond_the_retry_budget_become_503_with_retry_after(fake_upstream, api_client, monkeypatch):
+    monkeypatch.setenv("DISPATCH_MAX_RETRY_WAIT_SECONDS", "10")
+    fake_upstream.respond(httpx.Response(429, headers={"Retry-After": "120"}))
+
+    response = api_client.post("/github/search-code", json={"query": "addClass"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "120"
+    assert len(fake_upstream.requests) == 1
+
+
+def test_server_errors_back_off_exponentially_for_idempotent_requests_only(fake_upstream, monkeypatch):
+    monkeypatch.setenv("DISPATCH_MAX_RETRIES", "3")
+    monkeypatch.setenv("DISPATCH_BACKOFF_BASE_SECONDS", "0.5")
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "100")
+    monkeypatch.setattr(dispatcher.time, "sleep", lambda seconds: None)
+    ceilings = []
+    monkeypatch.setattr(dispatcher.random, "uniform", lambda low, high: ceilings.append(high) or 0.0)
+    fake_upstream.respond(httpx.Response(503))
+    client = get_http_client("stripe")
+
+    response = dispatcher.send(client, "stripe", "GET", STRIPE_URL)
+    assert response.status_code == 503
+    assert len(fake_upstream.requests) == 4
+    # Full jitter: each delay is drawn from [0, base * 2**attempt].
+    assert ceilings == [0.5, 1.0, 2.0]
+
+    dispatcher.send(client, "stripe", "POST", STRIPE_URL)
+    assert len(fake_upstream.requests) == 5
+
+
+def test_connect_errors_are_retried_even_for_posts(fake_upstream):
+    request = httpx.Request("POST", STRIPE_URL)
+    fake_upstream.respond(httpx.ConnectError("refused", request=request), httpx.Response(200, json={}))
+
+    response = dispatcher.send(get_http_client("stripe"), "stripe", "POST", STRIPE_URL)
+
+    assert response.status_code == 200
+    assert len(fake_upstream.requests) == 2
+
+
+def test_circuit_opens_sheds_then_closes_after_a_successful_probe(fake_upstream, monkeypatch):
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "2")
+    monkeypatch.setenv("CIRCUIT_RESET_SECONDS", "0.1")
+    client = get_http_client("stripe")
+    fake_upstream.respond(httpx.Response(503))
+
+    dispatcher.send(client, "stripe", "POST", STRIPE_URL)
+    assert _circuit_state("stripe") == dispatcher.CLOSED
+    dispatcher.send(client, "stripe", "POST", STRIPE_URL)
+    assert _circuit_state("stripe") == dispatcher.OPEN
+
+    with pytest.raises(dispatcher.UpstreamUnavailableError) as excinfo:
+        dispatcher.send(client, "stripe", "POST", STRIPE_URL)
+    assert 0 < excinfo.value.retry_after <= 0.1
+    assert len(fake_upstream.requests) == 2
+
+    # After the reset period one probe is let through; a failed probe re-opens at once.
+    time.sleep(0.11)
+    dispatcher.send(client, "stripe", "POST", STRIPE_URL)
+    assert _circuit_state("stripe") == dispatcher.OPEN
+
+    time.sleep(0.11)
+    fake_upstream.respond(httpx.Response(200, json={}))
+    assert dispatcher.send(client, "stripe", "POST", STRIPE_URL).status_code == 200
+    stats = _stats("stripe")
+    assert stats["circuit_state"] == dispatcher.CLOSED
+    assert stats["consecutive_failures"] == 0
+    assert (stats["shed"], stats["circuit_opened"]) == (1, 2)
+
+
+def test_half_open_circuit_sheds_calls_while_the_probe_is_in_flight(fake_upstream, monkeypatch):
+    monkeypatch.setenv("CIRCUIT_FAILURE_THRESHOLD", "1")
+    monkeypatch.setenv("CIRCUIT_RESET_SECONDS", "0.05")
+
+    async def slow(_request):
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, json={})
+
+    async def scenario():
+        client = get_async_http_client("stripe")
+        fake_upstream.respond(httpx.Response(503))
+        await dispatcher.asend(client, "stripe", "POST", STRIPE_URL)
+        await asyncio.sleep(0.06)
+        fake_upstream.respond(slow)
+        probe = asyncio.create_task(dispatcher.asend(client, "stripe", "GET", STRIPE_URL))
+        await asyncio.sleep(0.02)
+        assert _circuit_state("stripe") == dispatcher.HALF_OPEN
+        with pytest.raises(dispatcher.UpstreamUnavailableError):
+            await dispatcher.asend(client, "stripe", "GET", STRIPE_URL)
+        assert (await probe).status_code == 200
+        assert _circuit_state("stripe") == dispatcher.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_token_waits_beyond_the_retry_budget_are_rejected_not_queued(fake_upstream, monkeypatch):
+    monkeypatch.setenv("STRIPE_RATE_LIMIT_PER_SECOND", "0.1")
+    monkeypatch.setenv("STRIPE_RATE_LIMIT_BURST", "1")
+    monkeypatch.setenv("DISPATCH_MAX_RETRY_WAIT_SECONDS", "5")
+    client = get_http_client("stripe")
+    dispatcher.send(client, "stripe", "GET", STRIPE_URL)
+
+    start = time.monotonic()
+    for _ in range(3):
+        with pytest.raises(dispatcher.UpstreamUnavailableError) as excinfo:
+            dispatcher.send(client, "stripe", "GET", STRIPE_URL)
+        # Rejected callers hand their token back, so the wait does not grow with the burst.
+        assert excinfo.value.retry_after == pytest.approx(10, abs=0.5)
+    assert time.monotonic() - start < 0.5
+    assert len(fake_upstream.requests) == 1
+    stats = _stats("stripe")
+    assert (stats["requests"], stats["shed"], stats["queue_depth"]) == (1, 3, 0)
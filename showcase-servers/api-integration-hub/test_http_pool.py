@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from clients import http_pool
+from clients.github_client import GitHubClient
+from clients.slack_client import SlackClient
+from clients.stripe_client import StripeClient
+
+
+def test_clients_share_one_pooled_client_per_upstream(fake_upstream):
+    assert SlackClient().client is SlackClient().client
+    assert SlackClient().async_client is SlackClient().async_client
+    assert GitHubClient().client is not StripeClient().client
+    assert http_pool.get_http_client("stripe") is StripeClient().client
+
+
+def test_close_releases_clients_and_next_use_reopens(fake_upstream):
+    client = http_pool.get_http_client("slack")
+    async_client = http_pool.get_async_http_client("slack")
+
+    asyncio.run(http_pool.aclose_http_clients())
+
+    assert client.is_closed
+    assert async_client.is_closed
+    reopened = http_pool.get_http_client("slack")
+    assert reopened is not client
+    assert not reopened.is_closed
+
+
+def test_pool_stats_count_requests_per_upstream(fake_upstream):
+    client = http_pool.get_http_client("github")
+    for _ in range(3):
+        client.get("https://api.github.com/rate_limit")
+
+    async def fetch():
+        await http_pool.get_async_http_client("github").get("https://api.github.com/rate_limit")
+
+    asyncio.run(fetch())
+
+    stats = {entry["upstream"]: entry for entry in http_pool.get_http_pool_stats()}
+    assert stats["github"]["requests"] == 4
+    assert stats["github"]["open"] is True
+    assert stats["github"]["async_open"] is True
+    assert len(fake_upstream.requests) == 4
+
+
+def test_app_lifespan_opens_and_closes_shared_clients(fake_upstream):
+    import main
+
+    with TestClient(main.app):
+        clients = [http_pool.get_http_client(upstream) for upstream in http_pool.UPSTREAMS]
+        assert all(not client.is_closed for client in clients)
+        assert {entry["upstream"] for entry in http_pool.get_http_pool_stats()} == set(http_pool.UPSTREAMS)
+    assert all(client.is_closed for client in clients)
@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+import pytest
+
+import mcp_tools
+import mcp_transport
+from mcp_tools import StripeCustomerLookupRequest
+
+
+def _stripe_routes(failing: str | None = None, delay: float = 0.0):
+    """Answer Stripe reads by path; the call named failing gets a 404."""
+    in_flight = {"now": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        name = request.url.path.rsplit("/", 1)[-1]
+        name = "customer" if name.startswith("cus_") else name
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            in_flight["now"] -= 1
+        if name == failing:
+            return httpx.Response(404, json={"error": {"message": "No such " + name}})
+        if name == "customer":
+            return httpx.Response(200, json={"id": "cus_1"})
+        return httpx.Response(200, json={"data": [{"object": name}]})
+
+    return handler, in_flight
+
+
+def test_stripe_lookup_fetches_all_parts_concurrently(fake_upstream):
+    handler, in_flight = _stripe_routes(delay=0.05)
+    fake_upstream.respond(handler)
+
+    result = asyncio.run(mcp_tools.alookup_stripe_customer(StripeCustomerLookupRequest(customer_id="cus_1")))
+
+    assert in_flight["peak"] == 3
+    assert result["customer"] == {"id": "cus_1"}
+    assert result["charges"]["data"] == [{"object": "charges"}]
+    assert result["subscriptions"]["data"] == [{"object": "subscriptions"}]
+    assert set(result["timings_ms"]) == {"customer", "charges", "subscriptions", "total"}
+    assert "errors" not in result
+
+
+def test_stripe_lookup_raises_first_failure_by_default(fake_upstream):
+    handler, _in_flight = _stripe_routes(failing="charges")
+    fake_upstream.respond(handler)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(mcp_tools.alookup_stripe_customer(StripeCustomerLookupRequest(customer_id="cus_1")))
+
+
+def test_stripe_lookup_allow_partial_returns_what_succeeded(fake_upstream):
+    handler, _in_flight = _stripe_routes(failing="charges")
+    fake_upstream.respond(handler)
+
+    result = asyncio.run(
+        mcp_tools.alookup_stripe_customer(StripeCustomerLookupRequest(customer_id="cus_1", allow_partial=True))
+    )
+
+    assert result["customer"] == {"id": "cus_1"}
+    assert result["charges"] is None
+    assert result["subscriptions"]["data"] == [{"object": "subscriptions"}]
+    assert list(result["errors"]) == ["charges"]
+    assert "404" in result["errors"]["charges"]
+
+
+def test_mcp_tools_wait_for_rate_limits_without_blocking_the_loop(fake_upstream, monkeypatch):
+    monkeypatch.setenv("SLACK_POST_MESSAGE_RATE_LIMIT_PER_SECOND", "10")
+    monkeypatch.setenv("SLACK_POST_MESSAGE_RATE_LIMIT_BURST", "1")
+    fake_upstream.respond(httpx.Response(200, json={"ok": True, "items": [], "total_count": 0}))
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await mcp_transport.slack_send("#ops", "one")
+        # The second message waits ~0.1s for a token; the loop keeps running meanwhile.
+        await mcp_transport.slack_send("#ops", "two")
+        await mcp_transport.github_list_pull_requests("octo", "hub")
+        await mcp_transport.github_search_code("addClass")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+    assert len(fake_upstream.requests) == 4
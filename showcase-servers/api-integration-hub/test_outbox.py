@@ -0,0 +1,233 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import outbox
+
+
+def test_running_jobs_keep_their_lease_past_lease_seconds(monkeypatch):
+    monkeypatch.setenv("OUTBOX_LEASE_SECONDS", "0.15")
+    calls = []
+
+    async def slow_handler(job_id, payload):
+        calls.append(job_id)
+        await asyncio.sleep(0.5)
+        return {"ok": True}
+
+    monkeypatch.setitem(outbox.JOB_HANDLERS, "test.slow", slow_handler)
+
+    async def scenario():
+        job = outbox.submit_job("test.slow", {})
+        run = asyncio.create_task(outbox.get_outbox_pool().run_once())
+        await asyncio.sleep(0.35)
+        # Well past the original lease, but the worker is still renewing it.
+        assert outbox.get_outbox_store().claim(0.15) is None
+        assert await run is True
+        return job["job_id"]
+
+    job_id = asyncio.run(scenario())
+    job = outbox.get_outbox_store().get(job_id)
+    assert job["status"] == outbox.SUCCEEDED
+    assert job["attempts"] == 1
+    assert calls == [job_id]
+
+
+def test_submit_dedupes_only_on_a_caller_supplied_key():
+    first = outbox.submit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "deployed"}, "deploy-42")
+    again = outbox.submit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "deployed"}, "deploy-42")
+    assert again["job_id"] == first["job_id"]
+
+    unkeyed = [outbox.submit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "deployed"}) for _ in range(2)]
+    assert unkeyed[0]["job_id"] != unkeyed[1]["job_id"]
+    assert outbox.get_outbox_store().stats()["jobs"][outbox.QUEUED] == 3
+
+
+def test_store_calls_run_off_the_event_loop(fake_upstream, monkeypatch):
+    claim = outbox.OutboxStore.claim
+
+    def slow_claim(self, lease_seconds):
+        time.sleep(0.2)
+        return claim(self, lease_seconds)
+
+    monkeypatch.setattr(outbox.OutboxStore, "claim", slow_claim)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        job = await outbox.asubmit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "hi"})
+        assert await outbox.get_outbox_pool().run_once() is True
+        task.cancel()
+        return job, ticks
+
+    job, ticks = asyncio.run(scenario())
+    assert ticks >= 10
+    assert outbox.get_outbox_store().get(job["job_id"])["status"] == outbox.SUCCEEDED
+
+
+def test_claim_and_complete_round_trip():
+    store = outbox.get_outbox_store()
+    job, created = store.submit(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "hi"})
+    assert created and job["status"] == outbox.QUEUED
+
+    job_id, kind, payload, attempt = store.claim(60)
+    assert (job_id, kind, attempt) == (job["job_id"], outbox.SLACK_POST_MESSAGE, 1)
+    assert payload == {"channel": "#ops", "text": "hi"}
+    assert store.get(job_id)["status"] == outbox.RUNNING
+    assert store.claim(60) is None
+
+    assert store.complete(job_id, attempt, {"ok": True}) is True
+    finished = store.get(job_id)
+    assert finished["status"] == outbox.SUCCEEDED
+    assert finished["result"] == {"ok": True}
+
+
+def test_expired_lease_is_reclaimed_and_the_old_attempt_is_fenced_off():
+    store = outbox.get_outbox_store()
+    job, _created = store.submit(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "hi"})
+    _job_id, _kind, _payload, first_attempt = store.claim(0.05)
+
+    time.sleep(0.06)
+    _job_id, _kind, _payload, second_attempt = store.claim(60)
+    assert second_attempt == first_attempt + 1
+
+    # The worker whose lease expired can neither renew nor record an outcome.
+    assert store.renew(job["job_id"], first_attempt, 60) is False
+    assert store.complete(job["job_id"], first_attempt, {"ok": "stale"}) is False
+    assert store.complete(job["job_id"], second_attempt, {"ok": True}) is True
+    assert store.get(job["job_id"])["result"] == {"ok": True}
+
+
+def test_transient_failures_retry_then_dead_letter(fake_upstream, monkeypatch):
+    monkeypatch.setenv("OUTBOX_MAX_ATTEMPTS", "2")
+    monkeypatch.setenv("OUTBOX_BACKOFF_BASE_SECONDS", "0")
+    monkeypatch.setenv("DISPATCH_MAX_RETRIES", "0")
+    fake_upstream.respond(httpx.Response(503))
+    pool = outbox.get_outbox_pool()
+
+    async def scenario():
+        job = await outbox.asubmit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "hi"})
+        assert await pool.run_once() is True
+        retried = outbox.get_outbox_store().get(job["job_id"])
+        assert (retried["status"], retried["attempts"]) == (outbox.QUEUED, 1)
+        assert "503" in retried["error"]
+        assert await pool.run_once() is True
+        return job["job_id"]
+
+    job = outbox.get_outbox_store().get(asyncio.run(scenario()))
+    assert (job["status"], job["attempts"]) == (outbox.FAILED, 2)
+    assert (pool.retried, pool.failed, pool.processed) == (1, 1, 0)
+
+
+def test_permanent_errors_fail_without_retry(fake_upstream):
+    fake_upstream.respond(httpx.Response(200, json={"ok": False, "error": "channel_not_found"}))
+
+    async def scenario():
+        job = await outbox.asubmit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#nope", "text": "hi"})
+        await outbox.get_outbox_pool().run_once()
+        return job["job_id"]
+
+    job = outbox.get_outbox_store().get(asyncio.run(scenario()))
+    assert (job["status"], job["attempts"]) == (outbox.FAILED, 1)
+    assert "channel_not_found" in job["error"]
+
+
+def test_rate_limited_jobs_are_requeued_after_retry_after(fake_upstream, monkeypatch):
+    monkeypatch.setenv("DISPATCH_MAX_RETRY_WAIT_SECONDS", "1")
+    fake_upstream.respond(httpx.Response(429, headers={"Retry-After": "30"}))
+
+    async def scenario():
+        job = await outbox.asubmit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": "hi"})
+        await outbox.get_outbox_pool().run_once()
+        return job["job_id"]
+
+    job = outbox.get_outbox_store().get(asyncio.run(scenario()))
+    assert job["status"] == outbox.QUEUED
+    assert job["next_attempt_at"] - time.time() == pytest.approx(30, abs=2)
+
+
+def test_worker_pool_drains_jobs_and_stops(fake_upstream, monkeypatch):
+    monkeypatch.setenv("OUTBOX_WORKERS", "2")
+    monkeypatch.setenv("OUTBOX_POLL_INTERVAL_SECONDS", "5")
+    pool = outbox.get_outbox_pool()
+
+    async def scenario():
+        pool.start()
+        assert pool.stats()["workers"] == 2
+        jobs = [
+            await outbox.asubmit_job(outbox.SLACK_POST_MESSAGE, {"channel": "#ops", "text": str(index)})
+            for index in range(3)
+        ]
+        # Submitting wakes idle workers; they do not wait out the poll interval.
+        for _ in range(100):
+            if outbox.get_outbox_store().stats()["jobs"][outbox.SUCCEEDED] == 3:
+                break
+            await asyncio.sleep(0.02)
+        await pool.stop(timeout_seconds=1)
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    assert all(outbox.get_outbox_store().get(job["job_id"])["status"] == outbox.SUCCEEDED for job in jobs)
+    assert pool.stats()["workers"] == 0
+    assert pool.processed == 3
+    assert len(fake_upstream.requests) == 3
+
+
+def test_async_submission_endpoints_return_a_pollable_job(fake_upstream, api_client):
+    response = api_client.post(
+        "/slack/send", json={"channel": "#ops", "text": "hi", "submit_async": True, "idempotency_key": "k1"}
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status_url"] == f"/jobs/{job['job_id']}"
+
+    again = api_client.post(
+        "/slack/send", json={"channel": "#ops", "text": "hi", "submit_async": True, "idempotency_key": "k1"}
+    )
+    assert again.json()["job_id"] == job["job_id"]
+
+    for _ in range(100):
+        status = api_client.get(job["status_url"]).json()
+        if status["status"] == outbox.SUCCEEDED:
+            break
+        time.sleep(0.02)
+    assert status["status"] == outbox.SUCCEEDED
+    assert api_client.get("/jobs/missing").status_code == 404
+
+
+def test_retried_issue_job_reuses_the_issue_it_already_created(fake_upstream, monkeypatch):
+    monkeypatch.setenv("OUTBOX_BACKOFF_BASE_SECONDS", "0")
+    fake_upstream.respond(httpx.Response(201, json={"number": 1, "html_url": "https://github.com/octo/hub/issues/1"}))
+    asubmit_job = outbox.asubmit_job
+    attempts = []
+
+    async def flaky_submit(kind, payload, idempotency_key=None):
+        attempts.append(kind)
+        if kind == outbox.SLACK_POST_MESSAGE and len(attempts) == 2:
+            raise OSError("disk full")
+        return await asubmit_job(kind, payload, idempotency_key)
+
+    monkeypatch.setattr(outbox, "asubmit_job", flaky_submit)
+    payload = {"owner": "octo", "repo": "hub", "title": "Broken", "notify_slack_channel": "#ops"}
+
+    async def scenario():
+        job = await outbox.asubmit_job(outbox.GITHUB_CREATE_ISSUE, payload)
+        pool = outbox.get_outbox_pool()
+        await pool.run_once()
+        assert outbox.get_outbox_store().get(job["job_id"])["status"] == outbox.QUEUED
+        await pool.run_once()
+        return job["job_id"]
+
+    job = outbox.get_outbox_store().get(asyncio.run(scenario()))
+    assert job["status"] == outbox.SUCCEEDED
+    assert job["result"]["number"] == 1
+    assert job["result"]["slack_notification"]["status"] == outbox.QUEUED
+    assert [request.method for request in fake_upstream.requests] == ["POST"]
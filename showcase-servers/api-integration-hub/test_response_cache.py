@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from clients import response_cache
+from clients.github_client import GitHubClient
+from clients.stripe_client import StripeClient
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.values = {}
+        self.sets = {}
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.threads.add(threading.get_ident())
+        self.values[key] = value
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def expire(self, key, seconds):
+        pass
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+
+
+def _enable_cache(monkeypatch, ttl_seconds: str = "60") -> None:
+    monkeypatch.setenv("HTTP_CACHE_ENABLED", "true")
+    monkeypatch.setenv("STRIPE_CACHE_TTL_SECONDS", ttl_seconds)
+    monkeypatch.setenv("GITHUB_CACHE_TTL_SECONDS", ttl_seconds)
+
+
+def test_cached_reads_skip_the_upstream_until_the_ttl_expires(fake_upstream, monkeypatch):
+    _enable_cache(monkeypatch, ttl_seconds="0.2")
+    fake_upstream.respond(httpx.Response(200, json={"id": "cus_1"}))
+    stripe = StripeClient()
+
+    assert stripe.retrieve_customer("cus_1") == {"id": "cus_1"}
+    assert stripe.cache_info["customer"]["hit"] is False
+    assert stripe.retrieve_customer("cus_1") == {"id": "cus_1"}
+    assert stripe.cache_info["customer"]["hit"] is True
+    assert len(fake_upstream.requests) == 1
+
+    time.sleep(0.25)
+    stripe.retrieve_customer("cus_1")
+    assert stripe.cache_info["customer"]["hit"] is False
+    assert len(fake_upstream.requests) == 2
+
+
+def test_cache_entries_are_not_shared_across_credentials(fake_upstream, monkeypatch):
+    _enable_cache(monkeypatch)
+    StripeClient().retrieve_customer("cus_1")
+    monkeypatch.setenv("STRIPE_API_KEY", "sk_other")
+    StripeClient().retrieve_customer("cus_1")
+    assert len(fake_upstream.requests) == 2
+
+
+def test_stale_github_reads_revalidate_with_etag(fake_upstream, monkeypatch):
+    _enable_cache(monkeypatch, ttl_seconds="0")
+    pulls = [{"number": 7}]
+    fake_upstream.respond(
+        httpx.Response(200, json=pulls, headers={"ETag": '"v1"'}),
+        httpx.Response(304, headers={"ETag": '"v1"'}),
+    )
+    github = GitHubClient()
+
+    assert github.list_pull_requests("octo", "hub") == pulls
+    assert github.list_pull_requests("octo", "hub") == pulls
+
+    assert "if-none-match" not in fake_upstream.requests[0].headers
+    assert fake_upstream.requests[1].headers["if-none-match"] == '"v1"'
+    assert github.cache_info["pull_requests"]["hit"] is True
+    assert github.cache_info["pull_requests"]["revalidated"] is True
+    assert response_cache.get_response_cache().stats()["revalidated"] == 1
+
+
+def test_creating_an_issue_invalidates_the_repos_cached_reads(fake_upstream, monkeypatch):
+    _enable_cache(monkeypatch)
+    github = GitHubClient()
+    github.list_pull_requests("octo", "hub")
+    github.list_pull_requests("octo", "other")
+    assert len(fake_upstream.requests) == 2
+
+    github.create_issue("Octo", "Hub", "Broken build")
+    github.list_pull_requests("octo", "hub")
+    github.list_pull_requests("octo", "other")
+
+    assert [request.method for request in fake_upstream.requests] == ["GET", "GET", "POST", "GET"]
+    assert github.cache_info["pull_requests"]["hit"] is True
+    assert response_cache.get_response_cache().stats()["invalidations"] == 1
+
+
+def test_invalidation_reaches_entries_shared_through_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(response_cache, "_create_redis_client", lambda: fake_redis)
+    writer = response_cache.ResponseCache()
+    writer.set("pulls", [{"number": 7}], etag=None, ttl_seconds=60, scope="github:octo/hub")
+    writer.set("search", {"items": []}, etag=None, ttl_seconds=60)
+
+    other_worker = response_cache.ResponseCache()
+    other_worker.invalidate("github:octo/hub")
+
+    assert writer.redis_client.get(response_cache.REDIS_KEY_PREFIX + "pulls") is None
+    assert other_worker.get("search") is not None
+
+
+def test_async_reads_do_redis_io_off_the_event_loop(fake_upstream, monkeypatch):
+    _enable_cache(monkeypatch)
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(response_cache, "_create_redis_client", lambda: fake_redis)
+    fake_upstream.respond(httpx.Response(200, json={"id": "cus_1"}))
+
+    async def scenario():
+        stripe = StripeClient()
+        await stripe.aretrieve_customer("cus_1")
+        response_cache.get_response_cache().clear()
+        # Memory is empty, so this read is answered from Redis.
+        await stripe.aretrieve_customer("cus_1")
+        return threading.get_ident(), stripe.cache_info["customer"]
+
+    loop_thread, cache_info = asyncio.run(scenario())
+    assert cache_info["hit"] is True
+    assert len(fake_upstream.requests) == 1
+    assert fake_redis.threads and loop_thread not in fake_redis.threads
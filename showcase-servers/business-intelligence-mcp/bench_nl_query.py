@@ -0,0 +1,370 @@
+"""
+Benchmark suite for the /nl-query pipeline using local stand-ins only.
+
+Seeds a SQLite database, then runs NL queries through the pipeline stages
+and reports p50/p95/p99 latency and req/s for each stage, for every
+combination of concurrency level and result size:
+
+- generation     LLM call (deterministic fake provider, or LocalProvider
+                 against a fake OpenAI-compatible server with --provider local)
+- validation     normalize_sql + validate_sql_is_safe + enforce_row_limit
+- execution      arun_query on the pooled engine
+- serialization  encode_json of the response body
+- endpoint       full POST /nl-query through the ASGI app (auth, rate limit,
+                 routing, caches disabled), measured in a separate pass
+
+Stage req/s is requests / (stage busy time / concurrency): the rate the stage
+alone could sustain at that concurrency. The run's req/s is requests / wall time.
+
+    python bench_nl_query.py --concurrency 1,8,32 --result-rows 10,1000,10000 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+STAGES = ("generation", "validation", "execution", "serialization")
+QUERY_PATTERN = re.compile(r"first (?P<rows>\d+) customers")
+REGIONS = ("north", "south", "east", "west", "apac", "emea")
+
+# Every request must do the full work: no caches, coalescing, templates or learned pairs.
+BENCH_ENV = {
+    "NL_CACHE_ENABLED": "false",
+    "RESULT_CACHE_ENABLED": "false",
+    "SINGLE_FLIGHT_ENABLED": "false",
+    "SQL_TEMPLATES_ENABLED": "false",
+    "FEWSHOT_ENABLED": "false",
+    "SCHEMA_INTROSPECTION_ENABLED": "false",
+    "SQL_EXPLAIN_ENABLED": "false",
+    "RATE_LIMIT_REQUESTS": "100000000",
+    "RATE_LIMIT_WINDOW_SECONDS": "60",
+    "LOG_LEVEL": "WARNING",
+}
+
+
+def seed_database(path: Path, rows: int, seed: int) -> str:
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT, region TEXT, "
+            "revenue REAL, signup_date TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO customers VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    index,
+                    f"Customer {index:07d}",
+                    rng.choice(REGIONS),
+                    round(rng.lognormvariate(7, 1.2), 2),
+                    f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                )
+                for index in range(1, rows + 1)
+            ),
+        )
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def sql_for_query(nl_query: str) -> str:
+    match = QUERY_PATTERN.search(nl_query)
+    limit = int(match.group("rows")) if match else 10
+    return f"SELECT customer_id, name, region, revenue, signup_date FROM customers ORDER BY customer_id LIMIT {limit};"
+
+
+def build_fake_provider(latency_ms: float):
+    from llm_provider import LLMProvider
+
+    class DeterministicLLMProvider(LLMProvider):
+        """Maps "first N customers" to a fixed SQL shape after a fixed delay."""
+
+        model = "bench-fake"
+
+        def generate_sql(self, nl_query, schema_hint=None, examples=None):
+            time.sleep(latency_ms / 1000)
+            return sql_for_query(nl_query)
+
+        async def agenerate_sql(self, nl_query, schema_hint=None, examples=None):
+            await asyncio.sleep(latency_ms / 1000)
+            return sql_for_query(nl_query)
+
+    return DeterministicLLMProvider()
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible /v1/chat/completions stand-in for LocalProvider.
+
+    Streams the SQL a few characters per event (token_delay_ms apart) followed
+    by trailing prose, like a chatty local model, or answers in one JSON body
+    when the request does not ask for a stream.
+    """
+
+    TRAILER = " This query returns the requested customers ordered by id."
+
+    def __init__(self, token_delay_ms: float) -> None:
+        delay = token_delay_ms / 1000
+        trailer = self.TRAILER
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                text = sql_for_query(body["messages"][-1]["content"]) + trailer
+                try:
+                    if body.get("stream"):
+                        self._stream(text)
+                    else:
+                        time.sleep(delay * max(1, len(text) // 4))
+                        payload = json.dumps({"choices": [{"message": {"content": text}}]}).encode()
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self.send_header("Content-Length", str(len(payload)))
+                        self.end_headers()
+                        self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client closed the stream after a complete statement.
+                    self.close_connection = True
+
+            def _stream(self, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for start in range(0, len(text), 4):
+                    time.sleep(delay)
+                    event = json.dumps({"choices": [{"delta": {"content": text[start : start + 4]}}]})
+                    self.wfile.write(f"data: {event}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_stage(samples_ms: list[float], concurrency: int) -> dict:
+    ordered = sorted(samples_ms)
+    busy_seconds = sum(ordered) / 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": round(busy_seconds * 1000 / len(ordered), 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50), 3),
+        "p95_ms": round(percentile(ordered, 0.95), 3),
+        "p99_ms": round(percentile(ordered, 0.99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+        "req_per_s": round(len(ordered) * concurrency / busy_seconds, 2) if busy_seconds else 0.0,
+    }
+
+
+async def run_pipeline_request(provider, nl_query: str) -> dict[str, float]:
+    from db import arun_query
+    from encoders import encode_json
+    from mcp_tools import normalize_sql, validate_sql_is_safe
+    from sql_guard import enforce_row_limit
+
+    timings = {}
+    start = time.perf_counter()
+    generated = await provider.agenerate_sql_timed(nl_query, None, None)
+    mark = time.perf_counter()
+    timings["generation"] = (mark - start) * 1000
+
+    sql = normalize_sql(generated)
+    validate_sql_is_safe(sql)
+    sql = enforce_row_limit(sql)
+    start, mark = mark, time.perf_counter()
+    timings["validation"] = (mark - start) * 1000
+
+    rows = await arun_query(sql)
+    start, mark = mark, time.perf_counter()
+    timings["execution"] = (mark - start) * 1000
+
+    encode_json({"sql": sql, "rows": rows})
+    timings["serialization"] = (time.perf_counter() - mark) * 1000
+    return timings
+
+
+async def run_level(provider, concurrency: int, result_rows: int, requests: int, endpoint: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    errors = 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            try:
+                timings = await run_pipeline_request(provider, f"list the first {result_rows} customers (#{index})")
+            except Exception:
+                errors += 1
+                return
+            for stage, value in timings.items():
+                samples[stage].append(value)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    wall_seconds = time.perf_counter() - start
+    level = {
+        "concurrency": concurrency,
+        "result_rows": result_rows,
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall_seconds, 3),
+        "req_per_s": round((requests - errors) / wall_seconds, 2) if wall_seconds else 0.0,
+        "stages": {stage: summarize_stage(values, concurrency) for stage, values in samples.items()},
+    }
+    if endpoint:
+        level["stages"]["endpoint"], level["endpoint_errors"] = await run_endpoint_level(
+            concurrency, result_rows, requests
+        )
+    return level
+
+
+async def run_endpoint_level(concurrency: int, result_rows: int, requests: int) -> tuple[dict, int]:
+    import httpx
+    import main
+
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+    errors = 0
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"X-API-Key": os.environ["API_KEY"]}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+
+        async def one(index: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/nl-query", json={"query": f"list the first {result_rows} customers (#{index})"}
+                )
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                samples.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(one(index) for index in range(requests)))
+    return summarize_stage(samples, concurrency), errors
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency/result-size level")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8, 32])
+    parser.add_argument("--result-rows", type=_int_list, default=[10, 1000, 10000])
+    parser.add_argument("--db-rows", type=int, default=50000, help="rows seeded into the customers table")
+    parser.add_argument("--seed", type=int, default=1729)
+    parser.add_argument("--provider", choices=("fake", "local"), default="fake")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="fake provider delay per call")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="fake server delay per streamed event")
+    parser.add_argument("--no-endpoint", dest="endpoint", action="store_false", help="skip the /nl-query pass")
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args(argv)
+
+
+async def run_benchmark(args: argparse.Namespace, workdir: Path, llm_url: str | None) -> dict:
+    import db
+    import llm_provider
+    import mcp_tools
+
+    saved_env, saved_get_provider = dict(os.environ), mcp_tools.get_llm_provider
+    os.environ.update(BENCH_ENV)
+    os.environ["API_KEY"] = "bench-" + os.urandom(8).hex()
+    os.environ["SQL_MAX_ROWS"] = str(max(args.result_rows))
+    os.environ["DB_URL"] = seed_database(workdir / "bench.db", args.db_rows, args.seed)
+    if llm_url is not None:
+        os.environ["LLM_PROVIDER"] = "local"
+        os.environ["LOCAL_LLM_URL"] = llm_url
+        provider = llm_provider.get_llm_provider()
+    else:
+        provider = build_fake_provider(args.llm_latency_ms)
+        mcp_tools.get_llm_provider = lambda: provider
+
+    levels = []
+    try:
+        for result_rows in args.result_rows:
+            for concurrency in args.concurrency:
+                levels.append(await run_level(provider, concurrency, result_rows, args.requests, args.endpoint))
+    finally:
+        await db.adispose_engines()
+        db.dispose_engines()
+        await llm_provider.aclose_llm_provider()
+        mcp_tools.get_llm_provider = saved_get_provider
+        os.environ.clear()
+        os.environ.update(saved_env)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "provider": args.provider,
+            "llm_latency_ms": args.llm_latency_ms,
+            "token_delay_ms": args.token_delay_ms,
+            "db_rows": args.db_rows,
+            "seed": args.seed,
+            "requests_per_level": args.requests,
+        },
+        "levels": levels,
+    }
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="bi-bench-") as workdir:
+        if args.provider == "local":
+            with FakeOpenAIServer(args.token_delay_ms) as server:
+                results = asyncio.run(run_benchmark(args, Path(workdir), server.url))
+        else:
+            results = asyncio.run(run_benchmark(args, Path(workdir), None))
+    Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    for level in results["levels"]:
+        stages = "  ".join(
+            f"{stage}={values['p50_ms']}/{values['p95_ms']}/{values['p99_ms']}ms"
+            for stage, values in level["stages"].items()
+        )
+        print(f"c={level['concurrency']:<3} rows={level['result_rows']:<6} {level['req_per_s']:>9} req/s  {stages}")
+    print(f"wrote {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import pathlib
+import sys
+
+import pytest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import db
+from llm_provider import LLMProvider
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'bi.db'}"
+    monkeypatch.setenv("DB_URL", db_url)
+    db.dispose_engines()
+    with db.connect() as conn:
+        conn.exec_driver_sql("CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT, revenue REAL)")
+        conn.exec_driver_sql(
+            "INSERT INTO customers VALUES (1, 'Acme', 120.0), (2, 'Globex', 80.0), (3, 'Initech', 45.5)"
+        )
+        conn.commit()
+    yield db_url
+    db.dispose_engines()
+
+
+class FakeLLMProvider(LLMProvider):
+    def __init__(self, sql: str) -> None:
+        self.sql = sql
+        self.calls = 0
+        self.schema_hints = []
+        self.examples = []
+
+    def generate_sql(self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None) -> str:
+        self.calls += 1
+        self.schema_hints.append(schema_hint)
+        self.examples.append(examples)
+        return self.sql
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    import mcp_tools
+
+    provider = FakeLLMProvider("SELECT customer_id, name, revenue FROM customers ORDER BY customer_id;")
+    monkeypatch.setattr(mcp_tools, "get_llm_provider", lambda: provider)
+    return provider
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setenv("API_KEY", "secret")
+    monkeypatch.delenv("API_KEYS", raising=False)
+    monkeypatch.delenv("REVOKED_API_KEYS", raising=False)
+    monkeypatch.setenv("RATE_LIMIT_REQUESTS", "100")
+    monkeypatch.setenv("RATE_LIMIT_WINDOW_SECONDS", "60")
+    main.app.state.rate_limit_store.clear()
+    with TestClient(main.app) as client:
+        client.headers["X-API-Key"] = "secret"
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def reset_caches(tmp_path, monkeypatch):
+    import fewshot_store
+    import pagination
+    import result_cache
+    import schema_cache
+    import single_flight
+    import translation_cache
+
+    # Background introspection would change the effective schema hint mid-test.
+    monkeypatch.setenv("SCHEMA_INTROSPECTION_ENABLED", "false")
+    # Bundled templates would answer some test questions without the fake LLM.
+    monkeypatch.setenv("SQL_TEMPLATES_ENABLED", "false")
+    # Learned pairs would persist between tests; tests that need the store opt in.
+    monkeypatch.setenv("FEWSHOT_ENABLED", "false")
+    monkeypatch.setenv("EXPORT_DIR", str(tmp_path / "exports"))
+    schema_cache.get_schema_cache().clear()
+    translation_cache.reset_translation_cache()
+    result_cache.reset_result_cache()
+    pagination.reset_cursor_store()
+    single_flight.reset_single_flight()
+    fewshot_store.reset_fewshot_store()
+    yield
+    translation_cache.reset_translation_cache()
+    result_cache.reset_result_cache()
+    pagination.reset_cursor_store()
+    single_flight.reset_single_flight()
+    fewshot_store.reset_fewshot_store()
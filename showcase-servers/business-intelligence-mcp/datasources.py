@@ -0,0 +1,265 @@
+"""
+Named data-source registry with read-replica routing.
+
+Each data source has a primary DSN and optional read replicas; every DSN gets
+its own pooled engine in db.py (idle engines are evicted LRU beyond
+DB_MAX_ENGINES). The "default" source is built from DB_URL plus
+DB_REPLICA_URLS; more sources come from DATA_SOURCES (inline JSON) or
+DATA_SOURCES_PATH (JSON file):
+
+    {"acme": {"primary": "postgresql://...", "replicas": ["postgresql://..."],
+              "routing": "least_connections", "max_lag_seconds": 30}}
+
+Reads go to a healthy replica chosen round-robin (default) or by fewest
+checked-out connections, and to the primary when no replica is healthy. A
+background checker probes replicas every DB_HEALTH_CHECK_INTERVAL_SECONDS and
+ejects those that fail or lag more than max_lag_seconds until they recover.
+Cache keys and schema introspection always use the primary DSN.
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from db import connect, get_checked_out
+
+ROUTING_POLICIES = ("round_robin", "least_connections")
+
+logger = logging.getLogger("mcp.bi.datasources")
+
+
+def get_default_source_name() -> str:
+    return os.getenv("DEFAULT_DATA_SOURCE", "default").strip() or "default"
+
+
+def get_health_check_interval_seconds() -> float:
+    return float(os.getenv("DB_HEALTH_CHECK_INTERVAL_SECONDS", "10"))
+
+
+def _split_urls(value: str) -> list[str]:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+
+def load_source_config() -> dict[str, dict]:
+    sources: dict[str, dict] = {}
+    db_url = os.getenv("DB_URL")
+    if db_url:
+        sources["default"] = {
+            "primary": db_url,
+            "replicas": _split_urls(os.getenv("DB_REPLICA_URLS", "")),
+            "routing": os.getenv("DB_REPLICA_ROUTING", "round_robin"),
+            "max_lag_seconds": float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "30")),
+        }
+    path = os.getenv("DATA_SOURCES_PATH", "").strip()
+    if path:
+        with open(path, encoding="utf-8") as handle:
+            sources.update(json.load(handle))
+    inline = os.getenv("DATA_SOURCES", "").strip()
+    if inline:
+        sources.update(json.loads(inline))
+    return sources
+
+
+def probe_lag_seconds(dsn: str) -> float | None:
+    """Replication lag for a replica in seconds (0 when unknown/not applicable), None when stopped."""
+    with connect(dsn) as conn:
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            return conn.execute(
+                text(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+                )
+            ).scalar()
+        if dialect == "mysql":
+            try:
+                status = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+            except Exception:
+                status = conn.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+            if status is None:
+                return 0.0
+            lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+            return None if lag is None else float(lag)
+        conn.execute(text("SELECT 1"))
+        return 0.0
+
+
+class Replica:
+    def __init__(self, dsn: str) -> None:
+        self.dsn = dsn
+        self.healthy = True
+        self.lag_seconds: float | None = None
+        self.last_error: str | None = None
+        self.checked_at: float | None = None
+
+
+class DataSource:
+    def __init__(self, name: str, config: dict) -> None:
+        routing = config.get("routing", "round_robin")
+        if routing not in ROUTING_POLICIES:
+            raise ValueError(f"Data source '{name}' has unknown routing '{routing}'")
+        self.name = name
+        self.primary = config["primary"]
+        self.replicas = [Replica(dsn) for dsn in config.get("replicas", [])]
+        self.routing = routing
+        self.max_lag_seconds = float(config.get("max_lag_seconds", 30))
+        self._round_robin = itertools.count()
+
+    def route_read(self) -> str:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.primary
+        if self.routing == "least_connections":
+            offset = next(self._round_robin)
+            # Rotate before min() so ties are spread instead of always hitting the first replica.
+            rotated = healthy[offset % len(healthy) :] + healthy[: offset % len(healthy)]
+            return min(rotated, key=lambda replica: get_checked_out(replica.dsn)).dsn
+        return healthy[next(self._round_robin) % len(healthy)].dsn
+
+    def check_replicas(self) -> None:
+        for replica in self.replicas:
+            try:
+                lag = probe_lag_seconds(replica.dsn)
+                replica.lag_seconds = lag
+                replica.last_error = None if lag is not None else "replication stopped"
+                healthy = lag is not None and lag <= self.max_lag_seconds
+            except Exception as e:
+                replica.last_error = str(e)
+                healthy = False
+            if healthy != replica.healthy:
+                logger.warning(
+                    "datasources.replica_%s source=%s dsn=%s lag=%s error=%s",
+                    "restored" if healthy else "ejected",
+                    self.name,
+                    make_url(replica.dsn).render_as_string(hide_password=True),
+                    replica.lag_seconds,
+                    replica.last_error,
+                )
+            replica.healthy = healthy
+            replica.checked_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "primary": make_url(self.primary).render_as_string(hide_password=True),
+            "routing": self.routing,
+            "max_lag_seconds": self.max_lag_seconds,
+            "replicas": [
+                {
+                    "dsn": make_url(replica.dsn).render_as_string(hide_password=True),
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "last_error": replica.last_error,
+                    "checked_at": replica.checked_at,
+                    "checked_out": get_checked_out(replica.dsn),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+class DataSourceRegistry:
+    def __init__(self, config: dict[str, dict]) -> None:
+        self.sources = {name: DataSource(name, source) for name, source in config.items()}
+
+    def get(self, name: str | None = None) -> DataSource:
+        name = name or get_default_source_name()
+        source = self.sources.get(name)
+        if source is None:
+            if not self.sources:
+                raise RuntimeError("DB_URL is not set")
+            raise ValueError(f"Unknown database '{name}'. Configured: {', '.join(sorted(self.sources))}")
+        return source
+
+    def check_health(self) -> None:
+        for source in self.sources.values():
+            source.check_replicas()
+
+    def stats(self) -> list[dict]:
+        return [source.stats() for source in self.sources.values()]
+
+
+def _registry_config() -> tuple:
+    """Env settings that require rebuilding the registry when they change."""
+    return (
+        os.getenv("DB_URL"),
+        os.getenv("DB_REPLICA_URLS"),
+        os.getenv("DB_REPLICA_ROUTING"),
+        os.getenv("DB_REPLICA_MAX_LAG_SECONDS"),
+        os.getenv("DATA_SOURCES"),
+        os.getenv("DATA_SOURCES_PATH"),
+    )
+
+
+_current: tuple[tuple, DataSourceRegistry] | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DataSourceRegistry:
+    global _current
+    config = _registry_config()
+    current = _current
+    if current is not None and current[0] == config:
+        return current[1]
+    with _registry_lock:
+        if _current is None or _current[0] != config:
+            _current = (config, DataSourceRegistry(load_source_config()))
+        return _current[1]
+
+
+def get_primary_url(database: str | None = None) -> str:
+    return get_registry().get(database).primary
+
+
+def route_read_url(database: str | None = None) -> str:
+    return get_registry().get(database).route_read()
+
+
+class HealthChecker:
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(get_health_check_interval_seconds()):
+            try:
+                get_registry().check_health()
+            except Exception:
+                logger.warning("datasources.health_check_failed", exc_info=True)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+_health_checker = HealthChecker()
+
+
+def start_health_checks() -> None:
+    """Start the background replica checker when any data source has replicas."""
+    try:
+        registry = get_registry()
+    except Exception:
+        logger.warning("datasources.config_invalid", exc_info=True)
+        return
+    if any(source.replicas for source in registry.sources.values()):
+        _health_checker.start()
+
+
+def stop_health_checks() -> None:
+    _health_checker.stop()
@@ -1,16 +1,382 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import ArgumentError, NoSuchModuleError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from collections import OrderedDict
+from typing import Iterator
+import asyncio
 import os
+import threading
+import time
 
-def get_engine() -> Engine:
+# Insertion order doubles as LRU order: engines are moved to the end on every use.
+_ENGINES: "OrderedDict[str, Engine]" = OrderedDict()
+_ASYNC_ENGINES: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+_DISPOSE_TASKS: set[asyncio.Task] = set()
+_ASYNC_UNAVAILABLE: set[str] = set()
+_ACQUIRE_STATS: dict[str, dict] = {}
+_ENGINE_LOCK = threading.Lock()
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+    "sqlite": "aiosqlite",
+}
+
+
+def get_db_url() -> str:
     db_url = os.getenv("DB_URL")
     if not db_url:
         raise RuntimeError("DB_URL is not set")
-    return create_engine(db_url)
+    return db_url
+
+
+def get_stream_batch_size() -> int:
+    return int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+
+def get_stream_max_rows() -> int:
+    """Row cap for streamed and paged results; defaults to SQL_MAX_ROWS so streaming is not a bigger loophole."""
+    return int(os.getenv("STREAM_MAX_ROWS", "").strip() or os.getenv("SQL_MAX_ROWS", "10000"))
+
+
+def get_statement_timeout_ms() -> int:
+    return int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+def get_pool_settings() -> dict:
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").strip().lower() == "true",
+    }
+
+
+def get_max_engines() -> int:
+    return int(os.getenv("DB_MAX_ENGINES", "32"))
+
+
+def _engine_kwargs(db_url: str) -> dict:
+    settings = get_pool_settings()
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite uses a singleton-per-thread pool without sizing options.
+        return {"pool_pre_ping": settings["pool_pre_ping"]}
+    return settings
+
+
+def _checked_out(engine: Engine) -> int:
+    pool = engine.pool
+    return pool.checkedout() if hasattr(pool, "checkedout") else 0
+
+
+def get_checked_out(db_url: str) -> int:
+    """Connections currently in use for a DSN across its sync and async pools."""
+    engines = [_ENGINES.get(db_url)]
+    async_engine = _ASYNC_ENGINES.get(db_url)
+    if async_engine is not None:
+        engines.append(async_engine.sync_engine)
+    return sum(_checked_out(engine) for engine in engines if engine is not None)
+
+
+def _touch(registry: OrderedDict, db_url: str) -> None:
+    with _ENGINE_LOCK:
+        if db_url in registry:
+            registry.move_to_end(db_url)
+
+
+def _evict_idle_engines() -> None:
+    """Dispose least-recently-used engines with no checked-out connections beyond DB_MAX_ENGINES.
+
+    Caller holds _ENGINE_LOCK.
+    """
+    max_engines = get_max_engines()
+    for db_url in list(_ENGINES):
+        if len(_ENGINES) <= max_engines:
+            break
+        engine = _ENGINES[db_url]
+        if _checked_out(engine):
+            continue
+        del _ENGINES[db_url]
+        _ACQUIRE_STATS.pop(db_url, None)
+        engine.dispose()
+    for db_url in list(_ASYNC_ENGINES):
+        if len(_ASYNC_ENGINES) <= max_engines:
+            break
+        engine = _ASYNC_ENGINES[db_url]
+        if _checked_out(engine.sync_engine):
+            continue
+        del _ASYNC_ENGINES[db_url]
+        _ACQUIRE_STATS.pop(_async_stats_key(db_url), None)
+        _dispose_async_engine(engine)
+
+
+def _dispose_async_engine(engine: AsyncEngine) -> None:
+    try:
+        task = asyncio.get_running_loop().create_task(engine.dispose())
+    except RuntimeError:
+        # No loop to await on: drop the pool and let connections close on GC.
+        engine.sync_engine.dispose(close=False)
+        return
+    _DISPOSE_TASKS.add(task)
+    task.add_done_callback(_DISPOSE_TASKS.discard)
+
+
+def get_engine(db_url: str | None = None) -> Engine:
+    db_url = db_url or get_db_url()
+    engine = _ENGINES.get(db_url)
+    if engine is not None:
+        _touch(_ENGINES, db_url)
+        return engine
+
+    with _ENGINE_LOCK:
+        engine = _ENGINES.get(db_url)
+        if engine is None:
+            engine = create_engine(db_url, **_engine_kwargs(db_url))
+            install_statement_timeout(engine)
+            _ENGINES[db_url] = engine
+            _evict_idle_engines()
+    return engine
+
+
+def install_statement_timeout(engine: Engine) -> None:
+    """Apply SQL_STATEMENT_TIMEOUT_MS to every new connection: statement_timeout on
+    PostgreSQL, max_execution_time on MySQL, a progress-handler deadline on SQLite."""
+    timeout_ms = get_statement_timeout_ms()
+    if timeout_ms <= 0:
+        return
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, "connect")
+    def _set_timeout(dbapi_connection, connection_record):
+        if dialect == "postgresql":
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET statement_timeout = {timeout_ms}")
+            cursor.close()
+        elif dialect == "mysql":
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET SESSION max_execution_time = {timeout_ms}")
+            cursor.close()
+        elif dialect == "sqlite" and hasattr(dbapi_connection, "set_progress_handler"):
+            deadline = {"at": float("inf")}
+            dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline["at"], 1000)
+            connection_record.info["statement_deadline"] = deadline
+
+    if dialect == "sqlite":
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start_deadline(conn, _cursor, _statement, _parameters, _context, _executemany):
+            deadline = conn.connection.info.get("statement_deadline")
+            if deadline is not None:
+                deadline["at"] = time.monotonic() + timeout_ms / 1000
+
 
-def run_query(sql: str, params: dict | None = None):
-    engine = get_engine()
-    with engine.connect() as conn:
+def _record_acquire(db_url: str, wait_ms: float) -> None:
+    with _ENGINE_LOCK:
+        stats = _ACQUIRE_STATS.setdefault(db_url, {"acquisitions": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0})
+        stats["acquisitions"] += 1
+        stats["wait_ms_total"] += wait_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], wait_ms)
+
+
+def connect(db_url: str | None = None):
+    db_url = db_url or get_db_url()
+    engine = get_engine(db_url)
+    start = time.perf_counter()
+    conn = engine.connect()
+    _record_acquire(db_url, (time.perf_counter() - start) * 1000)
+    return conn
+
+
+def get_async_db_url(db_url: str) -> str:
+    """Map a sync DSN onto its async driver (asyncpg / aiomysql / aiosqlite)."""
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None:
+        raise ArgumentError(f"No async driver configured for {backend}")
+    return url.set(drivername=f"{backend}+{driver}").render_as_string(hide_password=False)
+
+
+def get_async_engine(db_url: str | None = None) -> AsyncEngine:
+    db_url = db_url or get_db_url()
+    engine = _ASYNC_ENGINES.get(db_url)
+    if engine is not None:
+        _touch(_ASYNC_ENGINES, db_url)
+        return engine
+
+    with _ENGINE_LOCK:
+        engine = _ASYNC_ENGINES.get(db_url)
+        if engine is None:
+            engine = create_async_engine(get_async_db_url(db_url), **_engine_kwargs(db_url))
+            install_statement_timeout(engine.sync_engine)
+            _ASYNC_ENGINES[db_url] = engine
+            _evict_idle_engines()
+    return engine
+
+
+def _async_stats_key(db_url: str) -> str:
+    return f"async:{db_url}"
+
+
+def _async_engine_or_none(db_url: str) -> AsyncEngine | None:
+    """Return the async engine, or None when no async driver is installed for the DSN."""
+    if db_url in _ASYNC_UNAVAILABLE:
+        return None
+    try:
+        return get_async_engine(db_url)
+    except (ArgumentError, NoSuchModuleError, ImportError):
+        _ASYNC_UNAVAILABLE.add(db_url)
+        return None
+
+
+async def arun_query(sql: str, params: dict | None = None, db_url: str | None = None):
+    """Run a query on the async engine; fall back to the sync pool in a worker thread
+    when no async driver is installed for the configured database."""
+    db_url = db_url or get_db_url()
+    engine = _async_engine_or_none(db_url)
+    if engine is None:
+        return await asyncio.to_thread(run_query, sql, params, db_url)
+
+    start = time.perf_counter()
+    async with engine.connect() as conn:
+        _record_acquire(_async_stats_key(db_url), (time.perf_counter() - start) * 1000)
+        result = await conn.execute(text(sql), params or {})
+        rows = [dict(r._mapping) for r in result]
+    return rows
+
+
+def run_query_columnar(
+    sql: str, params: dict | None = None, db_url: str | None = None
+) -> tuple[list[str], list[tuple]]:
+    """Return (column names, row tuples) straight from the DBAPI cursor, without per-row dicts."""
+    with connect(db_url) as conn:
+        result = conn.execute(text(sql), params or {})
+        columns = list(result.keys())
+        rows = result.cursor.fetchall() if result.cursor is not None else []
+        result.close()
+    return columns, rows
+
+
+async def arun_query_columnar(
+    sql: str, params: dict | None = None, db_url: str | None = None
+) -> tuple[list[str], list[tuple]]:
+    db_url = db_url or get_db_url()
+    engine = _async_engine_or_none(db_url)
+    if engine is None:
+        return await asyncio.to_thread(run_query_columnar, sql, params, db_url)
+
+    start = time.perf_counter()
+    async with engine.connect() as conn:
+        _record_acquire(_async_stats_key(db_url), (time.perf_counter() - start) * 1000)
+        result = await conn.execute(text(sql), params or {})
+        columns = list(result.keys())
+        rows = [tuple(row) for row in result]
+    return columns, rows
+
+
+def get_pool_stats() -> list[dict]:
+    stats = []
+    engines = [(db_url, db_url, engine, "sync") for db_url, engine in list(_ENGINES.items())]
+    engines += [
+        (db_url, _async_stats_key(db_url), engine.sync_engine, "async")
+        for db_url, engine in list(_ASYNC_ENGINES.items())
+    ]
+    for db_url, stats_key, engine, mode in engines:
+        pool = engine.pool
+        acquire = _ACQUIRE_STATS.get(stats_key, {"acquisitions": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0})
+        acquisitions = acquire["acquisitions"]
+        stats.append(
+            {
+                "dsn": make_url(db_url).render_as_string(hide_password=True),
+                "mode": mode,
+                "pool_class": type(pool).__name__,
+                "size": pool.size() if hasattr(pool, "size") else None,
+                "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+                "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+                "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+                "acquisitions": acquisitions,
+                "wait_ms_avg": round(acquire["wait_ms_total"] / acquisitions, 3) if acquisitions else 0.0,
+                "wait_ms_max": round(acquire["wait_ms_max"], 3),
+            }
+        )
+    return stats
+
+
+def dispose_engines() -> None:
+    with _ENGINE_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _ACQUIRE_STATS.clear()
+
+
+async def adispose_engines() -> None:
+    with _ENGINE_LOCK:
+        engines = list(_ASYNC_ENGINES.values())
+        _ASYNC_ENGINES.clear()
+        _ASYNC_UNAVAILABLE.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+def run_query(sql: str, params: dict | None = None, db_url: str | None = None):
+    with connect(db_url) as conn:
         result = conn.execute(text(sql), params or {})
         rows = [dict(r._mapping) for r in result]
     return rows
+
+
+def stream_query(
+    sql: str,
+    params: dict | None = None,
+    batch_size: int | None = None,
+    max_rows: int | None = None,
+    db_url: str | None = None,
+) -> Iterator[list[dict]]:
+    """Yield result rows in batches using a server-side cursor, stopping at max_rows."""
+    batch_size = batch_size or get_stream_batch_size()
+    max_rows = get_stream_max_rows() if max_rows is None else max_rows
+    emitted = 0
+    with connect(db_url) as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql), params or {})
+        try:
+            for partition in result.mappings().partitions(batch_size):
+                batch = [dict(row) for row in partition[: max_rows - emitted]]
+                emitted += len(batch)
+                if batch:
+                    yield batch
+                if emitted >= max_rows:
+                    break
+        finally:
+            result.close()
+
+
+def stream_query_columnar(
+    sql: str,
+    params: dict | None = None,
+    batch_size: int | None = None,
+    max_rows: int | None = None,
+    db_url: str | None = None,
+) -> Iterator[tuple[list[str], list[tuple]]]:
+    """Like stream_query but yields (column names, row tuples) per batch, without per-row dicts."""
+    batch_size = batch_size or get_stream_batch_size()
+    max_rows = get_stream_max_rows() if max_rows is None else max_rows
+    emitted = 0
+    with connect(db_url) as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(text(sql), params or {})
+        try:
+            columns = list(result.keys())
+            for partition in result.partitions(batch_size):
+                batch = [tuple(row) for row in partition[: max_rows - emitted]]
+                emitted += len(batch)
+                if batch:
+                    yield columns, batch
+                if emitted >= max_rows:
+                    break
+            if not emitted:
+                # Empty results still report their columns so writers can emit a header/schema.
+                yield columns, []
+        finally:
+            result.close()
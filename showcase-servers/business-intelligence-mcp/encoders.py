@@ -0,0 +1,84 @@
+"""
+Result encoders for /nl-query.
+
+Formats:
+- rows      {"sql", "rows": [{col: val}, ...]} (default, encoded with orjson when installed)
+- columnar  {"sql", "columns": [...], "data": [[...], ...]}
+- csv       header + one line per row
+- arrow     Arrow IPC stream (requires pyarrow)
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+
+try:
+    import orjson  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without orjson installed
+    orjson = None
+
+try:
+    import pyarrow  # pyright: ignore[reportMissingImports]
+    import pyarrow.ipc  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without pyarrow installed
+    pyarrow = None
+
+RESULT_FORMATS = ("rows", "columnar", "csv", "arrow")
+JSON_MEDIA_TYPE = "application/json"
+CSV_MEDIA_TYPE = "text/csv"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+ACCEPT_FORMATS = {
+    CSV_MEDIA_TYPE: "csv",
+    ARROW_MEDIA_TYPE: "arrow",
+}
+
+
+def resolve_format(requested: str | None, accept_header: str) -> str:
+    if requested:
+        fmt = requested.strip().lower()
+        if fmt not in RESULT_FORMATS:
+            raise ValueError(f"Unsupported format '{requested}'. Use one of: {', '.join(RESULT_FORMATS)}")
+        return fmt
+    for media_type, fmt in ACCEPT_FORMATS.items():
+        if media_type in accept_header:
+            return fmt
+    return "rows"
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    return str(value)
+
+
+def encode_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def encode_columnar(sql: str, columns: list[str], rows: list[tuple]) -> bytes:
+    return encode_json({"sql": sql, "columns": columns, "data": rows})
+
+
+def encode_csv(columns: list[str], rows: list[tuple]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def encode_arrow(columns: list[str], rows: list[tuple]) -> bytes:
+    if pyarrow is None:
+        raise ValueError("Arrow output requires pyarrow to be installed")
+    columns_data = list(zip(*rows)) if rows else [() for _ in columns]
+    table = pyarrow.Table.from_arrays([pyarrow.array(values) for values in columns_data], names=columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
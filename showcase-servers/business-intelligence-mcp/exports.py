@@ -0,0 +1,265 @@
+"""
+Result exports to Parquet or gzip-CSV files in a local spool directory.
+
+The query result is read in batches from a server-side cursor
+(stream_query_columnar) and appended to the file batch by batch, so memory
+stays flat whatever the result size. Each export is written as
+<id>.<ext>.part and renamed when complete, with a <id>.json sidecar holding
+its metadata (also written to a .part file and renamed, so readers never see a
+half-written sidecar). GET /exports/{id} serves the file with HTTP range support.
+
+- EXPORT_TTL_SECONDS: exports are deleted after this age (swept on every
+  export/download and at startup).
+- EXPORT_MAX_DISK_BYTES: quota for the whole spool directory; an export that
+  would exceed it is aborted and its partial file removed. Each batch is
+  checked against the usage of the whole spool, including the partial files
+  of concurrent exports, under one lock, so parallel exports share the quota.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from db import stream_query_columnar
+
+try:
+    import pyarrow  # pyright: ignore[reportMissingImports]
+    import pyarrow.parquet  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without pyarrow installed
+    pyarrow = None
+
+EXPORT_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "csv": ("csv.gz", "application/gzip"),
+}
+EXPORT_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# An unreadable sidecar is only treated as abandoned once it is older than this, so a sweep
+# never deletes an export that another writer is still finishing.
+SIDECAR_GRACE_SECONDS = 60
+
+logger = logging.getLogger("mcp.bi.exports")
+_spool_lock = threading.Lock()
+
+
+def get_export_dir() -> Path:
+    return Path(os.getenv("EXPORT_DIR", "exports").strip() or "exports")
+
+
+def get_export_settings() -> tuple[int, int, int]:
+    ttl_seconds = int(os.getenv("EXPORT_TTL_SECONDS", "3600"))
+    max_disk_bytes = int(os.getenv("EXPORT_MAX_DISK_BYTES", str(1024 * 1024 * 1024)))
+    max_rows = int(os.getenv("EXPORT_MAX_ROWS", "10000000"))
+    return ttl_seconds, max_disk_bytes, max_rows
+
+
+def _metadata_path(export_dir: Path, export_id: str) -> Path:
+    return export_dir / f"{export_id}.json"
+
+
+def _spool_usage(export_dir: Path) -> int:
+    total = 0
+    for path in export_dir.iterdir():
+        try:
+            total += path.stat().st_size
+        except FileNotFoundError:
+            # A concurrent export renamed or removed its partial file mid-scan.
+            continue
+    return total
+
+
+def cleanup_expired(now: float | None = None) -> int:
+    """Delete expired exports and abandoned partial files; return how many exports were removed."""
+    export_dir = get_export_dir()
+    if not export_dir.is_dir():
+        return 0
+    now = time.time() if now is None else now
+    ttl_seconds = get_export_settings()[0]
+    removed = 0
+    with _spool_lock:
+        for meta_path in export_dir.glob("*.json"):
+            try:
+                metadata = json.loads(meta_path.read_text(encoding="utf-8"))
+                file_name, expired = metadata["file_name"], metadata["expires_at"] <= now
+            except (OSError, ValueError, KeyError):
+                try:
+                    expired = meta_path.stat().st_mtime + SIDECAR_GRACE_SECONDS <= now
+                except FileNotFoundError:
+                    continue
+                file_name = None
+            if expired:
+                if file_name is not None:
+                    (export_dir / file_name).unlink(missing_ok=True)
+                meta_path.unlink(missing_ok=True)
+                removed += 1
+        for part_path in export_dir.glob("*.part"):
+            # Writers finish or remove their own .part files; anything older than the TTL was orphaned by a crash.
+            if part_path.stat().st_mtime + ttl_seconds <= now:
+                part_path.unlink(missing_ok=True)
+    return removed
+
+
+class _QuotaGuard:
+    """Quota check shared by concurrent exports; the growing .part file is this export's reservation."""
+
+    def __init__(self, export_dir: Path, path: Path) -> None:
+        self.export_dir = export_dir
+        self.path = path
+        self.max_disk_bytes = get_export_settings()[1]
+        with _spool_lock:
+            if _spool_usage(export_dir) >= self.max_disk_bytes:
+                raise ValueError("Export spool directory is over its disk quota; retry after exports expire")
+
+    def check(self) -> None:
+        with _spool_lock:
+            if _spool_usage(self.export_dir) > self.max_disk_bytes:
+                raise ValueError("Export exceeds the disk quota (EXPORT_MAX_DISK_BYTES)")
+
+
+def _write_csv(path: Path, batches, guard: _QuotaGuard) -> tuple[int, list[str]]:
+    row_count = 0
+    columns: list[str] = []
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        for batch_columns, rows in batches:
+            if not columns:
+                columns = batch_columns
+                writer.writerow(columns)
+            writer.writerows(rows)
+            row_count += len(rows)
+            guard.check()
+    return row_count, columns
+
+
+def _arrow_batch(columns: list[str], rows: list[tuple], schema):
+    values = list(zip(*rows)) if rows else [() for _ in columns]
+    if schema is None:
+        arrays = [pyarrow.array(column) for column in values]
+        # All-NULL first batches would pin a null type; widen to string so later batches still fit.
+        arrays = [array.cast(pyarrow.string()) if pyarrow.types.is_null(array.type) else array for array in arrays]
+        return pyarrow.Table.from_arrays(arrays, names=columns)
+    arrays = []
+    for column, field in zip(values, schema):
+        try:
+            arrays.append(pyarrow.array(column, type=field.type))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            if not pyarrow.types.is_string(field.type):
+                raise
+            arrays.append(pyarrow.array([None if value is None else str(value) for value in column], type=field.type))
+    return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def _write_parquet(path: Path, batches, guard: _QuotaGuard) -> tuple[int, list[str]]:
+    if pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow to be installed")
+    row_count = 0
+    columns: list[str] = []
+    writer = None
+    try:
+        for batch_columns, rows in batches:
+            table = _arrow_batch(batch_columns, rows, writer.schema if writer is not None else None)
+            if writer is None:
+                columns = batch_columns
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema, compression="zstd")
+            if rows:
+                writer.write_table(table)
+            row_count += len(rows)
+            guard.check()
+    finally:
+        if writer is not None:
+            writer.close()
+    return row_count, columns
+
+
+def create_export(sql: str, export_format: str, db_url: str | None = None) -> dict:
+    """Stream sql into a spool file and return its metadata (id, row_count, bytes, expires_at, ...)."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    extension, media_type = EXPORT_FORMATS[export_format]
+    ttl_seconds, _max_disk_bytes, max_rows = get_export_settings()
+    export_dir = get_export_dir()
+    export_dir.mkdir(parents=True, exist_ok=True)
+    cleanup_expired()
+
+    export_id = uuid.uuid4().hex
+    file_name = f"{export_id}.{extension}"
+    part_path = export_dir / f"{file_name}.part"
+    start = time.perf_counter()
+    try:
+        guard = _QuotaGuard(export_dir, part_path)
+        batches = stream_query_columnar(sql, max_rows=max_rows, db_url=db_url)
+        writer = _write_parquet if export_format == "parquet" else _write_csv
+        row_count, columns = writer(part_path, batches, guard)
+        os.replace(part_path, export_dir / file_name)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    created_at = time.time()
+    metadata = {
+        "export_id": export_id,
+        "format": export_format,
+        "file_name": file_name,
+        "media_type": media_type,
+        "sql": sql,
+        "columns": columns,
+        "row_count": row_count,
+        "truncated": max_rows > 0 and row_count >= max_rows,
+        "bytes": (export_dir / file_name).stat().st_size,
+        "created_at": created_at,
+        "expires_at": created_at + ttl_seconds,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+    meta_path = _metadata_path(export_dir, export_id)
+    meta_part_path = meta_path.with_name(f"{meta_path.name}.part")
+    meta_part_path.write_text(json.dumps(metadata), encoding="utf-8")
+    os.replace(meta_part_path, meta_path)
+    logger.info("exports.created id=%s format=%s rows=%s bytes=%s", export_id, export_format, row_count, metadata["bytes"])
+    return metadata
+
+
+def get_export(export_id: str) -> tuple[dict, Path]:
+    """Return (metadata, file path) for a live export; KeyError when unknown or expired."""
+    if not EXPORT_ID_PATTERN.match(export_id):
+        raise KeyError(export_id)
+    cleanup_expired()
+    export_dir = get_export_dir()
+    try:
+        metadata = json.loads(_metadata_path(export_dir, export_id).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raise KeyError(export_id) from None
+    path = export_dir / metadata["file_name"]
+    if not path.is_file():
+        raise KeyError(export_id)
+    return metadata, path
+
+
+def delete_export(export_id: str) -> bool:
+    try:
+        metadata, path = get_export(export_id)
+    except KeyError:
+        return False
+    with _spool_lock:
+        path.unlink(missing_ok=True)
+        _metadata_path(get_export_dir(), metadata["export_id"]).unlink(missing_ok=True)
+    return True
+
+
+def get_export_stats() -> dict:
+    export_dir = get_export_dir()
+    ttl_seconds, max_disk_bytes, max_rows = get_export_settings()
+    exists = export_dir.is_dir()
+    return {
+        "dir": str(export_dir),
+        "exports": len(list(export_dir.glob("*.json"))) if exists else 0,
+        "bytes_used": _spool_usage(export_dir) if exists else 0,
+        "max_disk_bytes": max_disk_bytes,
+        "ttl_seconds": ttl_seconds,
+        "max_rows": max_rows,
+    }
@@ -0,0 +1,278 @@
+"""
+Learned few-shot store: successful NL→SQL pairs reused across requests.
+
+Opt-in (FEWSHOT_ENABLED=true). Every validated, successfully executed pair
+is written to a local SQLite file (FEWSHOT_DB_PATH), scoped to the database
+it ran against. Questions are reduced to token shingles (normalized words
+plus word bigrams) and a 64-value MinHash signature; LSH bands (32 × 2 rows)
+index the signatures so a lookup only scores a handful of candidate pairs by
+exact Jaccard similarity.
+
+- similarity >= FEWSHOT_REUSE_THRESHOLD and the two questions have the same
+  words in the same order (up to case, plurals and punctuation), the same
+  comparison operators and identical quoted and numeric literals: the stored
+  SQL is reused, no LLM call. "orders where a > b" and "orders where b > a"
+  share every word but are different questions. Questions that
+  differ by a single literal ("... in germany" / "... in france", "2023" /
+  "2024") score high on Jaccard but need different SQL, so they never reuse.
+- otherwise the top FEWSHOT_EXAMPLES pairs above FEWSHOT_MIN_SIMILARITY are
+  injected into SQL_PROMPT as exemplars.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from schema_index import tokenize
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+LITERAL_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"|\d+(?:\.\d+)?")
+OPERATOR_PATTERN = re.compile(r"[<>=!]+")
+
+logger = logging.getLogger("mcp.bi.fewshot_store")
+
+
+def is_enabled() -> bool:
+    return os.getenv("FEWSHOT_ENABLED", "false").strip().lower() == "true"
+
+
+def get_store_path() -> str:
+    return os.getenv("FEWSHOT_DB_PATH", "fewshot.sqlite3").strip()
+
+
+def get_fewshot_settings() -> tuple[float, float, int, int]:
+    reuse_threshold = float(os.getenv("FEWSHOT_REUSE_THRESHOLD", "0.9"))
+    min_similarity = float(os.getenv("FEWSHOT_MIN_SIMILARITY", "0.3"))
+    examples = int(os.getenv("FEWSHOT_EXAMPLES", "3"))
+    max_pairs = int(os.getenv("FEWSHOT_MAX_PAIRS", "5000"))
+    return reuse_threshold, min_similarity, examples, max_pairs
+
+
+def database_scope(db_url: str, schema_hint: str | None = None) -> str:
+    """Stable id for a DSN plus caller schema hint; credentials are never written to the store.
+
+    Pairs learned under one schema hint are neither reused nor offered as
+    examples under another, since the hint can change what the SQL must be.
+    """
+    key = db_url if not schema_hint else f"{db_url}\0{schema_hint}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def shingles(nl_query: str) -> set[str]:
+    tokens = tokenize(nl_query)
+    return set(tokens) | {f"{first} {second}" for first, second in zip(tokens, tokens[1:])}
+
+
+def minhash(items: set[str]) -> list[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big") for item in items]
+    if not hashes:
+        return [0] * NUM_PERMUTATIONS
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: list[int]) -> list[str]:
+    return [
+        f"{band}:" + ",".join(str(value) for value in signature[band * LSH_ROWS : (band + 1) * LSH_ROWS])
+        for band in range(LSH_BANDS)
+    ]
+
+
+def literals(nl_query: str) -> list[str]:
+    """Quoted strings (case-sensitive) and numbers, which must match exactly for SQL reuse."""
+    return sorted(LITERAL_PATTERN.findall(nl_query))
+
+
+def is_reusable(stored_query: str, nl_query: str) -> bool:
+    """True when the questions differ only in case, plurals or punctuation other than comparison operators."""
+    return (
+        tokenize(stored_query) == tokenize(nl_query)
+        and OPERATOR_PATTERN.findall(stored_query) == OPERATOR_PATTERN.findall(nl_query)
+        and literals(stored_query) == literals(nl_query)
+    )
+
+
+def jaccard(first: set[str], second: set[str]) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class FewShotStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.reused = 0
+        self.exemplar_lookups = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fewshot_pairs ("
+                "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, normalized TEXT NOT NULL, query TEXT NOT NULL, "
+                "sql TEXT NOT NULL, shingles TEXT NOT NULL, uses INTEGER NOT NULL DEFAULT 0, "
+                "updated_at REAL NOT NULL, UNIQUE(scope, normalized))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fewshot_bands ("
+                "scope TEXT NOT NULL, band TEXT NOT NULL, pair_id INTEGER NOT NULL, PRIMARY KEY(scope, band, pair_id))"
+            )
+
+    def add(self, scope: str, nl_query: str, sql: str) -> None:
+        items = shingles(nl_query)
+        if not items:
+            return
+        normalized = " ".join(sorted(items))
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM fewshot_pairs WHERE scope = ? AND normalized = ?", (scope, normalized)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE fewshot_pairs SET sql = ?, query = ?, updated_at = ? WHERE id = ?",
+                    (sql, nl_query, now, row[0]),
+                )
+                return
+            pair_id = self._conn.execute(
+                "INSERT INTO fewshot_pairs (scope, normalized, query, sql, shingles, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, normalized, nl_query, sql, json.dumps(sorted(items)), now),
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO fewshot_bands (scope, band, pair_id) VALUES (?, ?, ?)",
+                [(scope, band, pair_id) for band in band_keys(minhash(items))],
+            )
+            self._prune(scope)
+
+    def _prune(self, scope: str) -> None:
+        max_pairs = get_fewshot_settings()[3]
+        stale = self._conn.execute(
+            "SELECT id FROM fewshot_pairs WHERE scope = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+            (scope, max_pairs),
+        ).fetchall()
+        if stale:
+            self._conn.executemany("DELETE FROM fewshot_pairs WHERE id = ?", stale)
+            self._conn.executemany("DELETE FROM fewshot_bands WHERE pair_id = ?", stale)
+
+    def lookup(self, scope: str, nl_query: str, limit: int) -> list[dict]:
+        """Return up to limit stored pairs ordered by Jaccard similarity to nl_query."""
+        items = shingles(nl_query)
+        if not items or limit <= 0:
+            return []
+        bands = band_keys(minhash(items))
+        placeholders = ",".join("?" for _ in bands)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.id, p.query, p.sql, p.shingles FROM fewshot_pairs p WHERE p.id IN ("
+                f"SELECT pair_id FROM fewshot_bands WHERE scope = ? AND band IN ({placeholders}))",
+                (scope, *bands),
+            ).fetchall()
+        scored = [
+            {"id": pair_id, "query": query, "sql": sql, "similarity": round(jaccard(items, set(json.loads(stored))), 4)}
+            for pair_id, query, sql, stored in rows
+        ]
+        scored.sort(key=lambda pair: -pair["similarity"])
+        return scored[:limit]
+
+    def match(self, scope: str, nl_query: str) -> tuple[str | None, list[dict]]:
+        """Return (reusable SQL or None, exemplar pairs for the prompt)."""
+        reuse_threshold, min_similarity, examples, _max_pairs = get_fewshot_settings()
+        candidates = self.lookup(scope, nl_query, max(examples, 1))
+        self.lookups += 1
+        if (
+            candidates
+            and candidates[0]["similarity"] >= reuse_threshold
+            and is_reusable(candidates[0]["query"], nl_query)
+        ):
+            self.reused += 1
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE fewshot_pairs SET uses = uses + 1, updated_at = ? WHERE id = ?",
+                    (time.time(), candidates[0]["id"]),
+                )
+            return candidates[0]["sql"], []
+        exemplars = [
+            {"query": pair["query"], "sql": pair["sql"]}
+            for pair in candidates[:examples]
+            if pair["similarity"] >= min_similarity
+        ]
+        if exemplars:
+            self.exemplar_lookups += 1
+        return None, exemplars
+
+    def stats(self) -> dict:
+        with self._lock:
+            pairs = self._conn.execute("SELECT COUNT(*) FROM fewshot_pairs").fetchone()[0]
+        return {
+            "enabled": is_enabled(),
+            "pairs": pairs,
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "exemplar_lookups": self.exemplar_lookups,
+            "reuse_rate": round(self.reused / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: FewShotStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_fewshot_store() -> FewShotStore:
+    """Return the store for FEWSHOT_DB_PATH, reopening it when the path changes."""
+    global _store
+    path = get_store_path()
+    if _store is None or _store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                if _store is not None:
+                    _store.close()
+                _store = FewShotStore(path)
+    return _store
+
+
+def match_pair(db_url: str, nl_query: str, schema_hint: str | None = None) -> tuple[str | None, list[dict]]:
+    """Store lookup for the request path; a broken store never fails the request."""
+    if not is_enabled():
+        return None, []
+    try:
+        return get_fewshot_store().match(database_scope(db_url, schema_hint), nl_query)
+    except Exception:
+        logger.warning("fewshot_store.lookup_failed", exc_info=True)
+        return None, []
+
+
+def remember_pair(db_url: str, nl_query: str, sql: str, schema_hint: str | None = None) -> None:
+    if not is_enabled():
+        return
+    try:
+        get_fewshot_store().add(database_scope(db_url, schema_hint), nl_query, sql)
+    except Exception:
+        logger.warning("fewshot_store.write_failed", exc_info=True)
+
+
+def reset_fewshot_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
@@ -1,13 +1,204 @@
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
 import anthropic
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from sql_templates import get_template_engine, is_enabled as sql_templates_enabled
+
+_CALL_STATS: dict[str, dict] = {}
+_STATS_LOCK = threading.Lock()
+
+logger = logging.getLogger("mcp.bi.llm_provider")
+
+
+def get_http_pool_size() -> int:
+    return int(os.getenv("LLM_HTTP_POOL_SIZE", "20"))
+
+
+def is_streaming_enabled() -> bool:
+    return os.getenv("LLM_STREAMING_ENABLED", "true").strip().lower() == "true"
+
+
+def _provider_stats(provider: str) -> dict:
+    """Caller holds _STATS_LOCK."""
+    return _CALL_STATS.setdefault(
+        provider,
+        {
+            "calls": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "last_ms": 0.0,
+            "streamed": 0,
+            "early_stops": 0,
+            "ttft_total_ms": 0.0,
+            "ttft_max_ms": 0.0,
+            "ttft_last_ms": 0.0,
+        },
+    )
+
+
+def _record_call(provider: str, duration_ms: float, ok: bool) -> None:
+    with _STATS_LOCK:
+        stats = _provider_stats(provider)
+        stats["calls"] += 1
+        stats["errors"] += 0 if ok else 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["last_ms"] = duration_ms
+
+
+def _record_stream(provider: str, ttft_ms: float | None, total_ms: float, early_stop: bool) -> None:
+    logger.info(
+        "llm.generation provider=%s ttft_ms=%s total_ms=%.2f early_stop=%s",
+        provider,
+        None if ttft_ms is None else round(ttft_ms, 2),
+        total_ms,
+        early_stop,
+    )
+    with _STATS_LOCK:
+        stats = _provider_stats(provider)
+        stats["streamed"] += 1
+        stats["early_stops"] += 1 if early_stop else 0
+        if ttft_ms is not None:
+            stats["ttft_total_ms"] += ttft_ms
+            stats["ttft_max_ms"] = max(stats["ttft_max_ms"], ttft_ms)
+            stats["ttft_last_ms"] = ttft_ms
+
+
+def get_llm_call_stats() -> dict:
+    with _STATS_LOCK:
+        return {
+            provider: {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0,
+                "max_ms": round(stats["max_ms"], 2),
+                "last_ms": round(stats["last_ms"], 2),
+                "streamed": stats["streamed"],
+                "early_stops": stats["early_stops"],
+                "avg_ttft_ms": round(stats["ttft_total_ms"] / stats["streamed"], 2) if stats["streamed"] else 0.0,
+                "max_ttft_ms": round(stats["ttft_max_ms"], 2),
+                "last_ttft_ms": round(stats["ttft_last_ms"], 2),
+            }
+            for provider, stats in _CALL_STATS.items()
+        }
+
+
+def complete_sql_statement(text: str) -> str | None:
+    """Return the first complete SQL statement in streamed model output, or None while incomplete.
+
+    Complete means a top-level ';' (outside quotes) or, for fenced output, the
+    closing fence. Anything the model writes after that point is discarded.
+    """
+    fenced = text.lstrip().startswith("```")
+    body_start = text.find("\n", text.find("```")) + 1 if fenced else 0
+    if fenced and body_start == 0:
+        return None
+    quote = None
+    index = body_start
+    while index < len(text):
+        char = text[index]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == ";":
+            return text[: index + 1]
+        elif fenced and text.startswith("```", index):
+            return text[: index + 3]
+        index += 1
+    return None
+
+
+class StreamCollector:
+    """Accumulates streamed text deltas, timing the first token and stopping at a complete statement."""
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self.start = time.perf_counter()
+        self.ttft_ms: float | None = None
+        self.parts: list[str] = []
+        self.statement: str | None = None
+
+    def feed(self, delta: str | None) -> bool:
+        """Add a delta; True once a complete statement has been seen and the stream can be closed."""
+        if not delta:
+            return False
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.start) * 1000
+        self.parts.append(delta)
+        self.statement = complete_sql_statement("".join(self.parts))
+        return self.statement is not None
+
+    def finish(self) -> str:
+        early_stop = self.statement is not None
+        _record_stream(self.provider, self.ttft_ms, (time.perf_counter() - self.start) * 1000, early_stop)
+        return (self.statement if early_stop else "".join(self.parts)).strip()
+
+
+def iter_sse_deltas(lines):
+    """Content deltas from an OpenAI-compatible chat completions SSE stream."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or [{}]
+        yield (choices[0].get("delta") or {}).get("content")
+
 
 class LLMProvider(ABC):
     @abstractmethod
-    def generate_sql(self, nl_query: str, schema_hint: str | None = None) -> str:
+    def generate_sql(self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None) -> str:
         ...
 
+    async def agenerate_sql(
+        self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None
+    ) -> str:
+        """Async variant; providers without a native async client run in a worker thread."""
+        return await asyncio.to_thread(self.generate_sql, nl_query, schema_hint, examples)
+
+    def generate_sql_timed(
+        self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None
+    ) -> str:
+        start = time.perf_counter()
+        ok = False
+        try:
+            sql = self.generate_sql(nl_query, schema_hint, examples)
+            ok = True
+            return sql
+        finally:
+            _record_call(type(self).__name__, (time.perf_counter() - start) * 1000, ok)
+
+    async def agenerate_sql_timed(
+        self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None
+    ) -> str:
+        start = time.perf_counter()
+        ok = False
+        try:
+            sql = await self.agenerate_sql(nl_query, schema_hint, examples)
+            ok = True
+            return sql
+        finally:
+            _record_call(type(self).__name__, (time.perf_counter() - start) * 1000, ok)
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        self.close()
+
 SQL_PROMPT = """You are a SQL generator. Convert the user's request into a single SQL query.
 
 Natural language request:
@@ -15,26 +206,74 @@ Natural language request:
 
 Schema hint (may be empty):
 {schema}
-
+{examples}
 Return ONLY the SQL query, no explanation, no markdown, no backticks."""
 
 
+def format_sql_prompt(nl_query: str, schema_hint: str | None, examples: list[dict] | None = None) -> str:
+    """Fill SQL_PROMPT; examples are previously answered {"query", "sql"} pairs."""
+    exemplar_block = ""
+    if examples:
+        pairs = "\n\n".join(f"Request: {example['query']}\nSQL: {example['sql']}" for example in examples)
+        exemplar_block = f"\nSimilar requests answered before:\n{pairs}\n"
+    return SQL_PROMPT.format(query=nl_query, schema=schema_hint or "N/A", examples=exemplar_block)
+
+
 class ClaudeProvider(LLMProvider):
     def __init__(self) -> None:
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise RuntimeError("ANTHROPIC_API_KEY not set")
-        self.client = anthropic.Anthropic(api_key=api_key)
+        pool_size = get_http_pool_size()
+        self.client = anthropic.Anthropic(
+            api_key=api_key,
+            http_client=anthropic.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            ),
+        )
+        self.async_client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            ),
+        )
         self.model = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20240620")
 
-    def generate_sql(self, nl_query: str, schema_hint: str | None = None) -> str:
-        prompt = SQL_PROMPT.format(query=nl_query, schema=schema_hint or "N/A")
-        msg = self.client.messages.create(
-            model=self.model,
-            max_tokens=512,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return msg.content[0].text.strip()
+    def generate_sql(self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None) -> str:
+        prompt = format_sql_prompt(nl_query, schema_hint, examples)
+        request = {"model": self.model, "max_tokens": 512, "messages": [{"role": "user", "content": prompt}]}
+        if not is_streaming_enabled():
+            return self.client.messages.create(**request).content[0].text.strip()
+
+        collector = StreamCollector(type(self).__name__)
+        # Leaving the context manager closes the HTTP stream, so breaking out stops generation.
+        with self.client.messages.stream(**request) as stream:
+            for delta in stream.text_stream:
+                if collector.feed(delta):
+                    break
+        return collector.finish()
+
+    async def agenerate_sql(
+        self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None
+    ) -> str:
+        prompt = format_sql_prompt(nl_query, schema_hint, examples)
+        request = {"model": self.model, "max_tokens": 512, "messages": [{"role": "user", "content": prompt}]}
+        if not is_streaming_enabled():
+            return (await self.async_client.messages.create(**request)).content[0].text.strip()
+
+        collector = StreamCollector(type(self).__name__)
+        async with self.async_client.messages.stream(**request) as stream:
+            async for delta in stream.text_stream:
+                if collector.feed(delta):
+                    break
+        return collector.finish()
+
+    def close(self) -> None:
+        self.client.close()
+
+    async def aclose(self) -> None:
+        self.client.close()
+        await self.async_client.close()
 
 
 class LocalProvider(LLMProvider):
@@ -44,38 +283,158 @@ class LocalProvider(LLMProvider):
     def __init__(self) -> None:
         self.url = os.getenv("LOCAL_LLM_URL", "http://localhost:8080/v1/chat/completions")
         self.model = os.getenv("LOCAL_LLM_MODEL", "local")
-
-    def generate_sql(self, nl_query: str, schema_hint: str | None = None) -> str:
-        prompt = SQL_PROMPT.format(query=nl_query, schema=schema_hint or "N/A")
-        response = requests.post(
-            self.url,
-            json={
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 512,
-                "temperature": 0.1,
-                "stop": ["```", ";;\n", "\n\n"],
-            },
+        pool_size = get_http_pool_size()
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.async_client = httpx.AsyncClient(
             timeout=60,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
         )
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"].strip()
 
+    def _request_body(self, nl_query: str, schema_hint: str | None, examples: list[dict] | None = None) -> dict:
+        prompt = format_sql_prompt(nl_query, schema_hint, examples)
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 512,
+            "temperature": 0.1,
+            "stop": ["```", ";;\n", "\n\n"],
+        }
 
-class RuleBasedProvider(LLMProvider):
-    def generate_sql(self, nl_query: str, schema_hint: str | None = None) -> str:
-        q = nl_query.lower()
-        if "top" in q and "customers" in q and "revenue" in q:
-            return "SELECT customer_id, name, revenue FROM customers ORDER BY revenue DESC LIMIT 10;"
-        raise ValueError("Rule-based provider cannot handle this query. Set LLM_PROVIDER=local or claude.")
+    def generate_sql(self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None) -> str:
+        body = self._request_body(nl_query, schema_hint, examples)
+        if not is_streaming_enabled():
+            response = self.session.post(self.url, json=body, timeout=60)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"].strip()
 
+        collector = StreamCollector(type(self).__name__)
+        # Closing the response drops the connection, which makes llama-server abort the generation.
+        with self.session.post(self.url, json={**body, "stream": True}, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for delta in iter_sse_deltas(response.iter_lines()):
+                if collector.feed(delta):
+                    break
+        return collector.finish()
 
-def get_llm_provider() -> LLMProvider:
-    provider = os.getenv("LLM_PROVIDER", "claude").lower()
+    async def agenerate_sql(
+        self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None
+    ) -> str:
+        body = self._request_body(nl_query, schema_hint, examples)
+        if not is_streaming_enabled():
+            response = await self.async_client.post(self.url, json=body)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"].strip()
+
+        collector = StreamCollector(type(self).__name__)
+        async with self.async_client.stream("POST", self.url, json={**body, "stream": True}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if any(collector.feed(delta) for delta in iter_sse_deltas([line])):
+                    break
+        return collector.finish()
+
+    def close(self) -> None:
+        self.session.close()
+
+    async def aclose(self) -> None:
+        self.session.close()
+        await self.async_client.aclose()
+
+
+_LEGACY_TOP_CUSTOMERS_SQL = "SELECT customer_id, name, revenue FROM customers ORDER BY revenue DESC LIMIT 10;"
+
+
+class TemplateProvider(LLMProvider):
+    """Answers only from the SQL template fast path; no model behind it.
+
+    With ``legacy_rules`` (the ``rule`` alias) a question that no template
+    matches still gets the old keyword rule: any question mentioning "top",
+    "customers" and "revenue" returns the top ten customers by revenue.
+    """
+
+    def __init__(self, legacy_rules: bool = False):
+        self.legacy_rules = legacy_rules
+
+    def generate_sql(self, nl_query: str, schema_hint: str | None = None, examples: list[dict] | None = None) -> str:
+        # With the fast path on, mcp_tools already matched (and counted) this question and missed.
+        matched = get_template_engine().match(nl_query, record_stats=not sql_templates_enabled())
+        if matched is None and self.legacy_rules:
+            q = nl_query.lower()
+            if "top" in q and "customers" in q and "revenue" in q:
+                return _LEGACY_TOP_CUSTOMERS_SQL
+        if matched is None:
+            raise ValueError(
+                "No SQL template matches this query. Add one to SQL_TEMPLATES_PATH or set LLM_PROVIDER=local or claude."
+            )
+        return matched[1]
+
+
+def _build_llm_provider(provider: str) -> LLMProvider:
     if provider == "claude":
         return ClaudeProvider()
     if provider == "local":
         return LocalProvider()
     if provider == "rule":
-        return RuleBasedProvider()
+        return TemplateProvider(legacy_rules=True)
+    if provider == "template":
+        return TemplateProvider()
     return ClaudeProvider()
+
+
+def _provider_config() -> tuple:
+    """Env settings that require rebuilding the provider when they change."""
+    return (
+        os.getenv("LLM_PROVIDER", "claude").lower(),
+        os.getenv("ANTHROPIC_API_KEY"),
+        os.getenv("CLAUDE_MODEL"),
+        os.getenv("LOCAL_LLM_URL"),
+        os.getenv("LOCAL_LLM_MODEL"),
+        os.getenv("LLM_HTTP_POOL_SIZE"),
+    )
+
+
+_current: tuple[tuple, LLMProvider] | None = None
+_retired: list[LLMProvider] = []
+_provider_lock = threading.Lock()
+
+
+def get_llm_provider() -> LLMProvider:
+    """Return the process-wide provider, rebuilding it when its env config changes.
+
+    A replaced provider is not closed here because other requests may still be
+    using its connection pool; it is kept and closed with the current one by
+    close_llm_provider / aclose_llm_provider at shutdown.
+    """
+    global _current
+    config = _provider_config()
+    current = _current
+    if current is not None and current[0] == config:
+        return current[1]
+
+    with _provider_lock:
+        if _current is None or _current[0] != config:
+            if _current is not None:
+                _retired.append(_current[1])
+            _current = (config, _build_llm_provider(config[0]))
+        return _current[1]
+
+
+def _take_providers() -> list[LLMProvider]:
+    global _current
+    with _provider_lock:
+        providers = _retired[:] + ([_current[1]] if _current is not None else [])
+        _retired.clear()
+        _current = None
+    return providers
+
+
+def close_llm_provider() -> None:
+    for provider in _take_providers():
+        provider.close()
+
+
+async def aclose_llm_provider() -> None:
+    for provider in _take_providers():
+        await provider.aclose()
@@ -1,14 +1,61 @@
 import os
 import sys
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import Depends, FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional
-from mcp_tools import handle_nl_query
+from itertools import chain
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from datasources import get_primary_url, get_registry, start_health_checks, stop_health_checks
+from db import adispose_engines, dispose_engines, get_pool_stats
+from encoders import (
+    ARROW_MEDIA_TYPE,
+    CSV_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    encode_arrow,
+    encode_columnar,
+    encode_csv,
+    encode_json,
+    resolve_format,
+)
+from exports import cleanup_expired as cleanup_expired_exports, delete_export, get_export, get_export_stats
+from fewshot_store import get_fewshot_store, is_enabled as fewshot_enabled
+from llm_provider import aclose_llm_provider, get_llm_call_stats
+from mcp_tools import (
+    CacheInvalidateRequest,
+    NLQueryBatchRequest,
+    NLQueryRequest,
+    ahandle_nl_query,
+    ahandle_nl_query_batch,
+    ahandle_nl_query_columnar,
+    ahandle_nl_query_paged,
+    handle_nl_query_export,
+    invalidate_result_cache,
+    stream_nl_query,
+)
+from result_cache import get_result_cache
+from schema_cache import get_schema_cache, warm_schema_cache
+from single_flight import get_single_flight
+from sql_templates import get_template_engine, warm_template_engine
+from translation_cache import get_translation_cache
 
 PORT = int(os.getenv("PORT", "8101"))
 
-app = FastAPI(title="Business Intelligence MCP")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    warm_schema_cache()
+    warm_template_engine()
+    cleanup_expired_exports()
+    start_health_checks()
+    yield
+    stop_health_checks()
+    dispose_engines()
+    await adispose_engines()
+    await aclose_llm_provider()
+
+
+app = FastAPI(title="Business Intelligence MCP", lifespan=lifespan)
 
 COMMON_PATH = Path(__file__).resolve().parents[1] / "common"
 if str(COMMON_PATH) not in sys.path:
@@ -32,25 +79,176 @@ initialize_rate_limit_store(app)
 from mcp_transport import mcp
 app.mount("/mcp", mcp.streamable_http_app())
 
-class NLQueryRequest(BaseModel):
-    query: str
-    schema_hint: Optional[str] = None
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 @app.get("/health")
 def health():
     return {"status": "ok", "mcp_endpoint": f"http://localhost:{PORT}/mcp"}
 
 @app.post("/nl-query")
-def nl_query(
+async def nl_query(
     req: NLQueryRequest,
+    request: Request,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    if req.cursor or req.page_size is not None:
+        try:
+            return Response(content=encode_json(await ahandle_nl_query_paged(req)), media_type=JSON_MEDIA_TYPE)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if req.export:
+        try:
+            return await run_in_threadpool(handle_nl_query_export, req)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if req.summarize:
+        try:
+            return Response(content=encode_json(await ahandle_nl_query(req)), media_type=JSON_MEDIA_TYPE)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if req.stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        try:
+            chunks = stream_nl_query(req)
+            first_chunk = await run_in_threadpool(next, chunks)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(chain([first_chunk], chunks), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        result_format = resolve_format(req.format, request.headers.get("accept", ""))
+        if result_format == "rows":
+            result = await ahandle_nl_query(req)
+            return Response(content=encode_json(result), media_type=JSON_MEDIA_TYPE)
+
+        result = await ahandle_nl_query_columnar(req)
+        if result_format == "csv":
+            return Response(content=encode_csv(result["columns"], result["rows"]), media_type=CSV_MEDIA_TYPE)
+        if result_format == "arrow":
+            return Response(content=encode_arrow(result["columns"], result["rows"]), media_type=ARROW_MEDIA_TYPE)
+        return Response(
+            content=encode_columnar(result["sql"], result["columns"], result["rows"]),
+            media_type=JSON_MEDIA_TYPE,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/nl-query/batch")
+async def nl_query_batch(
+    req: NLQueryBatchRequest,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        return await ahandle_nl_query_batch(req)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/db/pool-stats")
+def db_pool_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {"pools": get_pool_stats()}
+
+@app.get("/db/sources")
+def db_sources(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        return {"sources": get_registry().stats()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/schema")
+def schema(
+    database: str | None = None,
     _auth: None = Depends(verify_api_key),
     _rate_limit: None = Depends(enforce_rate_limit),
 ):
     try:
-        result = handle_nl_query(req)
-        return result
+        snapshot = get_schema_cache().get(get_primary_url(database))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Schema introspection has not completed yet")
+    return snapshot
+
+@app.post("/schema/refresh")
+def schema_refresh(
+    database: str | None = None,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        snapshot = get_schema_cache().refresh(get_primary_url(database))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "tables": len(snapshot["tables"]),
+        "refreshed_at": snapshot["refreshed_at"],
+        "introspection_ms": snapshot["introspection_ms"],
+    }
+
+@app.get("/llm/stats")
+def llm_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {"providers": get_llm_call_stats(), "templates": get_template_engine().stats()}
+
+@app.get("/cache/stats")
+def cache_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return {
+        "translation": get_translation_cache().stats(),
+        "result": get_result_cache().stats(),
+        "single_flight": get_single_flight().stats(),
+        "fewshot": get_fewshot_store().stats() if fewshot_enabled() else {"enabled": False},
+    }
+
+@app.get("/exports")
+def exports_stats(
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return get_export_stats()
+
+@app.get("/exports/{export_id}")
+def download_export(
+    export_id: str,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    try:
+        metadata, path = get_export(export_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    return FileResponse(path, media_type=metadata["media_type"], filename=metadata["file_name"])
+
+@app.delete("/exports/{export_id}")
+def remove_export(
+    export_id: str,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    if not delete_export(export_id):
+        raise HTTPException(status_code=404, detail="Export not found or expired")
+    return {"deleted": export_id}
+
+@app.post("/cache/invalidate")
+def cache_invalidate(
+    req: CacheInvalidateRequest,
+    _auth: None = Depends(verify_api_key),
+    _rate_limit: None = Depends(enforce_rate_limit),
+):
+    return invalidate_result_cache(req)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,12 +1,50 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Iterator, Optional
+import asyncio
+import json
+import os
 import re
-from db import run_query
-from llm_provider import get_llm_provider
+import time
+from datasources import get_default_source_name, get_primary_url, get_registry, route_read_url
+from db import arun_query, arun_query_columnar, get_stream_max_rows, run_query, run_query_columnar, stream_query
+from exports import EXPORT_FORMATS, create_export, get_export_settings
+from fewshot_store import match_pair, remember_pair
+from llm_provider import format_sql_prompt, get_llm_provider
+from pagination import advance_state, build_page_query, get_cursor_store, new_page_state
+from schema_cache import get_schema_cache, is_enabled as schema_introspection_enabled
+from schema_index import is_enabled as schema_pruning_enabled, prune_schema_hint
+from single_flight import get_single_flight, is_enabled as single_flight_enabled, make_flight_key
+from sql_templates import match_template
+from summarize import get_summary_settings, summarize_rows
+from sql_guard import check_query_cost, enforce_row_limit, is_explain_enabled
+from result_cache import get_result_cache, is_enabled as result_cache_enabled, make_cache_key as make_result_cache_key
+from translation_cache import (
+    get_translation_cache,
+    is_enabled as translation_cache_enabled,
+    make_cache_key,
+    normalize_nl_query,
+)
 
 class NLQueryRequest(BaseModel):
-    query: str
+    query: str = ""
     schema_hint: Optional[str] = None
+    stream: bool = False
+    cache_ttl_seconds: Optional[int] = Field(default=None, ge=0)
+    format: Optional[str] = None
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
+    database: Optional[str] = None
+    summarize: bool = False
+    export: Optional[str] = None
+
+
+class NLQueryBatchRequest(BaseModel):
+    queries: list[NLQueryRequest]
+    concurrency: Optional[int] = None
+
+
+class CacheInvalidateRequest(BaseModel):
+    tables: list[str] = []
 
 
 FORBIDDEN_SQL_PATTERNS = [
@@ -50,9 +88,377 @@ def validate_sql_is_safe(sql: str) -> None:
         if re.search(pattern, compact, flags=re.IGNORECASE):
             raise ValueError("Generated SQL contains blocked keywords")
 
-def handle_nl_query(payload: NLQueryRequest):
-    llm = get_llm_provider()
-    sql = normalize_sql(llm.generate_sql(payload.query, payload.schema_hint))
+def resolve_schema_hint(payload: NLQueryRequest) -> tuple[str | None, dict | None]:
+    """Return the schema hint for the prompt plus prompt-size stats when it was pruned."""
+    if payload.schema_hint or not schema_introspection_enabled():
+        return payload.schema_hint, None
+    db_url = get_primary_url(payload.database)
+    snapshot = get_schema_cache().get(db_url)
+    if snapshot is None:
+        return None, None
+    if not schema_pruning_enabled():
+        return snapshot["digest"], None
+
+    schema_hint, prompt_stats = prune_schema_hint(db_url, snapshot, payload.query)
+    prompt_stats["prompt_chars_full"] = len(format_sql_prompt(payload.query, snapshot["digest"]))
+    prompt_stats["prompt_chars_pruned"] = len(format_sql_prompt(payload.query, schema_hint))
+    return schema_hint, prompt_stats
+
+
+def _translation_cache_key(payload: NLQueryRequest, schema_hint: str | None, llm) -> str | None:
+    if not translation_cache_enabled():
+        return None
+    return make_cache_key(
+        payload.query, schema_hint, type(llm).__name__, getattr(llm, "model", ""), get_primary_url(payload.database)
+    )
+
+
+def _cached_translation(cache_key: str | None) -> str | None:
+    if cache_key is None:
+        return None
+    cached_sql = get_translation_cache().get(cache_key)
+    if cached_sql is not None:
+        validate_sql_is_safe(cached_sql)
+    return cached_sql
+
+
+def _finalize_translation(cache_key: str | None, generated: str) -> str:
+    sql = normalize_sql(generated)
     validate_sql_is_safe(sql)
-    rows = run_query(sql)
-    return {"sql": sql, "rows": rows}
+    if cache_key is not None:
+        get_translation_cache().set(cache_key, sql)
+    return sql
+
+
+def _require_query(payload: NLQueryRequest) -> None:
+    if not payload.query.strip():
+        raise ValueError("query is required unless a cursor is given")
+
+
+def _template_sql(payload: NLQueryRequest) -> str | None:
+    # Templates are written against the default source's schema; other sources go to the LLM.
+    if payload.database and payload.database != get_default_source_name():
+        return None
+    matched = match_template(payload.query)
+    if matched is None:
+        return None
+    sql = normalize_sql(matched[1])
+    validate_sql_is_safe(sql)
+    return sql
+
+
+def _match_pair(payload: NLQueryRequest) -> tuple[str | None, list[dict]]:
+    return match_pair(get_primary_url(payload.database), payload.query, payload.schema_hint)
+
+
+def _remember_pair(payload: NLQueryRequest, sql: str) -> None:
+    remember_pair(get_primary_url(payload.database), payload.query, sql, payload.schema_hint)
+
+
+def _generate_validated_sql(payload: NLQueryRequest) -> tuple[str, dict | None]:
+    """Return the validated SQL before the row cap, plus prompt stats.
+
+    Callers apply enforce_row_limit themselves; the uncapped SQL is what gets
+    remembered as a few-shot pair, since a stored cap could only be lowered
+    later and would silently truncate exports and summaries.
+    """
+    _require_query(payload)
+    sql = _template_sql(payload)
+    if sql is not None:
+        return sql, None
+    llm = get_llm_provider()
+    schema_hint, prompt_stats = resolve_schema_hint(payload)
+    cache_key = _translation_cache_key(payload, schema_hint, llm)
+    sql = _cached_translation(cache_key)
+    if sql is None:
+        reused, examples = _match_pair(payload)
+        generated = reused if reused is not None else llm.generate_sql_timed(payload.query, schema_hint, examples)
+        sql = _finalize_translation(cache_key, generated)
+    return sql, prompt_stats
+
+
+async def _agenerate_validated_sql(payload: NLQueryRequest) -> tuple[str, dict | None]:
+    _require_query(payload)
+    sql = _template_sql(payload)
+    if sql is not None:
+        return sql, None
+    llm = get_llm_provider()
+    schema_hint, prompt_stats = resolve_schema_hint(payload)
+    cache_key = _translation_cache_key(payload, schema_hint, llm)
+    sql = _cached_translation(cache_key)
+    if sql is None:
+        reused, examples = await asyncio.to_thread(_match_pair, payload)
+        if reused is not None:
+            generated = reused
+        else:
+            generated = await llm.agenerate_sql_timed(payload.query, schema_hint, examples)
+        sql = _finalize_translation(cache_key, generated)
+    return sql, prompt_stats
+
+
+def generate_validated_sql(payload: NLQueryRequest, max_rows: int | None = None) -> str:
+    return enforce_row_limit(_generate_validated_sql(payload)[0], max_rows)
+
+
+async def agenerate_validated_sql(payload: NLQueryRequest, max_rows: int | None = None) -> str:
+    return enforce_row_limit((await _agenerate_validated_sql(payload))[0], max_rows)
+
+
+async def acheck_query_cost(sql: str, db_url: str | None = None) -> None:
+    if is_explain_enabled():
+        await asyncio.to_thread(check_query_cost, sql, db_url)
+
+
+def _with_prompt_stats(result: dict, prompt_stats: dict | None) -> dict:
+    if prompt_stats is not None:
+        result["prompt_stats"] = prompt_stats
+    return result
+
+
+def _result_cache_key(payload: NLQueryRequest, sql: str) -> str | None:
+    if not result_cache_enabled() or payload.cache_ttl_seconds == 0:
+        return None
+    return make_result_cache_key(sql, None, get_primary_url(payload.database))
+
+
+def _cached_result(cache_key: str | None, sql: str) -> dict | None:
+    if cache_key is None:
+        return None
+    cached = get_result_cache().get(cache_key)
+    if cached is None:
+        return None
+    stored_at, rows = cached
+    return {"sql": sql, "rows": rows, "cache": {"hit": True, "age_seconds": round(time.time() - stored_at, 3)}}
+
+
+def _build_result(cache_key: str | None, payload: NLQueryRequest, sql: str, rows: list[dict]) -> dict:
+    if cache_key is None:
+        return {"sql": sql, "rows": rows}
+    get_result_cache().set(cache_key, sql, rows, ttl_seconds=payload.cache_ttl_seconds)
+    return {"sql": sql, "rows": rows, "cache": {"hit": False, "age_seconds": 0.0}}
+
+
+def _flight_key(payload: NLQueryRequest) -> str | None:
+    if not single_flight_enabled():
+        return None
+    llm = get_llm_provider()
+    return make_flight_key(
+        normalize_nl_query(payload.query),
+        payload.schema_hint,
+        type(llm).__name__,
+        getattr(llm, "model", ""),
+        get_primary_url(payload.database),
+        payload.cache_ttl_seconds,
+        payload.summarize,
+    )
+
+
+def _handle_nl_query_summary(payload: NLQueryRequest):
+    """Per-column statistics plus a sample instead of all rows; bypasses the result cache."""
+    max_rows = get_summary_settings()[0]
+    base_sql, prompt_stats = _generate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql, max_rows)
+    read_url = route_read_url(payload.database)
+    check_query_cost(sql, read_url)
+    columns, rows = run_query_columnar(sql, db_url=read_url)
+    _remember_pair(payload, base_sql)
+    return _with_prompt_stats({"sql": sql, **summarize_rows(columns, rows, max_rows)}, prompt_stats)
+
+
+async def _ahandle_nl_query_summary(payload: NLQueryRequest):
+    max_rows = get_summary_settings()[0]
+    base_sql, prompt_stats = await _agenerate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql, max_rows)
+    read_url = route_read_url(payload.database)
+    await acheck_query_cost(sql, read_url)
+    columns, rows = await arun_query_columnar(sql, db_url=read_url)
+    await asyncio.to_thread(_remember_pair, payload, base_sql)
+    summary = await asyncio.to_thread(summarize_rows, columns, rows, max_rows)
+    return _with_prompt_stats({"sql": sql, **summary}, prompt_stats)
+
+
+def _handle_nl_query(payload: NLQueryRequest):
+    if payload.summarize:
+        return _handle_nl_query_summary(payload)
+    base_sql, prompt_stats = _generate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql)
+    cache_key = _result_cache_key(payload, sql)
+    cached = _cached_result(cache_key, sql)
+    if cached is not None:
+        return _with_prompt_stats(cached, prompt_stats)
+    read_url = route_read_url(payload.database)
+    check_query_cost(sql, read_url)
+    rows = run_query(sql, db_url=read_url)
+    _remember_pair(payload, base_sql)
+    return _with_prompt_stats(_build_result(cache_key, payload, sql, rows), prompt_stats)
+
+
+async def _ahandle_nl_query(payload: NLQueryRequest):
+    if payload.summarize:
+        return await _ahandle_nl_query_summary(payload)
+    base_sql, prompt_stats = await _agenerate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql)
+    cache_key = _result_cache_key(payload, sql)
+    cached = _cached_result(cache_key, sql)
+    if cached is not None:
+        return _with_prompt_stats(cached, prompt_stats)
+    read_url = route_read_url(payload.database)
+    await acheck_query_cost(sql, read_url)
+    rows = await arun_query(sql, db_url=read_url)
+    await asyncio.to_thread(_remember_pair, payload, base_sql)
+    return _with_prompt_stats(_build_result(cache_key, payload, sql, rows), prompt_stats)
+
+
+def handle_nl_query(payload: NLQueryRequest):
+    """Run an NL query; identical concurrent requests share one LLM call and one execution."""
+    flight_key = _flight_key(payload)
+    if flight_key is None:
+        return _handle_nl_query(payload)
+    return get_single_flight().do(flight_key, lambda: _handle_nl_query(payload))
+
+
+async def ahandle_nl_query(payload: NLQueryRequest):
+    flight_key = _flight_key(payload)
+    if flight_key is None:
+        return await _ahandle_nl_query(payload)
+    return await get_single_flight().ado(flight_key, lambda: _ahandle_nl_query(payload))
+
+
+async def ahandle_nl_query_columnar(payload: NLQueryRequest):
+    """Like ahandle_nl_query but returns column names plus row tuples for compact encodings.
+
+    Bypasses the result cache, which stores the row-dict shape.
+    """
+    base_sql, prompt_stats = await _agenerate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql)
+    read_url = route_read_url(payload.database)
+    await acheck_query_cost(sql, read_url)
+    columns, rows = await arun_query_columnar(sql, db_url=read_url)
+    return _with_prompt_stats({"sql": sql, "columns": columns, "rows": rows}, prompt_stats)
+
+
+async def ahandle_nl_query_paged(payload: NLQueryRequest):
+    """Return one page of rows plus next_cursor; pages after the first reuse the cached SQL.
+
+    The first page sets the page size (capped at STREAM_MAX_ROWS); the whole
+    walk stops after STREAM_MAX_ROWS rows. Pages bypass the result cache.
+    """
+    max_rows = get_stream_max_rows()
+    prompt_stats = None
+    if payload.cursor:
+        state = get_cursor_store().load(payload.cursor, payload.database)
+        read_url = route_read_url(state["database"])
+    else:
+        if payload.page_size is None or payload.page_size < 1:
+            raise ValueError("page_size must be >= 1")
+        source = get_registry().get(payload.database)
+        sql, prompt_stats = await _agenerate_validated_sql(payload)
+        # Check the plan on the replica the first page will actually run on.
+        read_url = route_read_url(source.name)
+        await acheck_query_cost(sql, read_url)
+        snapshot = get_schema_cache().get(source.primary) if schema_introspection_enabled() else None
+        state = new_page_state(sql, min(payload.page_size, max_rows), source.name, snapshot)
+
+    page_rows = min(state["page_size"], max_rows - state["returned"])
+    page_sql, params = build_page_query(state, page_rows + 1)
+    rows = await arun_query(page_sql, params, db_url=read_url)
+    rows, next_state = advance_state(state, rows, page_rows, max_rows)
+    result = {
+        "sql": state["sql"],
+        "rows": rows,
+        "page_size": state["page_size"],
+        "pagination": state["mode"],
+        "next_cursor": get_cursor_store().save(next_state) if next_state is not None else None,
+    }
+    return _with_prompt_stats(result, prompt_stats)
+
+
+def handle_nl_query_export(payload: NLQueryRequest) -> dict:
+    """Write the full result to a Parquet/gzip-CSV spool file and return its download handle."""
+    if payload.export not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{payload.export}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    base_sql, _prompt_stats = _generate_validated_sql(payload)
+    sql = enforce_row_limit(base_sql, get_export_settings()[2])
+    read_url = route_read_url(payload.database)
+    check_query_cost(sql, read_url)
+    metadata = create_export(sql, payload.export, read_url)
+    _remember_pair(payload, base_sql)
+    return {**metadata, "download_url": f"/exports/{metadata['export_id']}"}
+
+
+def get_batch_limits() -> tuple[int, int]:
+    max_items = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+    concurrency = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    return max_items, concurrency
+
+
+async def ahandle_nl_query_batch(payload: NLQueryBatchRequest):
+    """Run many NL queries with bounded concurrency; one failure does not abort the batch."""
+    max_items, default_concurrency = get_batch_limits()
+    if len(payload.queries) > max_items:
+        raise ValueError(f"Batch exceeds the maximum of {max_items} queries")
+    concurrency = max(1, min(payload.concurrency or default_concurrency, default_concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def run_item(index: int, item: NLQueryRequest) -> dict:
+        async with semaphore:
+            item_start = time.perf_counter()
+            try:
+                result = await ahandle_nl_query(item)
+                outcome = {"index": index, "ok": True, "result": result}
+            except Exception as e:
+                outcome = {"index": index, "ok": False, "error": str(e)}
+            outcome["duration_ms"] = round((time.perf_counter() - item_start) * 1000, 2)
+            return outcome
+
+    results = await asyncio.gather(*(run_item(index, item) for index, item in enumerate(payload.queries)))
+    succeeded = sum(1 for item in results if item["ok"])
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "concurrency": concurrency,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def invalidate_result_cache(payload: CacheInvalidateRequest):
+    cache = get_result_cache()
+    if payload.tables:
+        removed = cache.invalidate_tables(payload.tables)
+    else:
+        removed = cache.clear()
+    return {"invalidated": removed, "tables": payload.tables}
+
+
+def _ndjson_line(value: dict) -> str:
+    return json.dumps(value, default=str, separators=(",", ":")) + "\n"
+
+
+def stream_nl_query(payload: NLQueryRequest) -> Iterator[str]:
+    """Yield NDJSON chunks: a header line with the SQL, one line per row, then a trailer.
+
+    The SQL is generated, validated, and executed before the first chunk is
+    yielded, so callers can prime the iterator to surface errors up front.
+    """
+    max_rows = get_stream_max_rows()
+    sql = generate_validated_sql(payload, max_rows=max_rows)
+    read_url = route_read_url(payload.database)
+    check_query_cost(sql, read_url)
+    batches = stream_query(sql, max_rows=max_rows, db_url=read_url)
+    first_batch = next(batches, [])
+    yield _ndjson_line({"sql": sql})
+
+    row_count = 0
+    for batch in _chain_first(first_batch, batches):
+        row_count += len(batch)
+        yield "".join(_ndjson_line(row) for row in batch)
+    yield _ndjson_line({"row_count": row_count, "truncated": row_count >= max_rows})
+
+
+def _chain_first(first_batch: list[dict], batches: Iterator[list[dict]]) -> Iterator[list[dict]]:
+    if first_batch:
+        yield first_batch
+    yield from batches
+
@@ -5,8 +5,18 @@ Wraps existing business logic in proper MCP protocol using FastMCP.
 Mounts at /mcp on the FastAPI app — any MCP client can connect here.
 """
 
+import asyncio
+
 from mcp.server.fastmcp import FastMCP
-from mcp_tools import NLQueryRequest, handle_nl_query
+from mcp_tools import (
+    NLQueryBatchRequest,
+    NLQueryRequest,
+    ahandle_nl_query,
+    ahandle_nl_query_batch,
+    ahandle_nl_query_columnar,
+    ahandle_nl_query_paged,
+    handle_nl_query_export,
+)
 
 mcp = FastMCP("business-intelligence-mcp")
 
@@ -15,12 +25,98 @@ mcp = FastMCP("business-intelligence-mcp")
     name="nl_query",
     description=(
         "Convert a natural language question into SQL and run it against the connected database. "
-        "Returns the generated SQL and result rows. Read-only — SELECT/CTE queries only."
+        "Returns the generated SQL and result rows. Read-only — SELECT/CTE queries only. "
+        "Set columnar=true to get column names once plus row arrays, which is far more compact. "
+        "Set page_size to page through large results: pass the returned next_cursor back as cursor "
+        "(query may then be empty) until next_cursor is null. "
+        "Set database to query a named data source instead of the default one. "
+        "Set summarize=true to get per-column statistics and a small sample instead of all rows."
     ),
 )
-def nl_query(query: str, schema_hint: str = "") -> dict:
+async def nl_query(
+    query: str = "",
+    schema_hint: str = "",
+    columnar: bool = False,
+    page_size: int = 0,
+    cursor: str = "",
+    database: str = "",
+    summarize: bool = False,
+) -> dict:
     payload = NLQueryRequest(
         query=query,
         schema_hint=schema_hint if schema_hint else None,
+        page_size=page_size if page_size else None,
+        cursor=cursor if cursor else None,
+        database=database if database else None,
+        summarize=summarize,
+    )
+    if payload.cursor or payload.page_size:
+        return await ahandle_nl_query_paged(payload)
+    if columnar and not summarize:
+        result = await ahandle_nl_query_columnar(payload)
+        result["data"] = [list(row) for row in result.pop("rows")]
+        return result
+    return await ahandle_nl_query(payload)
+
+
+@mcp.tool(
+    name="nl_query_page",
+    description=(
+        "Paginated variant of nl_query for large results. Returns one page of rows plus "
+        "next_cursor and has_more; pass next_cursor back as cursor (query may then be empty) "
+        "to get the next page. Later pages reuse the SQL from the first and never call the LLM."
+    ),
+)
+async def nl_query_page(
+    query: str = "", schema_hint: str = "", page_size: int = 500, cursor: str = "", database: str = ""
+) -> dict:
+    payload = NLQueryRequest(
+        query=query,
+        schema_hint=schema_hint if schema_hint else None,
+        page_size=page_size,
+        cursor=cursor if cursor else None,
+        database=database if database else None,
+    )
+    result = await ahandle_nl_query_paged(payload)
+    result["has_more"] = result["next_cursor"] is not None
+    return result
+
+
+@mcp.tool(
+    name="nl_query_export",
+    description=(
+        "Export the full result of a natural language question to a Parquet or gzip-CSV file "
+        "instead of returning rows. Returns the export id, row count, size, expiry, and a "
+        "download_url (GET with X-API-Key, supports HTTP range requests)."
+    ),
+)
+async def nl_query_export(query: str, format: str = "parquet", schema_hint: str = "", database: str = "") -> dict:
+    payload = NLQueryRequest(
+        query=query,
+        schema_hint=schema_hint if schema_hint else None,
+        database=database if database else None,
+        export=format,
+    )
+    # The export streams the whole result to disk; keep it off the event loop.
+    return await asyncio.to_thread(handle_nl_query_export, payload)
+
+
+@mcp.tool(
+    name="nl_query_batch",
+    description=(
+        "Run several natural language questions at once. SQL generation and execution run "
+        "concurrently; each item returns its own result or error without failing the batch."
+    ),
+)
+async def nl_query_batch(queries: list[str], schema_hint: str = "", database: str = "") -> dict:
+    payload = NLQueryBatchRequest(
+        queries=[
+            NLQueryRequest(
+                query=query,
+                schema_hint=schema_hint if schema_hint else None,
+                database=database if database else None,
+            )
+            for query in queries
+        ]
     )
-    return handle_nl_query(payload)
+    return await ahandle_nl_query_batch(payload)
@@ -0,0 +1,198 @@
+"""
+Continuation cursors for paging through large /nl-query results.
+
+The first request (page_size set) generates and validates SQL once; the SQL
+and the paging position are kept server-side behind an opaque cursor id, so
+follow-up requests (cursor set) never call the LLM.
+
+Keyset pagination is used when the query reads a single table and its
+top-level ORDER BY covers that table's primary key (known from the schema
+cache), which makes the sort key unique, and every ORDER BY column is NOT
+NULL, since a row-value comparison against NULL never matches and would
+silently drop those rows. Later pages then run
+
+    SELECT * FROM (<sql without ORDER BY>) AS _page
+    WHERE (k1, k2) > (:k0, :k1) ORDER BY k1, k2 LIMIT n
+
+Anything else falls back to LIMIT/OFFSET. Cursors live in this process only
+and expire after PAGINATION_CURSOR_TTL_SECONDS.
+"""
+
+import os
+import re
+import secrets
+import threading
+
+from cache import TTLCache
+from result_cache import extract_tables
+from sql_guard import find_top_level_keyword
+
+ORDER_ITEM_PATTERN = re.compile(
+    r"^(?:[A-Za-z_]\w*\.)?(?P<column>[A-Za-z_]\w*)(?:\s+(?P<direction>asc|desc))?$",
+    flags=re.IGNORECASE,
+)
+
+
+def get_cursor_settings() -> tuple[int, int]:
+    max_entries = int(os.getenv("PAGINATION_MAX_CURSORS", "1024"))
+    ttl_seconds = int(os.getenv("PAGINATION_CURSOR_TTL_SECONDS", "900"))
+    return max_entries, ttl_seconds
+
+
+def _split_top_level_commas(text: str) -> list[str]:
+    parts = []
+    depth = 0
+    current = []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return parts
+
+
+def plan_keyset(sql: str, snapshot: dict | None) -> dict | None:
+    """Return {"body", "keys", "descending"} when sql can be keyset-paginated, else None."""
+    if snapshot is None:
+        return None
+    statement = sql.strip().rstrip(";").rstrip()
+    if find_top_level_keyword(statement, r"(limit|fetch|offset|union|intersect|except)\b") is not None:
+        return None
+    order_start = find_top_level_keyword(statement, r"order\s+by\b")
+    if order_start is None:
+        return None
+
+    body = statement[:order_start].rstrip()
+    if re.search(r"\b(?:from|join)\s*\(", body, flags=re.IGNORECASE):
+        return None
+    order_clause = re.sub(r"^order\s+by\s+", "", statement[order_start:], flags=re.IGNORECASE)
+    keys = []
+    directions = set()
+    for item in _split_top_level_commas(order_clause):
+        match = ORDER_ITEM_PATTERN.match(item)
+        if match is None:
+            return None
+        keys.append(match.group("column"))
+        directions.add((match.group("direction") or "asc").lower())
+    if len(directions) != 1:
+        return None
+
+    table_names = {name.rsplit(".", 1)[-1] for name in extract_tables(body)}
+    if len(table_names) != 1:
+        return None
+    table_name = table_names.pop()
+    table = next((table for table in snapshot["tables"] if table["name"].lower() == table_name), None)
+    if table is None or not table["primary_key"]:
+        return None
+    if not {column.lower() for column in table["primary_key"]} <= {key.lower() for key in keys}:
+        return None
+    not_null = {column["name"].lower() for column in table["columns"] if column.get("nullable", True) is False}
+    if not {key.lower() for key in keys} <= not_null:
+        return None
+    return {"body": body, "keys": keys, "descending": directions == {"desc"}}
+
+
+def new_page_state(sql: str, page_size: int, database: str, snapshot: dict | None) -> dict:
+    statement = sql.strip().rstrip(";").rstrip()
+    state = {
+        "sql": statement,
+        "database": database,
+        "page_size": page_size,
+        "mode": "offset",
+        "offset": 0,
+        "returned": 0,
+        "keyset": None,
+        "last_key": None,
+    }
+    keyset = plan_keyset(statement, snapshot)
+    if keyset is not None:
+        state["mode"] = "keyset"
+        state["keyset"] = keyset
+    return state
+
+
+def build_page_query(state: dict, limit: int) -> tuple[str, dict]:
+    """Return (sql, params) fetching up to limit rows for the page described by state."""
+    statement = state["sql"]
+    if state["mode"] == "keyset" and state["last_key"] is not None:
+        keyset = state["keyset"]
+        comparison = "<" if keyset["descending"] else ">"
+        direction = " DESC" if keyset["descending"] else ""
+        params = {f"k{index}": value for index, value in enumerate(state["last_key"])}
+        if len(keyset["keys"]) == 1:
+            condition = f"{keyset['keys'][0]} {comparison} :k0"
+        else:
+            condition = f"({', '.join(keyset['keys'])}) {comparison} ({', '.join(':' + name for name in params)})"
+        order_by = ", ".join(f"{key}{direction}" for key in keyset["keys"])
+        return (
+            f"SELECT * FROM ({keyset['body']}) AS _page WHERE {condition} ORDER BY {order_by} LIMIT {limit}",
+            params,
+        )
+    if find_top_level_keyword(statement, r"(limit|fetch|offset)\b") is not None:
+        return f"SELECT * FROM ({statement}) AS _page LIMIT {limit} OFFSET {state['offset']}", {}
+    return f"{statement} LIMIT {limit} OFFSET {state['offset']}", {}
+
+
+def advance_state(state: dict, rows: list[dict], page_rows: int, max_rows: int) -> tuple[list[dict], dict | None]:
+    """Trim rows to the page and return (rows, next state or None when the result is exhausted)."""
+    has_more = len(rows) > page_rows
+    rows = rows[:page_rows]
+    returned = state["returned"] + len(rows)
+    if not has_more or returned >= max_rows:
+        return rows, None
+
+    next_state = dict(state, offset=state["offset"] + len(rows), returned=returned)
+    if state["mode"] == "keyset":
+        keys = state["keyset"]["keys"]
+        if all(key in rows[-1] for key in keys):
+            next_state["last_key"] = [rows[-1][key] for key in keys]
+        else:
+            # The sort key is not part of the SELECT list; OFFSET keeps the same order.
+            next_state["mode"] = "offset"
+    return rows, next_state
+
+
+class CursorStore:
+    def __init__(self) -> None:
+        max_entries, ttl_seconds = get_cursor_settings()
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def save(self, state: dict) -> str:
+        cursor = secrets.token_urlsafe(16)
+        self.memory.set(cursor, state)
+        return cursor
+
+    def load(self, cursor: str, database: str | None = None) -> dict:
+        """Return the paging state; database, when given, must match the cursor's data source."""
+        state = self.memory.get(cursor)
+        if state is None or (database is not None and state["database"] != database):
+            raise ValueError("Unknown or expired cursor")
+        return state
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+
+_store: CursorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_cursor_store() -> CursorStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CursorStore()
+    return _store
+
+
+def reset_cursor_store() -> None:
+    global _store
+    with _store_lock:
+        _store = None
@@ -0,0 +1,117 @@
+"""
+Opt-in query result cache for the BI server.
+
+Keyed by the final validated SQL + bind params (+ target database), with a
+per-entry TTL and an approximate memory budget enforced by LRU eviction.
+Each entry remembers the tables referenced by its SELECT so an admin can
+invalidate everything that read from a table after it changes.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+from cache import TTLCache
+
+_IDENTIFIER = r"[`\"\[]?[A-Za-z_][\w$]*[`\"\]]?"
+_TABLE_NAME = rf"(?:{_IDENTIFIER}\.)?{_IDENTIFIER}"
+_ALIAS = (
+    r"(?:\s+(?:as\s+)?(?!(?:where|join|inner|left|right|full|cross|natural|outer|on|using|group|order|"
+    r"having|limit|offset|union|intersect|except|window|fetch|for)\b)[A-Za-z_]\w*)?"
+)
+TABLE_REFERENCE_PATTERN = re.compile(
+    rf"\b(?:from|join)\s+({_TABLE_NAME}{_ALIAS}(?:\s*,\s*{_TABLE_NAME}{_ALIAS})*)",
+    flags=re.IGNORECASE,
+)
+
+
+def is_enabled() -> bool:
+    return os.getenv("RESULT_CACHE_ENABLED", "false").strip().lower() == "true"
+
+
+def get_cache_settings() -> tuple[int, int, int]:
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "512"))
+    ttl_seconds = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "60"))
+    max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    return max_entries, ttl_seconds, max_bytes
+
+
+def extract_tables(sql: str) -> set[str]:
+    """Return lower-cased table names referenced in FROM/JOIN clauses.
+
+    Schema-qualified names are indexed both with and without the schema so
+    invalidation by either form matches.
+    """
+    tables: set[str] = set()
+    for match in TABLE_REFERENCE_PATTERN.finditer(sql):
+        for reference in match.group(1).split(","):
+            name = reference.strip().split()[0]
+            name = re.sub(r"[`\"\[\]]", "", name).lower()
+            tables.add(name)
+            tables.add(name.rsplit(".", 1)[-1])
+    return tables
+
+
+def make_cache_key(sql: str, params: dict | None, database: str) -> str:
+    serialized_params = json.dumps(params or {}, sort_keys=True, default=str)
+    raw = "\x1f".join([database, sql.strip(), serialized_params])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self) -> None:
+        max_entries, ttl_seconds, max_bytes = get_cache_settings()
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+        self.invalidations = 0
+
+    def get(self, key: str) -> tuple[float, list[dict]] | None:
+        """Return (stored_at, rows) for a cached result, or None."""
+        entry = self.memory.get_entry(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        return stored_at, value["rows"]
+
+    def set(self, key: str, sql: str, rows: list[dict], ttl_seconds: int | None = None) -> bool:
+        size = len(json.dumps(rows, default=str))
+        value = {"rows": rows, "tables": extract_tables(sql)}
+        return self.memory.set(key, value, ttl_seconds=ttl_seconds, size=size)
+
+    def invalidate_tables(self, tables: list[str]) -> int:
+        targets = {table.strip().lower() for table in tables if table.strip()}
+        removed = self.memory.delete_where(lambda value: bool(value["tables"] & targets))
+        self.invalidations += removed
+        return removed
+
+    def clear(self) -> int:
+        removed = self.memory.stats()["entries"]
+        self.memory.clear()
+        self.invalidations += removed
+        return removed
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["enabled"] = is_enabled()
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+_cache: ResultCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+
+def reset_result_cache() -> None:
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,145 @@
+"""
+Cached database schema introspection for the BI server.
+
+The SQLAlchemy inspector is run once per DSN (at startup, in the background)
+and the result is kept as a compact digest that replaces a missing
+schema_hint. Stale entries keep being served while a background thread
+refreshes them, so reflection never runs on the request path after warm-up.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import inspect
+
+from db import get_db_url, get_engine
+
+logger = logging.getLogger("mcp.bi.schema_cache")
+
+
+def is_enabled() -> bool:
+    return os.getenv("SCHEMA_INTROSPECTION_ENABLED", "true").strip().lower() == "true"
+
+
+def get_schema_ttl_seconds() -> int:
+    return int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "3600"))
+
+
+def _is_sqlite_rowid_alias(dialect: str, primary_key: list[str], column: dict) -> bool:
+    """SQLite reports an INTEGER PRIMARY KEY as nullable, but it aliases the rowid and is never NULL."""
+    return dialect == "sqlite" and primary_key == [column["name"]] and str(column["type"]).upper() == "INTEGER"
+
+
+def introspect_schema(db_url: str | None = None) -> list[dict]:
+    engine = get_engine(db_url)
+    inspector = inspect(engine)
+    tables = []
+    for table_name in sorted(inspector.get_table_names()):
+        primary_key = inspector.get_pk_constraint(table_name).get("constrained_columns") or []
+        foreign_keys = [
+            {
+                "columns": fk["constrained_columns"],
+                "referred_table": fk["referred_table"],
+                "referred_columns": fk["referred_columns"],
+            }
+            for fk in inspector.get_foreign_keys(table_name)
+        ]
+        columns = [
+            {
+                "name": column["name"],
+                "type": str(column["type"]),
+                "nullable": column.get("nullable", True)
+                and not _is_sqlite_rowid_alias(engine.dialect.name, primary_key, column),
+            }
+            for column in inspector.get_columns(table_name)
+        ]
+        tables.append(
+            {"name": table_name, "columns": columns, "primary_key": primary_key, "foreign_keys": foreign_keys}
+        )
+    return tables
+
+
+def format_table(table: dict) -> str:
+    references = {}
+    for fk in table["foreign_keys"]:
+        for column, referred in zip(fk["columns"], fk["referred_columns"]):
+            references[column] = f"{fk['referred_table']}.{referred}"
+
+    parts = []
+    for column in table["columns"]:
+        text = f"{column['name']} {column['type']}"
+        if column["name"] in table["primary_key"]:
+            text += " PK"
+        if column["name"] in references:
+            text += f" FK->{references[column['name']]}"
+        parts.append(text)
+    return f"{table['name']}({', '.join(parts)})"
+
+
+def build_schema_digest(tables: list[dict]) -> str:
+    return "\n".join(format_table(table) for table in tables)
+
+
+class SchemaCache:
+    def __init__(self) -> None:
+        self._snapshots: dict[str, dict] = {}
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def refresh(self, db_url: str | None = None) -> dict:
+        db_url = db_url or get_db_url()
+        start = time.perf_counter()
+        tables = introspect_schema(db_url)
+        snapshot = {
+            "tables": tables,
+            "digest": build_schema_digest(tables),
+            "refreshed_at": time.time(),
+            "introspection_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        with self._lock:
+            self._snapshots[db_url] = snapshot
+        return snapshot
+
+    def refresh_in_background(self, db_url: str | None = None) -> None:
+        db_url = db_url or get_db_url()
+        with self._lock:
+            if db_url in self._refreshing:
+                return
+            self._refreshing.add(db_url)
+        threading.Thread(target=self._background_refresh, args=(db_url,), daemon=True).start()
+
+    def _background_refresh(self, db_url: str) -> None:
+        try:
+            self.refresh(db_url)
+        except Exception:
+            logger.warning("schema_cache.refresh_failed", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(db_url)
+
+    def get(self, db_url: str | None = None) -> dict | None:
+        """Return the cached snapshot without blocking; schedule a refresh if missing or stale."""
+        db_url = db_url or get_db_url()
+        with self._lock:
+            snapshot = self._snapshots.get(db_url)
+        if snapshot is None or time.time() - snapshot["refreshed_at"] > get_schema_ttl_seconds():
+            self.refresh_in_background(db_url)
+        return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+
+_cache = SchemaCache()
+
+
+def get_schema_cache() -> SchemaCache:
+    return _cache
+
+
+def warm_schema_cache() -> None:
+    if is_enabled() and os.getenv("DB_URL"):
+        _cache.refresh_in_background()
@@ -0,0 +1,150 @@
+"""
+Relevance pruning for schema hints.
+
+Builds an inverted index over table and column name tokens (plus optional
+synonyms) so each NL query only sends its top-K relevant tables to the LLM
+instead of the whole schema digest.
+
+Synonyms file (SCHEMA_SYNONYMS_PATH) maps schema terms to the words users
+say for them, e.g. {"customers": ["clients", "accounts"], "revenue": ["sales"]}.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+
+from schema_cache import format_table
+
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_NAME_WEIGHT = 1.0
+
+
+def is_enabled() -> bool:
+    return os.getenv("SCHEMA_PRUNING_ENABLED", "true").strip().lower() == "true"
+
+
+def get_top_k() -> int:
+    return int(os.getenv("SCHEMA_HINT_TOP_K", "8"))
+
+
+def tokenize(text: str) -> list[str]:
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    tokens = []
+    for token in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if not token:
+            continue
+        if len(token) > 3 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def load_synonyms() -> dict[str, set[str]]:
+    """Return word -> schema tokens it should match."""
+    path = os.getenv("SCHEMA_SYNONYMS_PATH", "").strip()
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        raw = json.load(handle)
+    synonyms: dict[str, set[str]] = defaultdict(set)
+    for term, words in raw.items():
+        term_tokens = tokenize(term)
+        for word in words:
+            for token in tokenize(word):
+                synonyms[token].update(term_tokens)
+    return dict(synonyms)
+
+
+class SchemaIndex:
+    def __init__(self, tables: list[dict], synonyms: dict[str, set[str]] | None = None) -> None:
+        self.tables = {table["name"]: table for table in tables}
+        self.synonyms = synonyms or {}
+        self.postings: dict[str, dict[str, float]] = defaultdict(dict)
+        for table in tables:
+            for token in tokenize(table["name"]):
+                self._add(token, table["name"], TABLE_NAME_WEIGHT)
+            for column in table["columns"]:
+                for token in tokenize(column["name"]):
+                    self._add(token, table["name"], COLUMN_NAME_WEIGHT)
+
+    def _add(self, token: str, table_name: str, weight: float) -> None:
+        current = self.postings[token].get(table_name, 0.0)
+        self.postings[token][table_name] = max(current, weight)
+
+    def score(self, nl_query: str) -> dict[str, float]:
+        query_tokens = set(tokenize(nl_query))
+        for token in list(query_tokens):
+            query_tokens.update(self.synonyms.get(token, ()))
+
+        scores: dict[str, float] = defaultdict(float)
+        table_count = max(len(self.tables), 1)
+        for token in query_tokens:
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + table_count / len(postings))
+            for table_name, weight in postings.items():
+                scores[table_name] += weight * idf
+        return dict(scores)
+
+    def select_tables(self, nl_query: str, top_k: int) -> list[str]:
+        """Top-K tables by score, topped up with tables they reference via FKs."""
+        scores = self.score(nl_query)
+        ranked = sorted(scores, key=lambda name: (-scores[name], name))[:top_k]
+        selected = list(ranked)
+        for table_name in ranked:
+            for fk in self.tables[table_name]["foreign_keys"]:
+                referred = fk["referred_table"]
+                if len(selected) < top_k and referred in self.tables and referred not in selected:
+                    selected.append(referred)
+        return selected
+
+    def build_hint(self, table_names: list[str]) -> str:
+        return "\n".join(format_table(self.tables[name]) for name in table_names)
+
+
+_indexes: dict[str, tuple[float, SchemaIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_schema_index(db_url: str, snapshot: dict) -> SchemaIndex:
+    """Return the index for a schema snapshot, rebuilding it when the snapshot changes."""
+    with _indexes_lock:
+        cached = _indexes.get(db_url)
+        if cached is not None and cached[0] == snapshot["refreshed_at"]:
+            return cached[1]
+    index = SchemaIndex(snapshot["tables"], load_synonyms())
+    with _indexes_lock:
+        _indexes[db_url] = (snapshot["refreshed_at"], index)
+    return index
+
+
+def reset_schema_indexes() -> None:
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def prune_schema_hint(db_url: str, snapshot: dict, nl_query: str) -> tuple[str, dict]:
+    """Return (schema hint, size stats) keeping only the tables relevant to nl_query."""
+    full_hint = snapshot["digest"]
+    top_k = get_top_k()
+    tables_total = len(snapshot["tables"])
+    hint = full_hint
+    selected = [table["name"] for table in snapshot["tables"]]
+    if tables_total > top_k:
+        index = get_schema_index(db_url, snapshot)
+        ranked = index.select_tables(nl_query, top_k)
+        if ranked:
+            selected = ranked
+            hint = index.build_hint(ranked)
+    return hint, {
+        "tables_total": tables_total,
+        "tables_selected": len(selected),
+        "schema_chars_full": len(full_hint),
+        "schema_chars_pruned": len(hint),
+    }
@@ -0,0 +1,249 @@
+"""
+Single-flight coalescing of identical concurrent NL queries.
+
+Requests whose key (normalized NL query + schema hint + provider/model +
+database) matches one already in flight wait on the leader's result instead
+of calling the LLM and the database again. Coalescing is per process; with
+SINGLE_FLIGHT_REDIS=true the leader also takes a Redis lock (SET NX PX) and
+publishes its result briefly, so followers in other workers reuse it. Redis
+errors fall back to running the query locally.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import redis  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without redis installed
+    redis = None
+
+REDIS_LOCK_PREFIX = "nl_single_flight:lock:"
+REDIS_RESULT_PREFIX = "nl_single_flight:result:"
+
+logger = logging.getLogger("mcp.bi.single_flight")
+
+
+def is_enabled() -> bool:
+    return os.getenv("SINGLE_FLIGHT_ENABLED", "true").strip().lower() == "true"
+
+
+def get_redis_settings() -> tuple[int, int, int]:
+    lock_timeout_ms = int(os.getenv("SINGLE_FLIGHT_LOCK_TIMEOUT_MS", "30000"))
+    result_ttl_ms = int(os.getenv("SINGLE_FLIGHT_RESULT_TTL_MS", "5000"))
+    poll_ms = int(os.getenv("SINGLE_FLIGHT_POLL_MS", "50"))
+    return lock_timeout_ms, result_ttl_ms, poll_ms
+
+
+def make_flight_key(*parts) -> str:
+    raw = "\x1f".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self.lock_timeout_ms, self.result_ttl_ms, self.poll_ms = get_redis_settings()
+        self.redis_client = _create_redis_client()
+        self._calls: dict[str, _Call] = {}
+        self._futures: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.redis_hits = 0
+        self.redis_degraded = False
+
+    def do(self, key: str, fn):
+        """Run fn() once per key across concurrent callers in this process."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.copy(call.result)
+
+        try:
+            call.result = self._run_distributed(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: str, fn):
+        """Async variant of do(); fn is a zero-argument coroutine function."""
+        future = self._futures.get(key)
+        if future is not None and not future.done():
+            self.coalesced += 1
+            try:
+                return copy.copy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; run the query for this caller instead.
+                return await fn()
+
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        self.leaders += 1
+        try:
+            result = await self._arun_distributed(key, fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so a follower-less failure is not logged twice.
+            raise
+        finally:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def _run_distributed(self, key: str, fn):
+        acquired = self._try_lock(key)
+        if acquired is None:
+            return fn()
+        if acquired:
+            try:
+                result = fn()
+                self._publish(key, result)
+                return result
+            finally:
+                self._release(key)
+
+        deadline = time.monotonic() + self.lock_timeout_ms / 1000
+        while time.monotonic() < deadline:
+            result, lock_held = self._poll(key)
+            if result is not None:
+                return result
+            if not lock_held:
+                break
+            time.sleep(self.poll_ms / 1000)
+        return fn()
+
+    async def _arun_distributed(self, key: str, fn):
+        acquired = await asyncio.to_thread(self._try_lock, key) if self.redis_client is not None else None
+        if acquired is None:
+            return await fn()
+        if acquired:
+            try:
+                result = await fn()
+                await asyncio.to_thread(self._publish, key, result)
+                return result
+            finally:
+                await asyncio.to_thread(self._release, key)
+
+        deadline = time.monotonic() + self.lock_timeout_ms / 1000
+        while time.monotonic() < deadline:
+            result, lock_held = await asyncio.to_thread(self._poll, key)
+            if result is not None:
+                return result
+            if not lock_held:
+                break
+            await asyncio.sleep(self.poll_ms / 1000)
+        return await fn()
+
+    def _try_lock(self, key: str) -> bool | None:
+        """True when this worker leads, False when another does, None without Redis."""
+        if self.redis_client is None:
+            return None
+        try:
+            acquired = bool(self.redis_client.set(REDIS_LOCK_PREFIX + key, "1", nx=True, px=self.lock_timeout_ms))
+            if acquired:
+                self.redis_client.delete(REDIS_RESULT_PREFIX + key)
+            self.redis_degraded = False
+            return acquired
+        except Exception:
+            self._mark_redis_degraded("lock")
+            return None
+
+    def _publish(self, key: str, result) -> None:
+        try:
+            self.redis_client.set(REDIS_RESULT_PREFIX + key, json.dumps(result, default=str), px=self.result_ttl_ms)
+        except Exception:
+            self._mark_redis_degraded("publish")
+
+    def _release(self, key: str) -> None:
+        try:
+            self.redis_client.delete(REDIS_LOCK_PREFIX + key)
+        except Exception:
+            self._mark_redis_degraded("release")
+
+    def _poll(self, key: str) -> tuple[object | None, bool]:
+        """Return (published result or None, whether the leader still holds the lock)."""
+        try:
+            published = self.redis_client.get(REDIS_RESULT_PREFIX + key)
+            if published is not None:
+                self.redis_hits += 1
+                return json.loads(published), True
+            return None, bool(self.redis_client.exists(REDIS_LOCK_PREFIX + key))
+        except Exception:
+            self._mark_redis_degraded("poll")
+            return None, False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": is_enabled(),
+            "backend": "memory+redis" if self.redis_client is not None else "memory",
+            "in_flight": len(self._calls) + len(self._futures),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "redis_hits": self.redis_hits,
+            "redis_degraded": self.redis_degraded,
+        }
+
+    def _mark_redis_degraded(self, operation: str) -> None:
+        self.redis_degraded = True
+        logger.warning("single_flight.redis_unavailable operation=%s fallback=local", operation)
+
+
+def _create_redis_client():
+    if os.getenv("SINGLE_FLIGHT_REDIS", "false").strip().lower() != "true":
+        return None
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    if not redis_url or redis is None:
+        return None
+    return redis.from_url(redis_url, decode_responses=True)
+
+
+_single_flight: SingleFlight | None = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
+
+
+def reset_single_flight() -> None:
+    global _single_flight
+    with _single_flight_lock:
+        _single_flight = None
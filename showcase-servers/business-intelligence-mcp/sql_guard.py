@@ -0,0 +1,152 @@
+"""
+Cost guard applied to generated SQL after validate_sql_is_safe.
+
+- Row cap: a top-level LIMIT is injected (ahead of a bare OFFSET), or
+  clamped to SQL_MAX_ROWS.
+- Plan check (opt-in): EXPLAIN rejects queries whose estimated cost or row
+  count exceeds SQL_EXPLAIN_MAX_COST / SQL_EXPLAIN_MAX_ROWS.
+
+The per-statement timeout (SQL_STATEMENT_TIMEOUT_MS) is applied at the
+connection level when engines are created; see db.install_statement_timeout.
+"""
+
+import json
+import os
+import re
+
+from sqlalchemy import text
+
+from db import connect
+
+# Counts may also be LIMIT ALL or a bind parameter (?, :name, $1); those are replaced by the cap.
+_LIMIT_VALUE = r"(?:\d+|\?|:\w+|\$\d+)"
+LIMIT_PATTERN = re.compile(
+    rf"^limit\s+(?:(?P<offset>{_LIMIT_VALUE})\s*,\s*)?(?P<count>all|{_LIMIT_VALUE})"
+    rf"(?P<rest>\s+offset\s+{_LIMIT_VALUE})?$",
+    flags=re.IGNORECASE,
+)
+FETCH_PATTERN = re.compile(
+    r"^(?P<head>fetch\s+(?:first|next)\s+)(?P<count>\d+)(?P<tail>\s+rows?\s+only)$",
+    flags=re.IGNORECASE,
+)
+
+
+def get_max_rows() -> int:
+    return int(os.getenv("SQL_MAX_ROWS", "10000"))
+
+
+def is_explain_enabled() -> bool:
+    return os.getenv("SQL_EXPLAIN_ENABLED", "false").strip().lower() == "true"
+
+
+def get_explain_limits() -> tuple[float, float]:
+    max_cost = float(os.getenv("SQL_EXPLAIN_MAX_COST", "1000000"))
+    max_rows = float(os.getenv("SQL_EXPLAIN_MAX_ROWS", "10000000"))
+    return max_cost, max_rows
+
+
+def find_top_level_keyword(sql: str, keyword_pattern: str) -> int | None:
+    """Index of the last keyword match outside quotes and parentheses."""
+    depth = 0
+    quote = None
+    position = None
+    for index, char in enumerate(sql):
+        if quote:
+            if char == quote:
+                quote = None
+            continue
+        if char in ("'", '"', "`"):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0 and (index == 0 or not (sql[index - 1].isalnum() or sql[index - 1] == "_")):
+            if re.match(keyword_pattern, sql[index:], flags=re.IGNORECASE):
+                position = index
+    return position
+
+
+def _top_level_tail_start(sql: str) -> int | None:
+    """Index of the last top-level LIMIT/FETCH keyword outside quotes and parentheses."""
+    return find_top_level_keyword(sql, r"(limit|fetch)\b")
+
+
+def enforce_row_limit(sql: str, max_rows: int | None = None) -> str:
+    """Inject a top-level LIMIT, or clamp an existing LIMIT/FETCH FIRST, to max_rows."""
+    max_rows = get_max_rows() if max_rows is None else max_rows
+    if max_rows <= 0:
+        return sql
+
+    body = sql.strip().rstrip(";").rstrip()
+    tail_start = _top_level_tail_start(body)
+    if tail_start is not None:
+        head, tail = body[:tail_start].rstrip(), body[tail_start:].strip()
+        limit = LIMIT_PATTERN.match(tail)
+        if limit:
+            count = limit.group("count")
+            count = min(int(count), max_rows) if count.isdigit() else max_rows
+            offset = f"{limit.group('offset')}, " if limit.group("offset") else ""
+            return f"{head} LIMIT {offset}{count}{limit.group('rest') or ''};"
+        fetch = FETCH_PATTERN.match(tail)
+        if fetch:
+            count = min(int(fetch.group("count")), max_rows)
+            return f"{head} {fetch.group('head')}{count}{fetch.group('tail')};"
+    else:
+        # A bare OFFSET must come after the injected LIMIT, not before it.
+        offset_start = find_top_level_keyword(body, r"offset\b")
+        if offset_start is not None:
+            return f"{body[:offset_start].rstrip()} LIMIT {max_rows} {body[offset_start:].strip()};"
+    return f"{body} LIMIT {max_rows};"
+
+
+def _walk_mysql_rows(node) -> float:
+    """Multiply rows_examined_per_scan across the tables of a MySQL JSON plan."""
+    if isinstance(node, dict):
+        rows = 1.0
+        if "rows_examined_per_scan" in node:
+            rows *= float(node["rows_examined_per_scan"])
+        for value in node.values():
+            rows *= _walk_mysql_rows(value)
+        return rows
+    if isinstance(node, list):
+        rows = 1.0
+        for item in node:
+            rows *= _walk_mysql_rows(item)
+        return rows
+    return 1.0
+
+
+def explain_estimate(sql: str, db_url: str | None = None) -> dict | None:
+    """Return {"cost", "rows"} plan estimates, or None when the dialect has no cost model."""
+    statement = sql.strip().rstrip(";")
+    with connect(db_url) as conn:
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            root = plan[0]["Plan"]
+            return {"cost": float(root["Total Cost"]), "rows": float(root["Plan Rows"])}
+        if dialect == "mysql":
+            plan = json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {statement}")).scalar())
+            query_block = plan["query_block"]
+            return {
+                "cost": float(query_block.get("cost_info", {}).get("query_cost", 0)),
+                "rows": _walk_mysql_rows(query_block),
+            }
+    return None
+
+
+def check_query_cost(sql: str, db_url: str | None = None) -> dict | None:
+    """Raise ValueError when the EXPLAIN estimate exceeds the configured limits."""
+    if not is_explain_enabled():
+        return None
+    estimate = explain_estimate(sql, db_url)
+    if estimate is None:
+        return None
+    max_cost, max_rows = get_explain_limits()
+    if estimate["cost"] > max_cost:
+        raise ValueError(f"Query rejected: estimated cost {estimate['cost']:.0f} exceeds limit {max_cost:.0f}")
+    if estimate["rows"] > max_rows:
+        raise ValueError(f"Query rejected: estimated rows {estimate['rows']:.0f} exceeds limit {max_rows:.0f}")
+    return estimate
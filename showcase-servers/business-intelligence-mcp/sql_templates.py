@@ -0,0 +1,146 @@
+"""
+Template fast path for common questions.
+
+Intent templates (SQL_TEMPLATES_PATH, default sql_templates.json) map regex
+patterns over the normalized question to parameterized SQL. All patterns are
+compiled into a single alternation, so a lookup is one regex fullmatch and
+answers without calling the LLM; anything that does not match falls through
+to the configured provider. Parameters are typed: "int" (clamped to "max")
+or "choice" (the captured word is mapped to a fixed SQL fragment), so
+user text never reaches the SQL verbatim.
+
+    {"templates": [{"name": "customer_count",
+                    "patterns": ["how many customers"],
+                    "sql": "SELECT COUNT(*) FROM customers;"}]}
+"""
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+from translation_cache import normalize_nl_query
+
+DEFAULT_TEMPLATES_PATH = Path(__file__).resolve().parent / "sql_templates.json"
+GROUP_NAME_PATTERN = re.compile(r"\(\?P(?P<kind><|=)(?P<name>\w+)")
+
+
+def is_enabled() -> bool:
+    return os.getenv("SQL_TEMPLATES_ENABLED", "true").strip().lower() == "true"
+
+
+def get_templates_path() -> str:
+    return os.getenv("SQL_TEMPLATES_PATH", "").strip() or str(DEFAULT_TEMPLATES_PATH)
+
+
+def load_templates(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)["templates"]
+
+
+def _render_param(name: str, spec: dict, captured: str | None) -> str:
+    if spec.get("type", "int") == "choice":
+        values = spec["values"]
+        key = captured if captured is not None else spec["default"]
+        if key not in values:
+            raise ValueError(f"Template parameter '{name}' has no mapping for '{key}'")
+        return values[key]
+    value = int(captured) if captured is not None else int(spec["default"])
+    return str(max(1, min(value, int(spec.get("max", value)))))
+
+
+class TemplateEngine:
+    def __init__(self, templates: list[dict]) -> None:
+        self.templates = templates
+        self.routes: dict[str, int] = {}
+        alternatives = []
+        for template_index, template in enumerate(templates):
+            for pattern_index, pattern in enumerate(template["patterns"]):
+                prefix = f"t{template_index}_{pattern_index}"
+                renamed = GROUP_NAME_PATTERN.sub(
+                    lambda match: f"(?P{match.group('kind')}{prefix}__{match.group('name')}", pattern
+                )
+                alternatives.append(f"(?P<{prefix}>{renamed})")
+                self.routes[prefix] = template_index
+        self.matcher = re.compile("|".join(alternatives), flags=re.IGNORECASE) if alternatives else None
+        self.lookups = 0
+        self.hits: dict[str, int] = {template["name"]: 0 for template in templates}
+        self._lock = threading.Lock()
+
+    def match(self, nl_query: str, record_stats: bool = True) -> tuple[str, str] | None:
+        """Return (template name, SQL) for a matching question, or None.
+
+        record_stats=False skips the lookup/hit counters, for a second look at a
+        question the fast path has already counted.
+        """
+        match = self.matcher.fullmatch(normalize_nl_query(nl_query)) if self.matcher else None
+        if match is None:
+            if record_stats:
+                with self._lock:
+                    self.lookups += 1
+            return None
+
+        prefix = match.lastgroup
+        template = self.templates[self.routes[prefix]]
+        captured = {
+            group[len(prefix) + 2 :]: value
+            for group, value in match.groupdict().items()
+            if group.startswith(prefix + "__")
+        }
+        params = {
+            name: _render_param(name, spec, captured.get(name))
+            for name, spec in template.get("params", {}).items()
+        }
+        if record_stats:
+            with self._lock:
+                self.lookups += 1
+                self.hits[template["name"]] += 1
+        return template["name"], template["sql"].format(**params)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total_hits = sum(self.hits.values())
+            return {
+                "enabled": is_enabled(),
+                "templates": len(self.templates),
+                "lookups": self.lookups,
+                "hits": total_hits,
+                "misses": self.lookups - total_hits,
+                "hit_rate": round(total_hits / self.lookups, 4) if self.lookups else 0.0,
+                "hits_by_template": dict(self.hits),
+            }
+
+
+_engine: tuple[str, TemplateEngine] | None = None
+_engine_lock = threading.Lock()
+
+
+def get_template_engine() -> TemplateEngine:
+    """Return the compiled engine for SQL_TEMPLATES_PATH, recompiling when the path changes."""
+    global _engine
+    path = get_templates_path()
+    current = _engine
+    if current is not None and current[0] == path:
+        return current[1]
+    with _engine_lock:
+        if _engine is None or _engine[0] != path:
+            _engine = (path, TemplateEngine(load_templates(path)))
+        return _engine[1]
+
+
+def match_template(nl_query: str) -> tuple[str, str] | None:
+    if not is_enabled():
+        return None
+    return get_template_engine().match(nl_query)
+
+
+def warm_template_engine() -> None:
+    if is_enabled():
+        get_template_engine()
+
+
+def reset_template_engine() -> None:
+    global _engine
+    with _engine_lock:
+        _engine = None
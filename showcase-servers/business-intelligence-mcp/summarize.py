@@ -0,0 +1,116 @@
+"""
+Result summarization for /nl-query summarize mode.
+
+Instead of returning every row, the result is fetched as row tuples,
+transposed into one NumPy array per column, and reduced to per-column
+statistics plus a short sample, so the response size is bounded by the
+number of columns rather than the number of rows:
+
+- every column: count, nulls, distinct, top-k values with counts
+- numeric columns: min, max, mean, std, p05/p25/p50/p75/p95
+- other columns: min/max by string order (ISO dates sort correctly)
+"""
+
+import os
+
+try:
+    import numpy  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without numpy installed
+    numpy = None
+
+QUANTILES = {"p05": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95}
+
+
+def get_summary_settings() -> tuple[int, int, int]:
+    max_rows = int(os.getenv("SUMMARY_MAX_ROWS", "1000000"))
+    sample_rows = int(os.getenv("SUMMARY_SAMPLE_ROWS", "20"))
+    top_k = int(os.getenv("SUMMARY_TOP_K", "5"))
+    return max_rows, sample_rows, top_k
+
+
+def _as_numbers(present):
+    """float64 array of a column's non-null values, or None when the column is not numeric.
+
+    The conversion runs in NumPy; strings and booleans are excluded up front
+    because float() would accept "12" and True.
+    """
+    if len(present) == 0 or isinstance(present[0], (str, bytes, bool)):
+        return None
+    try:
+        return numpy.asarray(present, dtype=numpy.float64)
+    except (TypeError, ValueError):
+        return None
+
+
+def _scalar(value):
+    """NumPy scalar -> plain Python value for JSON encoding."""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _top_values(values, top_k: int) -> list[dict]:
+    if top_k <= 0 or len(values) == 0:
+        return []
+    uniques, counts = numpy.unique(values, return_counts=True)
+    # Stable sort on -count keeps ties in value order so output is deterministic.
+    order = numpy.argsort(-counts, kind="stable")[:top_k]
+    return [{"value": _scalar(uniques[index]), "count": int(counts[index])} for index in order]
+
+
+def summarize_column(name: str, values: tuple, top_k: int) -> dict:
+    # fromiter keeps one element per row even when values are tuples or lists.
+    column = numpy.fromiter(values, dtype=object, count=len(values))
+    present = column[column != None]  # noqa: E711 - elementwise comparison on an object array
+    summary = {
+        "name": name,
+        "count": int(len(present)),
+        "nulls": int(len(column) - len(present)),
+    }
+    numbers = _as_numbers(present)
+    if numbers is not None:
+        uniques = numpy.unique(numbers)
+        quantiles = numpy.quantile(numbers, list(QUANTILES.values()))
+        summary.update(
+            {
+                "type": "numeric",
+                "distinct": int(len(uniques)),
+                "min": float(numbers.min()),
+                "max": float(numbers.max()),
+                "mean": round(float(numbers.mean()), 6),
+                "std": round(float(numbers.std()), 6),
+                **{label: round(float(value), 6) for label, value in zip(QUANTILES, quantiles)},
+                "top_values": _top_values(numbers, top_k),
+            }
+        )
+        return summary
+
+    try:
+        strings = present.astype(str)
+    except ValueError:
+        # astype tries to unpack tuple/list values; format them one by one instead.
+        strings = numpy.array([str(value) for value in present], dtype=str)
+    uniques = numpy.unique(strings)
+    summary.update(
+        {
+            "type": "text",
+            "distinct": int(len(uniques)),
+            "min": str(uniques[0]) if len(uniques) else None,
+            "max": str(uniques[-1]) if len(uniques) else None,
+            "top_values": _top_values(strings, top_k),
+        }
+    )
+    return summary
+
+
+def summarize_rows(columns: list[str], rows: list[tuple], max_rows: int | None = None) -> dict:
+    """Return {"row_count", "truncated", "columns": [per-column stats], "sample": [row dicts]}."""
+    if numpy is None:
+        raise ValueError("summarize mode requires numpy to be installed")
+    default_max_rows, sample_rows, top_k = get_summary_settings()
+    max_rows = default_max_rows if max_rows is None else max_rows
+    column_values = list(zip(*rows)) if rows else [() for _ in columns]
+    return {
+        "row_count": len(rows),
+        "truncated": max_rows > 0 and len(rows) >= max_rows,
+        "columns": [summarize_column(name, values, top_k) for name, values in zip(columns, column_values)],
+        "sample": [dict(zip(columns, row)) for row in rows[:sample_rows]],
+    }
@@ -0,0 +1,42 @@
+import json
+
+import bench_nl_query
+
+
+def test_benchmark_reports_stage_percentiles_as_json(tmp_path):
+    output = tmp_path / "bench.json"
+    bench_nl_query.main(
+        [
+            "--requests", "6",
+            "--concurrency", "1,3",
+            "--result-rows", "5",
+            "--db-rows", "20",
+            "--output", str(output),
+        ]
+    )
+    results = json.loads(output.read_text())
+    assert [(level["concurrency"], level["result_rows"]) for level in results["levels"]] == [(1, 5), (3, 5)]
+    level = results["levels"][1]
+    assert level["errors"] == 0 and level["endpoint_errors"] == 0
+    assert set(level["stages"]) == {"generation", "validation", "execution", "serialization", "endpoint"}
+    execution = level["stages"]["execution"]
+    assert execution["count"] == 6
+    assert execution["p50_ms"] <= execution["p95_ms"] <= execution["p99_ms"] <= execution["max_ms"]
+
+
+def test_benchmark_local_provider_uses_fake_openai_server(tmp_path):
+    output = tmp_path / "bench.json"
+    results = bench_nl_query.main(
+        [
+            "--provider", "local",
+            "--requests", "3",
+            "--concurrency", "2",
+            "--result-rows", "5",
+            "--db-rows", "10",
+            "--no-endpoint",
+            "--output", str(output),
+        ]
+    )
+    [level] = results["levels"]
+    assert level["errors"] == 0
+    assert level["stages"]["generation"]["count"] == 3
@@ -0,0 +1,340 @@
+import asyncio
+import json
+import threading
+import time
+
+import db
+import fewshot_store
+import mcp_tools
+import result_cache
+import single_flight
+import translation_cache
+from cache import TTLCache
+from mcp_tools import NLQueryRequest
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.values)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1, ttl_seconds=0)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_make_cache_key_normalizes_query_text():
+    key = translation_cache.make_cache_key("Top customers?", None, "ClaudeProvider", "m", "sqlite:///a.db")
+    assert key == translation_cache.make_cache_key("  top   CUSTOMERS ", "", "ClaudeProvider", "m", "sqlite:///a.db")
+    assert key != translation_cache.make_cache_key("top customers", "customers(id)", "ClaudeProvider", "m", "sqlite:///a.db")
+    assert key != translation_cache.make_cache_key("top customers", None, "LocalProvider", "m", "sqlite:///a.db")
+    assert key != translation_cache.make_cache_key("top customers", None, "ClaudeProvider", "m", "sqlite:///b.db")
+
+
+def test_translation_cache_skips_llm_on_repeat(sqlite_db, fake_llm):
+    mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    mcp_tools.handle_nl_query(NLQueryRequest(query="List customers?"))
+    assert fake_llm.calls == 1
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="list customers", schema_hint="customers(id)"))
+    assert fake_llm.calls == 2
+    stats = translation_cache.get_translation_cache().stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_translation_cache_is_scoped_to_the_data_source(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("DATA_SOURCES", json.dumps({"archive": {"primary": sqlite_db + "?archive=1"}}))
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="list customers"))
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="list customers", database="archive"))
+    assert fake_llm.calls == 2
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="list customers", database="archive"))
+    assert fake_llm.calls == 2
+
+
+def test_translation_cache_does_not_store_unsafe_sql(sqlite_db, fake_llm):
+    fake_llm.sql = "DROP TABLE customers;"
+    for _ in range(2):
+        try:
+            mcp_tools.generate_validated_sql(NLQueryRequest(query="drop"))
+        except ValueError:
+            pass
+    assert fake_llm.calls == 2
+
+
+def test_translation_cache_disabled(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("NL_CACHE_ENABLED", "false")
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="list customers"))
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="list customers"))
+    assert fake_llm.calls == 2
+
+
+def test_translation_cache_reads_through_redis(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(translation_cache, "_create_redis_client", lambda: fake_redis)
+    cache = translation_cache.TranslationCache()
+    cache.set("k", "SELECT 1;")
+    assert fake_redis.values[translation_cache.REDIS_KEY_PREFIX + "k"] == "SELECT 1;"
+
+    other_worker = translation_cache.TranslationCache()
+    assert other_worker.get("k") == "SELECT 1;"
+    assert other_worker.stats()["redis_hits"] == 1
+
+
+def test_cache_stats_endpoint(sqlite_db, fake_llm, api_client):
+    api_client.post("/nl-query", json={"query": "list customers"})
+    api_client.post("/nl-query", json={"query": "list customers"})
+    response = api_client.get("/cache/stats")
+    assert response.status_code == 200
+    assert response.json()["translation"]["hits"] == 1
+
+
+def test_extract_tables_handles_joins_and_schemas():
+    sql = 'SELECT * FROM sales.orders o, regions r JOIN "Customers" c ON o.cid = c.id WHERE 1 = 1'
+    assert result_cache.extract_tables(sql) == {"sales.orders", "orders", "customers", "regions"}
+
+
+def test_result_cache_respects_memory_budget(monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_MAX_BYTES", "60")
+    cache = result_cache.ResultCache()
+    rows = [{"name": "Acme"}]  # ~18 bytes serialized
+    for key in ("a", "b", "c", "d"):
+        cache.set(key, "SELECT name FROM customers", rows)
+    stats = cache.stats()
+    assert stats["bytes"] <= 60
+    assert cache.get("a") is None
+    assert cache.get("d") is not None
+
+
+def test_result_cache_serves_repeat_queries(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "true")
+    first = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    with db.connect() as conn:
+        conn.exec_driver_sql("DELETE FROM customers")
+        conn.commit()
+    second = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+
+    assert first["cache"] == {"hit": False, "age_seconds": 0.0}
+    assert second["cache"]["hit"] is True
+    assert second["cache"]["age_seconds"] >= 0
+    assert second["rows"] == first["rows"]
+
+
+def test_result_cache_invalidate_by_table(sqlite_db, fake_llm, api_client, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "true")
+    api_client.post("/nl-query", json={"query": "list customers"})
+
+    response = api_client.post("/cache/invalidate", json={"tables": ["orders"]})
+    assert response.json()["invalidated"] == 0
+    response = api_client.post("/cache/invalidate", json={"tables": ["Customers"]})
+    assert response.json()["invalidated"] == 1
+
+    result = api_client.post("/nl-query", json={"query": "list customers"}).json()
+    assert result["cache"]["hit"] is False
+
+
+def test_negative_cache_ttl_is_rejected(sqlite_db, fake_llm, api_client, monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "true")
+    response = api_client.post("/nl-query", json={"query": "list customers", "cache_ttl_seconds": -5})
+    assert response.status_code == 422
+    assert fake_llm.calls == 0
+    assert result_cache.get_result_cache().stats()["entries"] == 0
+
+
+def test_result_cache_is_opt_in(sqlite_db, fake_llm):
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    assert "cache" not in result
+
+
+def test_single_flight_coalesces_concurrent_async_queries(sqlite_db, fake_llm):
+    async def run_dashboard():
+        payload = NLQueryRequest(query="list customers")
+        results = await asyncio.gather(*(mcp_tools.ahandle_nl_query(payload) for _ in range(5)))
+        await db.adispose_engines()
+        return results
+
+    results = asyncio.run(run_dashboard())
+    assert fake_llm.calls == 1
+    assert all(result["rows"] == results[0]["rows"] for result in results)
+    stats = single_flight.get_single_flight().stats()
+    assert (stats["leaders"], stats["coalesced"], stats["in_flight"]) == (1, 4, 0)
+
+
+def test_single_flight_coalesces_threads_and_shares_errors(sqlite_db, fake_llm, monkeypatch):
+    original_generate = fake_llm.generate_sql
+
+    def slow_generate(nl_query, schema_hint=None, examples=None):
+        time.sleep(0.1)
+        return original_generate(nl_query, schema_hint, examples)
+
+    monkeypatch.setattr(fake_llm, "generate_sql", slow_generate)
+    fake_llm.sql = "DELETE FROM customers;"
+    errors = []
+
+    def worker():
+        try:
+            mcp_tools.handle_nl_query(NLQueryRequest(query="drop it"))
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake_llm.calls == 1
+    assert len(errors) == 4
+
+
+def test_single_flight_follower_reads_result_published_by_other_worker(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(single_flight, "_create_redis_client", lambda: fake_redis)
+    flight = single_flight.SingleFlight()
+    fake_redis.values[single_flight.REDIS_LOCK_PREFIX + "k"] = "1"
+    fake_redis.values[single_flight.REDIS_RESULT_PREFIX + "k"] = json.dumps({"rows": [1]})
+
+    assert flight.do("k", lambda: {"rows": ["recomputed"]}) == {"rows": [1]}
+    assert flight.stats()["redis_hits"] == 1
+
+
+def test_single_flight_leader_publishes_and_releases_lock(monkeypatch):
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(single_flight, "_create_redis_client", lambda: fake_redis)
+    flight = single_flight.SingleFlight()
+
+    async def compute():
+        return {"rows": [2]}
+
+    assert asyncio.run(flight.ado("k", compute)) == {"rows": [2]}
+    assert single_flight.REDIS_LOCK_PREFIX + "k" not in fake_redis.values
+    assert json.loads(fake_redis.values[single_flight.REDIS_RESULT_PREFIX + "k"]) == {"rows": [2]}
+
+
+def test_fewshot_store_ranks_pairs_by_similarity(tmp_path):
+    store = fewshot_store.FewShotStore(str(tmp_path / "fewshot.sqlite3"))
+    store.add("db", "show customer revenue", "SELECT name, revenue FROM customers;")
+    store.add("db", "count open orders", "SELECT COUNT(*) FROM orders WHERE status = 'open';")
+    store.add("other", "show customer revenue", "SELECT 1;")
+
+    [best] = store.lookup("db", "show customer names", limit=1)
+    assert best["sql"] == "SELECT name, revenue FROM customers;"
+    assert 0.3 < best["similarity"] < 0.9
+    assert store.match("db", "Show customers revenue")[0] == "SELECT name, revenue FROM customers;"
+    assert store.stats()["reused"] == 1
+    store.close()
+
+
+def test_fewshot_store_is_opt_in(sqlite_db, fake_llm, monkeypatch, tmp_path):
+    monkeypatch.delenv("FEWSHOT_ENABLED")
+    monkeypatch.chdir(tmp_path)
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer revenue"))
+    assert fewshot_store.is_enabled() is False
+    assert not (tmp_path / fewshot_store.get_store_path()).exists()
+
+
+def test_fewshot_reuses_near_duplicates_and_feeds_exemplars(sqlite_db, fake_llm, monkeypatch, tmp_path):
+    monkeypatch.setenv("FEWSHOT_ENABLED", "true")
+    monkeypatch.setenv("FEWSHOT_DB_PATH", str(tmp_path / "fewshot.sqlite3"))
+    monkeypatch.setenv("NL_CACHE_ENABLED", "false")
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer revenue"))
+    assert fake_llm.calls == 1
+    assert fake_llm.examples[-1] == []
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="Show customers' revenue"))
+    assert fake_llm.calls == 1
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer names"))
+    assert fake_llm.calls == 2
+    assert [example["query"] for example in fake_llm.examples[-1]] == ["Show customers' revenue"]
+
+
+def test_fewshot_stores_uncapped_sql_so_exports_get_all_rows(sqlite_db, fake_llm, monkeypatch, tmp_path):
+    monkeypatch.setenv("FEWSHOT_ENABLED", "true")
+    monkeypatch.setenv("FEWSHOT_DB_PATH", str(tmp_path / "fewshot.sqlite3"))
+    monkeypatch.setenv("NL_CACHE_ENABLED", "false")
+    monkeypatch.setenv("SQL_MAX_ROWS", "2")
+
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    assert len(result["rows"]) == 2
+
+    export = mcp_tools.handle_nl_query_export(NLQueryRequest(query="list customers", export="csv"))
+    assert fake_llm.calls == 1
+    assert export["row_count"] == 3
+    assert export["truncated"] is False
+
+
+def test_fewshot_reuse_respects_word_order_operators_and_schema_hint(sqlite_db, fake_llm, monkeypatch, tmp_path):
+    monkeypatch.setenv("FEWSHOT_ENABLED", "true")
+    monkeypatch.setenv("FEWSHOT_DB_PATH", str(tmp_path / "fewshot.sqlite3"))
+    monkeypatch.setenv("NL_CACHE_ENABLED", "false")
+    assert fewshot_store.is_reusable("Orders where a > b", "orders where a > b")
+    assert not fewshot_store.is_reusable("orders where a > b", "orders where b > a")
+    assert not fewshot_store.is_reusable("orders where a > b", "orders where a < b")
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer revenue"))
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer revenue", schema_hint="customers(id, name)"))
+    assert fake_llm.calls == 2
+    mcp_tools.handle_nl_query(NLQueryRequest(query="show customer revenue", schema_hint="customers(id, name)"))
+    assert fake_llm.calls == 2
+
+
+def test_fewshot_never_reuses_sql_across_different_literals(tmp_path):
+    store = fewshot_store.FewShotStore(str(tmp_path / "fewshot.sqlite3"))
+    question = (
+        "show total net revenue and average order value by month for all active enterprise customers "
+        "with open support tickets and unpaid invoices in"
+    )
+    pairs = [
+        (
+            f"{question} germany",
+            f"{question} france",
+        ),
+        (
+            f"{question} 2023",
+            f"{question} 2024",
+        ),
+        ("orders with status 'Open' by region", "orders with status 'open' by region"),
+    ]
+    for index, (stored, asked) in enumerate(pairs):
+        scope = f"db{index}"
+        store.add(scope, stored, "SELECT 1;")
+        [best] = store.lookup(scope, asked, limit=1)
+        assert best["query"] == stored
+        if index < 2:
+            assert best["similarity"] >= fewshot_store.get_fewshot_settings()[0]
+        reused, exemplars = store.match(scope, asked)
+        assert reused is None
+        assert exemplars[0]["query"] == stored
+    assert store.stats()["reused"] == 0
+    store.close()
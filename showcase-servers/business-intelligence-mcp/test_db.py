@@ -0,0 +1,164 @@
+import asyncio
+import json
+import pathlib
+import sys
+
+from fastapi.testclient import TestClient
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import db
+import main
+
+app = main.app
+
+
+def test_get_engine_is_cached_per_dsn(sqlite_db, tmp_path):
+    assert db.get_engine() is db.get_engine(sqlite_db)
+    other = f"sqlite:///{tmp_path / 'other.db'}"
+    assert db.get_engine(other) is not db.get_engine(sqlite_db)
+
+
+def test_pool_settings_from_env(sqlite_db, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    db.dispose_engines()
+    engine = db.get_engine()
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 1
+
+
+def test_run_query_reuses_pool_and_records_stats(sqlite_db):
+    rows = db.run_query("SELECT name FROM customers ORDER BY revenue DESC")
+    db.run_query("SELECT 1")
+    assert rows[0]["name"] == "Acme"
+
+    [stats] = db.get_pool_stats()
+    assert stats["acquisitions"] == 3
+    assert stats["checked_out"] == 0
+    assert stats["wait_ms_max"] >= stats["wait_ms_avg"] >= 0
+
+
+def test_pool_stats_endpoint_requires_api_key(sqlite_db, monkeypatch):
+    monkeypatch.setenv("API_KEY", "secret")
+    monkeypatch.delenv("API_KEYS", raising=False)
+    monkeypatch.delenv("REVOKED_API_KEYS", raising=False)
+    monkeypatch.setenv("RATE_LIMIT_REQUESTS", "10")
+    app.state.rate_limit_store.clear()
+    client = TestClient(app)
+
+    assert client.get("/db/pool-stats").status_code == 401
+    response = client.get("/db/pool-stats", headers={"X-API-Key": "secret"})
+    assert response.status_code == 200
+    assert response.json()["pools"][0]["pool_class"] == "QueuePool"
+
+
+
+def test_stream_query_yields_batches(sqlite_db):
+    batches = list(db.stream_query("SELECT * FROM customers ORDER BY customer_id", batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][0]["name"] == "Acme"
+
+
+def test_stream_query_enforces_row_cap(sqlite_db, monkeypatch):
+    monkeypatch.setenv("STREAM_MAX_ROWS", "2")
+    batches = list(db.stream_query("SELECT * FROM customers", batch_size=1))
+    assert sum(len(batch) for batch in batches) == 2
+    assert db.get_pool_stats()[0]["checked_out"] == 0
+
+
+def test_get_async_db_url_maps_drivers():
+    assert db.get_async_db_url("postgresql+psycopg2://u:p@h/d") == "postgresql+asyncpg://u:p@h/d"
+    assert db.get_async_db_url("mysql+pymysql://u:p@h/d") == "mysql+aiomysql://u:p@h/d"
+    assert db.get_async_db_url("sqlite:///./bi.db") == "sqlite+aiosqlite:///./bi.db"
+
+
+def test_arun_query_uses_async_engine(sqlite_db):
+    async def scenario():
+        rows = await db.arun_query("SELECT name FROM customers WHERE revenue > :floor", {"floor": 50})
+        stats = db.get_pool_stats()
+        await db.adispose_engines()
+        return rows, stats
+
+    rows, stats = asyncio.run(scenario())
+    assert [row["name"] for row in rows] == ["Acme", "Globex"]
+    assert any(entry["mode"] == "async" and entry["acquisitions"] == 1 for entry in stats)
+
+
+def test_arun_query_falls_back_to_sync_pool_without_async_driver(sqlite_db, monkeypatch):
+    monkeypatch.setattr(db, "ASYNC_DRIVERS", {})
+    rows = asyncio.run(db.arun_query("SELECT COUNT(*) AS n FROM customers"))
+    assert rows == [{"n": 3}]
+    assert sqlite_db in db._ASYNC_UNAVAILABLE
+    asyncio.run(db.adispose_engines())
+
+
+def test_engines_are_evicted_lru_beyond_max(sqlite_db, tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_MAX_ENGINES", "2")
+    other = f"sqlite:///{tmp_path / 'other.db'}"
+    third = f"sqlite:///{tmp_path / 'third.db'}"
+    db.run_query("SELECT 1")
+    db.run_query("SELECT 1", db_url=other)
+    db.run_query("SELECT 1")
+    db.run_query("SELECT 1", db_url=third)
+    assert list(db._ENGINES) == [sqlite_db, third]
+
+
+def test_registry_round_robins_healthy_replicas(sqlite_db, tmp_path, monkeypatch):
+    import datasources
+
+    replicas = [f"sqlite:///{tmp_path / 'replica_a.db'}", f"sqlite:///{tmp_path / 'replica_b.db'}"]
+    monkeypatch.setenv("DB_REPLICA_URLS", ",".join(replicas))
+    assert [datasources.route_read_url() for _ in range(4)] == replicas * 2
+    assert datasources.get_primary_url() == sqlite_db
+
+
+def test_health_check_ejects_broken_replica(sqlite_db, tmp_path, monkeypatch):
+    import datasources
+
+    broken = f"sqlite:///file:{tmp_path / 'missing' / 'replica.db'}?mode=ro&uri=true"
+    monkeypatch.setenv("DB_REPLICA_URLS", broken)
+    registry = datasources.get_registry()
+    registry.check_health()
+    [source] = registry.stats()
+    assert source["replicas"][0]["healthy"] is False
+    assert source["replicas"][0]["last_error"]
+    assert datasources.route_read_url() == sqlite_db
+
+
+def test_nl_query_routes_named_database(api_client, fake_llm, sqlite_db, tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_SOURCES", json.dumps({"archive": {"primary": sqlite_db}}))
+    response = api_client.post(
+        "/nl-query", json={"query": "top customers", "database": "archive"}, headers={"X-API-Key": "secret"}
+    )
+    assert response.status_code == 200
+    assert len(response.json()["rows"]) == 3
+
+    response = api_client.post(
+        "/nl-query", json={"query": "top customers", "database": "missing"}, headers={"X-API-Key": "secret"}
+    )
+    assert response.status_code == 400
+    assert "Unknown database" in response.json()["detail"]
+
+
+def test_paged_nl_query_checks_cost_on_the_replica_it_reads(sqlite_db, fake_llm, tmp_path, monkeypatch):
+    import shutil
+
+    import mcp_tools
+    from mcp_tools import NLQueryRequest
+
+    replica = tmp_path / "replica.db"
+    shutil.copy(tmp_path / "bi.db", replica)
+    replica_url = f"sqlite:///{replica}"
+    monkeypatch.setenv("DB_REPLICA_URLS", replica_url)
+    checked = []
+
+    async def record_cost(sql, db_url=None):
+        checked.append(db_url)
+
+    monkeypatch.setattr(mcp_tools, "acheck_query_cost", record_cost)
+    page = asyncio.run(mcp_tools.ahandle_nl_query_paged(NLQueryRequest(query="list customers", page_size=2)))
+    assert len(page["rows"]) == 2
+    assert checked == [replica_url]
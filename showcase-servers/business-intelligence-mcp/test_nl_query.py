@@ -0,0 +1,511 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import db
+import llm_provider
+import mcp_tools
+from mcp_tools import NLQueryRequest
+
+
+def test_handle_nl_query_returns_rows(sqlite_db, fake_llm):
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    assert result["sql"].startswith("SELECT")
+    assert [row["name"] for row in result["rows"]] == ["Acme", "Globex", "Initech"]
+
+
+def test_nl_query_streams_ndjson(sqlite_db, fake_llm, api_client):
+    response = api_client.post(
+        "/nl-query",
+        json={"query": "list customers"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["sql"] == fake_llm.sql.rstrip(";") + " LIMIT 10000;"
+    assert [line["name"] for line in lines[1:-1]] == ["Acme", "Globex", "Initech"]
+    assert lines[-1] == {"row_count": 3, "truncated": False}
+
+
+def test_nl_query_stream_flag_respects_row_cap(sqlite_db, fake_llm, api_client, monkeypatch):
+    monkeypatch.setenv("STREAM_MAX_ROWS", "2")
+    response = api_client.post("/nl-query", json={"query": "list customers", "stream": True})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"row_count": 2, "truncated": True}
+
+
+def test_stream_row_cap_defaults_to_sql_max_rows(monkeypatch):
+    monkeypatch.delenv("STREAM_MAX_ROWS", raising=False)
+    monkeypatch.setenv("SQL_MAX_ROWS", "250")
+    assert db.get_stream_max_rows() == 250
+    monkeypatch.setenv("STREAM_MAX_ROWS", "5000")
+    assert db.get_stream_max_rows() == 5000
+
+
+def test_nl_query_stream_reports_errors_before_streaming(sqlite_db, fake_llm, api_client):
+    fake_llm.sql = "DELETE FROM customers;"
+    response = api_client.post("/nl-query", json={"query": "drop it", "stream": True})
+    assert response.status_code == 400
+
+
+def test_nl_query_with_shipped_defaults(sqlite_db, fake_llm, api_client, monkeypatch, tmp_path):
+    import schema_cache
+    import sql_templates
+
+    # Undo the conftest overrides; the few-shot store is opt-in, so enable it on a temp file.
+    monkeypatch.delenv("SCHEMA_INTROSPECTION_ENABLED")
+    monkeypatch.delenv("SQL_TEMPLATES_ENABLED")
+    monkeypatch.setenv("FEWSHOT_ENABLED", "true")
+    monkeypatch.setenv("FEWSHOT_DB_PATH", str(tmp_path / "fewshot.sqlite3"))
+    sql_templates.reset_template_engine()
+    schema_cache.get_schema_cache().refresh(sqlite_db)
+
+    response = api_client.post("/nl-query", json={"query": "How many customers are there?"})
+    assert response.json()["rows"] == [{"customer_count": 3}]
+    assert fake_llm.calls == 0
+
+    response = api_client.post("/nl-query", json={"query": "show customer revenue"})
+    assert [row["name"] for row in response.json()["rows"]] == ["Acme", "Globex", "Initech"]
+    assert fake_llm.calls == 1
+    assert "customers" in fake_llm.schema_hints[-1]
+
+    response = api_client.post("/nl-query", json={"query": "Show customers' revenue"})
+    assert len(response.json()["rows"]) == 3
+    assert fake_llm.calls == 1
+    assert sql_templates.get_template_engine().stats()["hits"] == 1
+    sql_templates.reset_template_engine()
+
+
+def test_nl_query_page_tool_follows_cursors(sqlite_db, fake_llm):
+    import mcp_transport
+
+    first = asyncio.run(mcp_transport.nl_query_page(query="list customers", page_size=2))
+    second = asyncio.run(mcp_transport.nl_query_page(cursor=first["next_cursor"]))
+    assert [row["name"] for row in first["rows"]] == ["Acme", "Globex"]
+    assert first["has_more"] is True
+    assert [row["name"] for row in second["rows"]] == ["Initech"]
+    assert second["has_more"] is False
+    assert fake_llm.calls == 1
+
+
+def test_llm_provider_is_reused_until_env_changes(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "rule")
+    llm_provider.close_llm_provider()
+    first = llm_provider.get_llm_provider()
+    assert llm_provider.get_llm_provider() is first
+
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    second = llm_provider.get_llm_provider()
+    assert isinstance(second, llm_provider.LocalProvider)
+    assert llm_provider.get_llm_provider() is second
+    llm_provider.close_llm_provider()
+
+
+def test_replaced_llm_providers_are_closed_at_shutdown(monkeypatch):
+    closed = []
+    monkeypatch.setattr(llm_provider.LocalProvider, "aclose", lambda self: _record_close(closed, self))
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    llm_provider.close_llm_provider()
+    first = llm_provider.get_llm_provider()
+    monkeypatch.setenv("LOCAL_LLM_MODEL", "other-model")
+    second = llm_provider.get_llm_provider()
+    assert second is not first and closed == []
+
+    asyncio.run(llm_provider.aclose_llm_provider())
+    assert closed == [first, second]
+    asyncio.run(llm_provider.aclose_llm_provider())
+    assert closed == [first, second]
+
+
+async def _record_close(closed, provider):
+    closed.append(provider)
+
+
+def test_local_provider_uses_pooled_session_and_records_timing(monkeypatch):
+    monkeypatch.setenv("LLM_STREAMING_ENABLED", "false")
+    provider = llm_provider.LocalProvider()
+    calls = []
+
+    class FakeResponse:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"choices": [{"message": {"content": " SELECT 1; "}}]}
+
+    def fake_post(url, **kwargs):
+        calls.append(url)
+        return FakeResponse()
+
+    monkeypatch.setattr(provider.session, "post", fake_post)
+    assert provider.generate_sql_timed("anything") == "SELECT 1;"
+    assert provider.generate_sql_timed("anything") == "SELECT 1;"
+    assert len(calls) == 2
+    assert llm_provider.get_llm_call_stats()["LocalProvider"]["calls"] >= 2
+
+
+def test_llm_stats_endpoint(sqlite_db, fake_llm, api_client):
+    api_client.post("/nl-query", json={"query": "list customers"})
+    response = api_client.get("/llm/stats")
+    assert response.status_code == 200
+    assert response.json()["providers"]["FakeLLMProvider"]["calls"] >= 1
+
+
+def test_local_provider_async_generation_uses_async_client(monkeypatch):
+    monkeypatch.setenv("LLM_STREAMING_ENABLED", "false")
+    provider = llm_provider.LocalProvider()
+
+    def handler(request):
+        assert json.loads(request.content)["model"] == provider.model
+        return httpx.Response(200, json={"choices": [{"message": {"content": "SELECT 2;"}}]})
+
+    async def scenario():
+        provider.async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await provider.agenerate_sql_timed("anything")
+        finally:
+            await provider.aclose()
+
+    assert asyncio.run(scenario()) == "SELECT 2;"
+
+
+def _sse_body(*deltas: str) -> bytes:
+    events = [json.dumps({"choices": [{"delta": {"content": delta}}]}) for delta in deltas]
+    return "".join(f"data: {event}\n\n" for event in [*events, "[DONE]"]).encode()
+
+
+def test_local_provider_streams_and_stops_at_statement_end(monkeypatch):
+    provider = llm_provider.LocalProvider()
+    lines = _sse_body("SELECT name ", "FROM customers ", "WHERE name = 'a;b';", " This query lists", " names.").splitlines()
+    consumed = []
+
+    class FakeStreamResponse:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            pass
+
+        def iter_lines(self):
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+    def fake_post(url, **kwargs):
+        assert kwargs["stream"] is True and kwargs["json"]["stream"] is True
+        return FakeStreamResponse()
+
+    monkeypatch.setattr(provider.session, "post", fake_post)
+    assert provider.generate_sql_timed("anything") == "SELECT name FROM customers WHERE name = 'a;b';"
+    assert len(consumed) < len(lines)
+    stats = llm_provider.get_llm_call_stats()["LocalProvider"]
+    assert stats["early_stops"] >= 1 and stats["last_ttft_ms"] >= 0
+
+
+def test_local_provider_async_stream_stops_at_closing_fence():
+    provider = llm_provider.LocalProvider()
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = _sse_body("```sql\nSELECT 2", "\n```", "\nHope this helps!")
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    async def scenario():
+        provider.async_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await provider.agenerate_sql_timed("anything")
+        finally:
+            await provider.aclose()
+
+    sql = asyncio.run(scenario())
+    assert sql == "```sql\nSELECT 2\n```"
+    assert mcp_tools.normalize_sql(sql) == "SELECT 2"
+
+
+def test_ahandle_nl_query_runs_async_path(sqlite_db, fake_llm):
+    async def scenario():
+        result = await mcp_tools.ahandle_nl_query(NLQueryRequest(query="list customers"))
+        await db.adispose_engines()
+        return result
+
+    result = asyncio.run(scenario())
+    assert [row["name"] for row in result["rows"]] == ["Acme", "Globex", "Initech"]
+    assert fake_llm.calls == 1
+
+
+class RoutingLLMProvider(llm_provider.LLMProvider):
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    def generate_sql(self, nl_query, schema_hint=None, examples=None):
+        raise AssertionError("batch should use the async path")
+
+    async def agenerate_sql(self, nl_query, schema_hint=None, examples=None):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if "broken" in nl_query:
+            return "DELETE FROM customers;"
+        return f"SELECT name FROM customers WHERE customer_id = {nl_query.split()[-1]};"
+
+
+def test_nl_query_batch_isolates_failures_and_bounds_concurrency(sqlite_db, api_client, monkeypatch):
+    provider = RoutingLLMProvider()
+    monkeypatch.setattr(mcp_tools, "get_llm_provider", lambda: provider)
+    monkeypatch.setenv("BATCH_CONCURRENCY", "2")
+    queries = [{"query": f"customer {i}"} for i in (1, 2, 3)] + [{"query": "broken one"}]
+
+    response = api_client.post("/nl-query/batch", json={"queries": queries, "concurrency": 10})
+    body = response.json()
+    assert response.status_code == 200
+    assert [item["ok"] for item in body["results"]] == [True, True, True, False]
+    assert body["results"][2]["result"]["rows"] == [{"name": "Initech"}]
+    assert "read-only" in body["results"][3]["error"]
+    assert body["succeeded"] == 3 and body["failed"] == 1
+    assert body["concurrency"] == 2
+    assert provider.max_active == 2
+
+
+def test_nl_query_batch_rejects_oversized_batches(api_client, monkeypatch):
+    monkeypatch.setenv("BATCH_MAX_ITEMS", "1")
+    response = api_client.post("/nl-query/batch", json={"queries": [{"query": "a"}, {"query": "b"}]})
+    assert response.status_code == 400
+
+
+def test_nl_query_columnar_format(sqlite_db, fake_llm, api_client):
+    response = api_client.post("/nl-query", json={"query": "list customers", "format": "columnar"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["columns"] == ["customer_id", "name", "revenue"]
+    assert body["data"] == [[1, "Acme", 120.0], [2, "Globex", 80.0], [3, "Initech", 45.5]]
+
+
+def test_nl_query_csv_via_accept_header(sqlite_db, fake_llm, api_client):
+    response = api_client.post("/nl-query", json={"query": "list customers"}, headers={"Accept": "text/csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == ["customer_id,name,revenue", "1,Acme,120.0", "2,Globex,80.0", "3,Initech,45.5"]
+
+
+def test_nl_query_arrow_round_trip(sqlite_db, fake_llm, api_client):
+    import pyarrow.ipc
+
+    response = api_client.post("/nl-query", json={"query": "list customers", "format": "arrow"})
+    assert response.status_code == 200
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["customer_id", "name", "revenue"]
+    assert table.column("name").to_pylist() == ["Acme", "Globex", "Initech"]
+
+
+def test_nl_query_rejects_unknown_format(sqlite_db, fake_llm, api_client):
+    response = api_client.post("/nl-query", json={"query": "list customers", "format": "xml"})
+    assert response.status_code == 400
+
+
+def test_nl_query_cursor_pages_with_offset_and_skips_llm(sqlite_db, fake_llm, api_client):
+    first = api_client.post("/nl-query", json={"query": "list customers", "page_size": 2}).json()
+    assert first["pagination"] == "offset"
+    assert [row["name"] for row in first["rows"]] == ["Acme", "Globex"]
+
+    second = api_client.post("/nl-query", json={"cursor": first["next_cursor"]}).json()
+    assert [row["name"] for row in second["rows"]] == ["Initech"]
+    assert second["next_cursor"] is None
+    assert fake_llm.calls == 1
+
+
+def test_nl_query_cursor_uses_keyset_when_order_covers_primary_key(sqlite_db, fake_llm, monkeypatch):
+    import schema_cache
+
+    monkeypatch.setenv("SCHEMA_INTROSPECTION_ENABLED", "true")
+    schema_cache.get_schema_cache().refresh()
+    statements = []
+    original_arun_query = mcp_tools.arun_query
+
+    async def recording_arun_query(sql, params=None, db_url=None):
+        statements.append((sql, params))
+        return await original_arun_query(sql, params, db_url=db_url)
+
+    monkeypatch.setattr(mcp_tools, "arun_query", recording_arun_query)
+
+    async def walk_pages():
+        first = await mcp_tools.ahandle_nl_query_paged(NLQueryRequest(query="list customers", page_size=1))
+        modes = [first["pagination"]]
+        names = [row["name"] for row in first["rows"]]
+        cursor = first["next_cursor"]
+        while cursor:
+            page = await mcp_tools.ahandle_nl_query_paged(NLQueryRequest(cursor=cursor))
+            names.extend(row["name"] for row in page["rows"])
+            cursor = page["next_cursor"]
+        await db.adispose_engines()
+        return modes, names
+
+    modes, names = asyncio.run(walk_pages())
+    assert modes == ["keyset"]
+    assert names == ["Acme", "Globex", "Initech"]
+    assert "customer_id > :k0" in statements[1][0]
+    assert statements[1][1] == {"k0": 1}
+
+
+def test_nl_query_cursor_keeps_rows_with_null_sort_keys(sqlite_db, fake_llm, monkeypatch):
+    import schema_cache
+
+    with db.connect() as conn:
+        conn.exec_driver_sql("CREATE TABLE regions (code TEXT, name TEXT, PRIMARY KEY (code, name))")
+        conn.exec_driver_sql("INSERT INTO regions VALUES ('eu', 'Europe'), (NULL, 'Unknown'), ('us', 'Americas')")
+        conn.commit()
+    monkeypatch.setenv("SCHEMA_INTROSPECTION_ENABLED", "true")
+    snapshot = schema_cache.get_schema_cache().refresh()
+    fake_llm.sql = "SELECT code, name FROM regions ORDER BY code, name;"
+    assert [table["columns"][0]["nullable"] for table in snapshot["tables"]] == [False, True]
+
+    async def walk_pages():
+        first = await mcp_tools.ahandle_nl_query_paged(NLQueryRequest(query="list regions", page_size=1))
+        modes = [first["pagination"]]
+        names = [row["name"] for row in first["rows"]]
+        cursor = first["next_cursor"]
+        while cursor:
+            page = await mcp_tools.ahandle_nl_query_paged(NLQueryRequest(cursor=cursor))
+            names.extend(row["name"] for row in page["rows"])
+            cursor = page["next_cursor"]
+        await db.adispose_engines()
+        return modes, names
+
+    modes, names = asyncio.run(walk_pages())
+    assert modes == ["offset"]
+    assert names == ["Unknown", "Europe", "Americas"]
+
+
+def test_nl_query_rejects_unknown_cursor(api_client):
+    response = api_client.post("/nl-query", json={"cursor": "missing"})
+    assert response.status_code == 400
+
+
+def test_nl_query_summarize_returns_column_stats_and_sample(sqlite_db, fake_llm, api_client, monkeypatch):
+    monkeypatch.setenv("SUMMARY_SAMPLE_ROWS", "1")
+    monkeypatch.setenv("SUMMARY_TOP_K", "2")
+    response = api_client.post("/nl-query", json={"query": "list customers", "summarize": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert "rows" not in body
+    assert body["row_count"] == 3 and body["truncated"] is False
+    assert body["sample"] == [{"customer_id": 1, "name": "Acme", "revenue": 120.0}]
+    revenue = body["columns"][2]
+    assert revenue["type"] == "numeric"
+    assert (revenue["min"], revenue["max"], revenue["p50"]) == (45.5, 120.0, 80.0)
+    assert revenue["mean"] == round((120.0 + 80.0 + 45.5) / 3, 6)
+    name = body["columns"][1]
+    assert name["type"] == "text"
+    assert (name["count"], name["nulls"], name["distinct"]) == (3, 0, 3)
+    assert len(name["top_values"]) == 2
+
+
+def test_summarize_rows_counts_nulls_and_top_values():
+    from summarize import summarize_rows
+
+    summary = summarize_rows(["region"], [("east",), (None,), ("west",), ("east",)])
+    [region] = summary["columns"]
+    assert (region["count"], region["nulls"]) == (3, 1)
+    assert region["top_values"][0] == {"value": "east", "count": 2}
+
+
+def test_summarize_rows_detects_numeric_columns_and_keeps_sequence_values_categorical():
+    from decimal import Decimal
+
+    from summarize import summarize_rows
+
+    rows = [(Decimal("1.5"), (1, 2), "10", True), (2, (3, 4), "20", False), (None, None, None, None)]
+    amount, pair, code, flag = summarize_rows(["amount", "pair", "code", "flag"], rows)["columns"]
+    assert (amount["type"], amount["min"], amount["max"], amount["nulls"]) == ("numeric", 1.5, 2.0, 1)
+    assert (pair["type"], pair["count"], pair["distinct"]) == ("text", 2, 2)
+    assert code["type"] == "text" and flag["type"] == "text"
+
+
+def test_nl_query_export_parquet_download_with_range(sqlite_db, fake_llm, api_client, monkeypatch):
+    import io
+
+    import pyarrow.parquet
+
+    monkeypatch.setenv("STREAM_BATCH_SIZE", "2")
+    response = api_client.post("/nl-query", json={"query": "list customers", "export": "parquet"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["row_count"] == 3 and body["columns"] == ["customer_id", "name", "revenue"]
+
+    download = api_client.get(body["download_url"])
+    assert download.status_code == 200
+    table = pyarrow.parquet.read_table(io.BytesIO(download.content))
+    assert table.column("name").to_pylist() == ["Acme", "Globex", "Initech"]
+
+    partial = api_client.get(body["download_url"], headers={"Range": "bytes=0-3"})
+    assert partial.status_code == 206
+    assert partial.content == b"PAR1"
+
+
+def test_nl_query_export_csv_gzip_and_ttl_cleanup(sqlite_db, fake_llm, api_client):
+    import gzip
+    import time
+
+    import exports
+
+    body = api_client.post("/nl-query", json={"query": "list customers", "export": "csv"}).json()
+    content = gzip.decompress(api_client.get(body["download_url"]).content).decode()
+    assert content.splitlines() == ["customer_id,name,revenue", "1,Acme,120.0", "2,Globex,80.0", "3,Initech,45.5"]
+
+    assert exports.cleanup_expired(now=time.time() + 3601) == 1
+    assert api_client.get(body["download_url"]).status_code == 404
+
+
+def test_nl_query_export_enforces_disk_quota(sqlite_db, fake_llm, api_client, monkeypatch):
+    import exports
+
+    monkeypatch.setenv("EXPORT_MAX_DISK_BYTES", "10")
+    response = api_client.post("/nl-query", json={"query": "list customers", "export": "parquet"})
+    assert response.status_code == 400
+    assert "quota" in response.json()["detail"]
+    assert list(exports.get_export_dir().iterdir()) == []
+
+
+def test_cleanup_leaves_fresh_unreadable_sidecars_alone(sqlite_db, fake_llm, api_client):
+    import os
+    import time
+
+    import exports
+
+    body = api_client.post("/nl-query", json={"query": "list customers", "export": "csv"}).json()
+    export_dir = exports.get_export_dir()
+    assert not list(export_dir.glob("*.part"))
+
+    # A sidecar caught mid-write by another process must not get its export deleted.
+    half_written = export_dir / f"{'0' * 32}.json"
+    half_written.write_text('{"export_id": ', encoding="utf-8")
+    assert exports.cleanup_expired() == 0
+    assert half_written.exists()
+    assert api_client.get(body["download_url"]).status_code == 200
+
+    old = time.time() - exports.SIDECAR_GRACE_SECONDS - 1
+    os.utime(half_written, (old, old))
+    assert exports.cleanup_expired() == 1
+    assert not half_written.exists()
+
+
+def test_concurrent_exports_share_the_disk_quota(monkeypatch, tmp_path):
+    import exports
+
+    monkeypatch.setenv("EXPORT_MAX_DISK_BYTES", "10")
+    first_path, second_path = tmp_path / "a.csv.gz.part", tmp_path / "b.csv.gz.part"
+    first = exports._QuotaGuard(tmp_path, first_path)
+    second = exports._QuotaGuard(tmp_path, second_path)
+
+    first_path.write_bytes(b"x" * 6)
+    first.check()
+    second_path.write_bytes(b"x" * 6)
+    with pytest.raises(ValueError, match="quota"):
+        second.check()
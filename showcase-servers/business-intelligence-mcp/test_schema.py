@@ -0,0 +1,116 @@
+import json
+import time
+
+import db
+import mcp_tools
+import schema_cache
+import schema_index
+from mcp_tools import NLQueryRequest
+
+
+def _add_orders_table():
+    with db.connect() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE orders (order_id INTEGER PRIMARY KEY, "
+            "customer_id INTEGER REFERENCES customers(customer_id), total REAL)"
+        )
+        conn.commit()
+
+
+def test_schema_digest_includes_keys(sqlite_db):
+    _add_orders_table()
+    snapshot = schema_cache.get_schema_cache().refresh()
+    lines = snapshot["digest"].splitlines()
+    assert lines[0] == "customers(customer_id INTEGER PK, name TEXT, revenue REAL)"
+    assert lines[1] == "orders(order_id INTEGER PK, customer_id INTEGER FK->customers.customer_id, total REAL)"
+
+
+def test_schema_cache_get_never_introspects_inline(sqlite_db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(schema_cache, "introspect_schema", lambda db_url=None: calls.append(db_url) or [])
+    cache = schema_cache.SchemaCache()
+    assert cache.get() is None
+
+    deadline = time.time() + 2
+    while cache.get() is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get()["digest"] == ""
+    assert len(calls) == 1
+
+
+def test_schema_hint_used_when_absent(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("SCHEMA_INTROSPECTION_ENABLED", "true")
+    schema_cache.get_schema_cache().refresh()
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    mcp_tools.handle_nl_query(NLQueryRequest(query="list customers again", schema_hint="customers(id)"))
+    assert fake_llm.schema_hints[0].startswith("customers(customer_id INTEGER PK")
+    assert fake_llm.schema_hints[1] == "customers(id)"
+
+
+def test_schema_refresh_endpoint(sqlite_db, api_client):
+    assert api_client.post("/schema/refresh").json()["tables"] == 1
+    _add_orders_table()
+    assert api_client.post("/schema/refresh").json()["tables"] == 2
+    assert "orders(" in api_client.get("/schema").json()["digest"]
+
+
+def _table(name, columns, foreign_keys=()):
+    return {
+        "name": name,
+        "columns": [{"name": column, "type": "TEXT"} for column in columns],
+        "primary_key": [columns[0]],
+        "foreign_keys": list(foreign_keys),
+    }
+
+
+SCHEMA_TABLES = [
+    _table("customers", ["customer_id", "name", "revenue"]),
+    _table(
+        "orders",
+        ["order_id", "customer_id", "order_total"],
+        [{"columns": ["customer_id"], "referred_table": "customers", "referred_columns": ["customer_id"]}],
+    ),
+    _table("products", ["product_id", "title", "unitPrice"]),
+    _table("support_tickets", ["ticket_id", "priority"]),
+]
+
+
+def test_tokenize_splits_identifiers_and_singularizes():
+    assert schema_index.tokenize("support_tickets unitPrice Categories") == [
+        "support", "ticket", "unit", "price", "category",
+    ]
+
+
+def test_schema_index_ranks_table_names_above_columns():
+    index = schema_index.SchemaIndex(SCHEMA_TABLES)
+    assert index.select_tables("open support tickets by priority", top_k=1) == ["support_tickets"]
+    assert index.select_tables("product prices", top_k=2)[0] == "products"
+
+
+def test_schema_index_adds_fk_referenced_tables():
+    index = schema_index.SchemaIndex(SCHEMA_TABLES)
+    assert index.select_tables("largest order total", top_k=2) == ["orders", "customers"]
+
+
+def test_schema_index_uses_synonyms(tmp_path, monkeypatch):
+    synonyms = tmp_path / "synonyms.json"
+    synonyms.write_text(json.dumps({"customers": ["clients"], "support_tickets": ["complaints"]}))
+    monkeypatch.setenv("SCHEMA_SYNONYMS_PATH", str(synonyms))
+    index = schema_index.SchemaIndex(SCHEMA_TABLES, schema_index.load_synonyms())
+    assert index.select_tables("how many complaints", top_k=1) == ["support_tickets"]
+    assert index.select_tables("best clients", top_k=1) == ["customers"]
+
+
+def test_pruned_schema_hint_reports_prompt_sizes(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("SCHEMA_INTROSPECTION_ENABLED", "true")
+    monkeypatch.setenv("SCHEMA_HINT_TOP_K", "1")
+    _add_orders_table()
+    schema_cache.get_schema_cache().refresh()
+
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="top customers by revenue"))
+    stats = result["prompt_stats"]
+    assert fake_llm.schema_hints[-1] == "customers(customer_id INTEGER PK, name TEXT, revenue REAL)"
+    assert stats["tables_total"] == 2
+    assert stats["tables_selected"] == 1
+    assert stats["prompt_chars_pruned"] < stats["prompt_chars_full"]
@@ -44,6 +44,10 @@ def test_validate_sql_is_safe_blocks_dangerous_queries(sql):
         validate_sql_is_safe(sql)
 
 
+async def fake_ahandle_nl_query(req):
+    return {"sql": "SELECT 1;", "rows": []}
+
+
 def test_nl_query_requires_api_key(monkeypatch):
     monkeypatch.setenv("API_KEY", "secret")
     monkeypatch.delenv("API_KEYS", raising=False)
@@ -59,7 +63,7 @@ def test_nl_query_rate_limit(monkeypatch):
     monkeypatch.delenv("REVOKED_API_KEYS", raising=False)
     monkeypatch.setenv("RATE_LIMIT_REQUESTS", "1")
     monkeypatch.setenv("RATE_LIMIT_WINDOW_SECONDS", "60")
-    monkeypatch.setattr(main, "handle_nl_query", lambda req: {"sql": "SELECT 1;", "rows": []})
+    monkeypatch.setattr(main, "ahandle_nl_query", fake_ahandle_nl_query)
 
     app.state.rate_limit_store.clear()
     client = TestClient(app)
@@ -85,7 +89,7 @@ def test_nl_query_accepts_dual_rotation_keys(monkeypatch):
     monkeypatch.delenv("REVOKED_API_KEYS", raising=False)
     monkeypatch.setenv("RATE_LIMIT_REQUESTS", "10")
     monkeypatch.setenv("RATE_LIMIT_WINDOW_SECONDS", "60")
-    monkeypatch.setattr(main, "handle_nl_query", lambda req: {"sql": "SELECT 1;", "rows": []})
+    monkeypatch.setattr(main, "ahandle_nl_query", fake_ahandle_nl_query)
 
     app.state.rate_limit_store.clear()
     client = TestClient(app)
@@ -111,7 +115,7 @@ def test_nl_query_rejects_revoked_key(monkeypatch):
     monkeypatch.delenv("API_KEY", raising=False)
     monkeypatch.setenv("RATE_LIMIT_REQUESTS", "10")
     monkeypatch.setenv("RATE_LIMIT_WINDOW_SECONDS", "60")
-    monkeypatch.setattr(main, "handle_nl_query", lambda req: {"sql": "SELECT 1;", "rows": []})
+    monkeypatch.setattr(main, "ahandle_nl_query", fake_ahandle_nl_query)
 
     app.state.rate_limit_store.clear()
     client = TestClient(app)
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+import pytest
+
+import db
+import mcp_tools
+import sql_guard
+from mcp_tools import NLQueryRequest
+
+
+@pytest.mark.parametrize(
+    "sql, expected",
+    [
+        ("SELECT * FROM events;", "SELECT * FROM events LIMIT 100;"),
+        ("SELECT * FROM events LIMIT 5", "SELECT * FROM events LIMIT 5;"),
+        ("SELECT * FROM events LIMIT 500 OFFSET 20;", "SELECT * FROM events LIMIT 100 OFFSET 20;"),
+        ("SELECT * FROM events LIMIT 20, 500", "SELECT * FROM events LIMIT 20, 100;"),
+        ("SELECT * FROM events FETCH FIRST 900 ROWS ONLY", "SELECT * FROM events FETCH FIRST 100 ROWS ONLY;"),
+        (
+            "SELECT * FROM (SELECT * FROM events LIMIT 5) e WHERE note = 'limit 3'",
+            "SELECT * FROM (SELECT * FROM events LIMIT 5) e WHERE note = 'limit 3' LIMIT 100;",
+        ),
+        ("SELECT unlimited FROM t", "SELECT unlimited FROM t LIMIT 100;"),
+        ("SELECT * FROM events LIMIT ALL", "SELECT * FROM events LIMIT 100;"),
+        ("SELECT * FROM events LIMIT ALL OFFSET 10;", "SELECT * FROM events LIMIT 100 OFFSET 10;"),
+        ("SELECT * FROM events LIMIT ?", "SELECT * FROM events LIMIT 100;"),
+        ("SELECT * FROM events LIMIT :n OFFSET :skip", "SELECT * FROM events LIMIT 100 OFFSET :skip;"),
+        ("SELECT * FROM events LIMIT $1", "SELECT * FROM events LIMIT 100;"),
+        ("SELECT * FROM events OFFSET 10", "SELECT * FROM events LIMIT 100 OFFSET 10;"),
+        (
+            "SELECT * FROM events ORDER BY id OFFSET 10 ROWS;",
+            "SELECT * FROM events ORDER BY id LIMIT 100 OFFSET 10 ROWS;",
+        ),
+        (
+            "SELECT * FROM (SELECT * FROM events OFFSET 2) e",
+            "SELECT * FROM (SELECT * FROM events OFFSET 2) e LIMIT 100;",
+        ),
+    ],
+)
+def test_enforce_row_limit(sql, expected):
+    assert sql_guard.enforce_row_limit(sql, max_rows=100) == expected
+
+
+def test_enforced_sql_still_passes_validation():
+    mcp_tools.validate_sql_is_safe(sql_guard.enforce_row_limit("SELECT 1;", max_rows=10))
+
+
+def test_injected_limit_before_offset_runs(sqlite_db):
+    rows = db.run_query(sql_guard.enforce_row_limit("SELECT name FROM customers ORDER BY customer_id OFFSET 1", 1))
+    assert rows == [{"name": "Globex"}]
+
+
+def test_handle_nl_query_caps_rows(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("SQL_MAX_ROWS", "2")
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    assert result["sql"].endswith("LIMIT 2;")
+    assert len(result["rows"]) == 2
+
+
+def test_check_query_cost_rejects_expensive_plans(monkeypatch):
+    monkeypatch.setenv("SQL_EXPLAIN_ENABLED", "true")
+    monkeypatch.setenv("SQL_EXPLAIN_MAX_COST", "100")
+    monkeypatch.setattr(sql_guard, "explain_estimate", lambda sql, db_url=None: {"cost": 5000.0, "rows": 10.0})
+    with pytest.raises(ValueError, match="estimated cost"):
+        sql_guard.check_query_cost("SELECT * FROM events;")
+
+    monkeypatch.setattr(sql_guard, "explain_estimate", lambda sql, db_url=None: {"cost": 5.0, "rows": 10.0})
+    assert sql_guard.check_query_cost("SELECT * FROM events;") == {"cost": 5.0, "rows": 10.0}
+
+
+def test_check_query_cost_disabled_by_default(monkeypatch):
+    monkeypatch.setattr(sql_guard, "explain_estimate", lambda sql, db_url=None: pytest.fail("EXPLAIN should not run"))
+    assert sql_guard.check_query_cost("SELECT 1;") is None
+
+
+def test_walk_mysql_rows_multiplies_join_estimates():
+    plan = {"nested_loop": [{"table": {"rows_examined_per_scan": 1000}}, {"table": {"rows_examined_per_scan": 3}}]}
+    assert sql_guard._walk_mysql_rows(plan) == 3000
+
+
+def test_sqlite_statement_timeout_interrupts_long_queries(sqlite_db, monkeypatch):
+    monkeypatch.setenv("SQL_STATEMENT_TIMEOUT_MS", "50")
+    db.dispose_engines()
+    slow_sql = (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT COUNT(*) FROM n"
+    )
+    start = time.monotonic()
+    with pytest.raises(Exception) as exc:
+        db.run_query(slow_sql)
+    assert isinstance(exc.value.orig, sqlite3.OperationalError)
+    assert time.monotonic() - start < 5
+    assert db.run_query("SELECT COUNT(*) AS n FROM customers") == [{"n": 3}]
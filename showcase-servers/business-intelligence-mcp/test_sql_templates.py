@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import llm_provider
+import mcp_tools
+import sql_templates
+from mcp_tools import NLQueryRequest
+
+
+@pytest.fixture
+def bundled_engine():
+    return sql_templates.TemplateEngine(sql_templates.load_templates(str(sql_templates.DEFAULT_TEMPLATES_PATH)))
+
+
+def test_bundled_templates_fill_typed_parameters(bundled_engine):
+    assert bundled_engine.match("Show me the top 5 customers by revenue?") == (
+        "top_customers_by_revenue",
+        "SELECT customer_id, name, revenue FROM customers ORDER BY revenue DESC LIMIT 5;",
+    )
+    assert bundled_engine.match("bottom customers")[1].endswith("ORDER BY revenue ASC LIMIT 10;")
+    assert bundled_engine.match("top 99999 customers")[1].endswith("LIMIT 1000;")
+    assert bundled_engine.match("How many customers do we have?")[0] == "customer_count"
+
+
+def test_template_engine_reports_hit_rate(bundled_engine):
+    bundled_engine.match("total revenue")
+    bundled_engine.match("revenue by region for last quarter")
+    stats = bundled_engine.stats()
+    assert (stats["lookups"], stats["hits"], stats["misses"]) == (2, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert stats["hits_by_template"]["total_revenue"] == 1
+
+
+def test_template_fast_path_skips_llm_and_falls_through(sqlite_db, fake_llm, monkeypatch, tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(
+        json.dumps(
+            {
+                "templates": [
+                    {
+                        "name": "richest",
+                        "patterns": ["richest (?P<limit>\\d+) customers"],
+                        "sql": "SELECT name FROM customers ORDER BY revenue DESC LIMIT {limit};",
+                        "params": {"limit": {"type": "int", "default": 1}},
+                    }
+                ]
+            }
+        )
+    )
+    monkeypatch.setenv("SQL_TEMPLATES_ENABLED", "true")
+    monkeypatch.setenv("SQL_TEMPLATES_PATH", str(path))
+    sql_templates.reset_template_engine()
+
+    result = mcp_tools.handle_nl_query(NLQueryRequest(query="richest 2 customers"))
+    assert [row["name"] for row in result["rows"]] == ["Acme", "Globex"]
+    assert fake_llm.calls == 0
+
+    mcp_tools.handle_nl_query(NLQueryRequest(query="list customers"))
+    assert fake_llm.calls == 1
+    sql_templates.reset_template_engine()
+
+
+def test_template_provider_rejects_unmatched_questions():
+    provider = llm_provider.TemplateProvider()
+    assert "COUNT(*)" in provider.generate_sql("count customers")
+    with pytest.raises(ValueError, match="No SQL template"):
+        provider.generate_sql("revenue by region")
+
+
+def test_template_provider_fallback_counts_one_lookup(sqlite_db, monkeypatch):
+    monkeypatch.setenv("SQL_TEMPLATES_ENABLED", "true")
+    monkeypatch.setenv("LLM_PROVIDER", "template")
+    sql_templates.reset_template_engine()
+    llm_provider.close_llm_provider()
+
+    with pytest.raises(ValueError, match="No SQL template"):
+        mcp_tools.generate_validated_sql(NLQueryRequest(query="revenue by region"))
+    stats = sql_templates.get_template_engine().stats()
+    assert (stats["lookups"], stats["misses"]) == (1, 1)
+    llm_provider.close_llm_provider()
+    sql_templates.reset_template_engine()
+
+
+def test_bundled_templates_only_answer_for_the_default_source(sqlite_db, fake_llm, monkeypatch):
+    monkeypatch.setenv("SQL_TEMPLATES_ENABLED", "true")
+    monkeypatch.setenv("DATA_SOURCES", json.dumps({"archive": {"primary": sqlite_db + "?archive=1"}}))
+    sql_templates.reset_template_engine()
+
+    sql = mcp_tools.generate_validated_sql(NLQueryRequest(query="count customers"))
+    assert "COUNT(*)" in sql and fake_llm.calls == 0
+    sql = mcp_tools.generate_validated_sql(NLQueryRequest(query="count customers", database="default"))
+    assert "COUNT(*)" in sql and fake_llm.calls == 0
+
+    mcp_tools.generate_validated_sql(NLQueryRequest(query="count customers", database="archive"))
+    assert fake_llm.calls == 1
+    sql_templates.reset_template_engine()
+
+
+def test_rule_provider_keeps_the_keyword_rule():
+    rule = llm_provider._build_llm_provider("rule")
+    for question in ("show me the top customers by total revenue", "top customers in germany by revenue"):
+        assert rule.generate_sql(question) == llm_provider._LEGACY_TOP_CUSTOMERS_SQL
+    assert "LIMIT 5" in rule.generate_sql("top 5 customers by revenue")
+
+    with pytest.raises(ValueError, match="No SQL template"):
+        llm_provider._build_llm_provider("template").generate_sql("top customers in germany by revenue")
@@ -0,0 +1,121 @@
+"""
+NL→SQL translation cache.
+
+Sits in front of LLMProvider.generate_sql and stores SQL that has already
+passed normalize_sql + validate_sql_is_safe. Entries live in an in-memory
+LRU with TTL; set NL_CACHE_REDIS=true to share them across workers through
+REDIS_URL (the in-memory layer is still consulted first).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from cache import TTLCache
+
+try:
+    import redis  # pyright: ignore[reportMissingImports]
+except ImportError:  # pragma: no cover - exercised in environments without redis installed
+    redis = None
+
+REDIS_KEY_PREFIX = "nl_sql_cache:"
+
+logger = logging.getLogger("mcp.bi.translation_cache")
+
+
+def is_enabled() -> bool:
+    return os.getenv("NL_CACHE_ENABLED", "true").strip().lower() == "true"
+
+
+def get_cache_settings() -> tuple[int, int]:
+    max_entries = int(os.getenv("NL_CACHE_MAX_ENTRIES", "1024"))
+    ttl_seconds = int(os.getenv("NL_CACHE_TTL_SECONDS", "600"))
+    return max_entries, ttl_seconds
+
+
+def normalize_nl_query(query: str) -> str:
+    collapsed = re.sub(r"\s+", " ", query.strip().lower())
+    return collapsed.rstrip(" ?.!")
+
+
+def make_cache_key(query: str, schema_hint: str | None, provider: str, model: str, db_url: str) -> str:
+    # The data source is part of the key: the same question against two schemas needs different SQL.
+    parts = [normalize_nl_query(query), (schema_hint or "").strip(), provider, model, db_url]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self) -> None:
+        max_entries, ttl_seconds = get_cache_settings()
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.redis_client = _create_redis_client()
+        self.redis_hits = 0
+        self.redis_degraded = False
+
+    def get(self, key: str) -> str | None:
+        sql = self.memory.get(key)
+        if sql is not None or self.redis_client is None:
+            return sql
+
+        try:
+            sql = self.redis_client.get(REDIS_KEY_PREFIX + key)
+            self.redis_degraded = False
+        except Exception:
+            self._mark_redis_degraded("get")
+            return None
+
+        if sql is not None:
+            self.redis_hits += 1
+            self.memory.set(key, sql)
+        return sql
+
+    def set(self, key: str, sql: str) -> None:
+        self.memory.set(key, sql)
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.set(REDIS_KEY_PREFIX + key, sql, ex=int(self.memory.ttl_seconds))
+            self.redis_degraded = False
+        except Exception:
+            self._mark_redis_degraded("set")
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["backend"] = "memory+redis" if self.redis_client is not None else "memory"
+        stats["redis_hits"] = self.redis_hits
+        stats["redis_degraded"] = self.redis_degraded
+        return stats
+
+    def _mark_redis_degraded(self, operation: str) -> None:
+        self.redis_degraded = True
+        logger.warning("translation_cache.redis_unavailable operation=%s fallback=memory", operation)
+
+
+def _create_redis_client():
+    if os.getenv("NL_CACHE_REDIS", "false").strip().lower() != "true":
+        return None
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    if not redis_url or redis is None:
+        return None
+    return redis.from_url(redis_url, decode_responses=True)
+
+
+_cache: TranslationCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_translation_cache() -> TranslationCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TranslationCache()
+    return _cache
+
+
+def reset_translation_cache() -> None:
+    global _cache
+    with _cache_lock:
+        _cache = None